@@ -0,0 +1,42 @@
+import sys
+import json
+from utils.benchmark import PDFBenchmarkConfig
+from utils.benchmark import PDFBenchmark
+
+################################################################################
+# Command line
+################################################################################
+config = PDFBenchmarkConfig()
+args = sys.argv[1:]
+options = {'--baseline': None, '--save': None, '--tolerance': '10'}
+sizes = {'--' + key.replace('_', '-'): key for key in config.to_dict()}
+while len(args) > 1 and (args[0] in options or (args[0] in sizes and args[1].isdigit())):
+  if args[0] in options:
+    options[args[0]] = args[1]
+  else:
+    setattr(config, sizes[args[0]], int(args[1]))
+  args = args[2:]
+
+if len(args) != 0 or not options['--tolerance'].isdigit():
+  print('Usage: {0} [--baseline JSON] [--save JSON] [--tolerance PERCENT] [{1}]'.format(
+    sys.argv[0], ' | '.join('{0} N'.format(size) for size in sizes)), file=sys.stderr)
+  exit(1)
+
+################################################################################
+# Benchmark
+################################################################################
+report = PDFBenchmark.run(config)
+
+if options['--baseline'] is not None:
+  with open(options['--baseline'], 'r') as f:
+    baseline = json.load(f)
+  report['baseline'] = options['--baseline']
+  report['regressions'] = PDFBenchmark.compare(report, baseline, int(options['--tolerance']) / 100)
+
+if options['--save'] is not None:
+  with open(options['--save'], 'w') as f:
+    json.dump(report, f, indent=2)
+
+print(json.dumps(report, indent=2))
+if len(report.get('regressions', [])) > 0:
+  exit(2)
@@ -4,25 +4,46 @@ import sys
 import math
 import csv
 import html
-import zlib
 from html.parser import HTMLParser
 from utils.pdf import PDF
 from utils.pdf import PDFParser
 from utils.pdf import ParserReader
+from utils.pdf import IncrementalPDFParser
 from utils.pdf import PDFValue
 from utils.pdf import PDFContentStreamParser
 from utils.pdf import PDFWriter
+from utils.pdf import PDFFlateEngine
+from utils.pdf import PDFStreamPipeline
+from utils.pdf import PDFParseCache
+from utils.parserprofile import ParserProfile
 
 ################################################################################
 # Command line
 ################################################################################
-if len(sys.argv) != 3:
-  print('Usage: %s <input-pdf> <output-pdf>'
+args = sys.argv[1:]
+options = {'--jobs': 1, '--spill': None, '--reflate': None}
+flags = {'--no-cache': False, '--profile': False}
+while len(args) > 0:
+  if args[0] in flags:
+    flags[args[0]] = True
+    args = args[1:]
+  elif len(args) > 1 and args[0] in options and args[1].isdigit():
+    options[args[0]] = int(args[1])
+    args = args[2:]
+  else:
+    break
+
+if len(args) != 2 or (options['--reflate'] is not None and options['--reflate'] > 9):
+  print('Usage: %s [--jobs N | --spill BYTES] [--reflate LEVEL] [--no-cache] [--profile] <input-pdf> <output-pdf>'
     % sys.argv[0], file=sys.stderr)
+  print('  --reflate recompresses every stream at zlib LEVEL 0-9 instead of inflating it', file=sys.stderr)
+  print('  parses are cached under ${0} when it is set'.format(PDFParseCache.DIR_VARIABLE), file=sys.stderr)
+  print('  --profile parses without the cache and reports time per parser state', file=sys.stderr)
+  print('  <input-pdf> may be - to parse from stdin while it is being written', file=sys.stderr)
   exit(1)
 
-pdf_in_path = sys.argv[1]
-pdf_out_path = sys.argv[2]
+pdf_in_path = args[0]
+pdf_out_path = args[1]
 
 ################################################################################
 # Process PDF
@@ -34,24 +55,42 @@ def set_pdf(pdf):
   global in_pdf
   in_pdf = pdf
 
-parser = PDFParser(set_pdf)
-reader = ParserReader()
-if reader.read_file(parser.begin, pdf_in_path):
+profile = ParserProfile() if flags['--profile'] else None
+cache = None if flags['--no-cache'] or profile is not None else PDFParseCache.get_default()
+if pdf_in_path == '-':
+  # parse while the producer is still writing instead of after it is done
+  parser = IncrementalPDFParser(set_pdf, profile=profile)
+  parser.feed_file(sys.stdin.buffer)
+  if not parser.close():
+    in_pdf = None
+  pdf_in_path = None
+elif cache is not None:
+  in_pdf = cache.read_file(pdf_in_path, True)
+else:
+  parser = PDFParser(set_pdf)
+  reader = ParserReader(profile=profile)
+  if not reader.read_file(parser.begin, pdf_in_path, True):
+    in_pdf = None
+if profile is not None:
+  print(profile.get_report(), file=sys.stderr)
+if in_pdf is not None:
   print("SUCCESS")
 else:
   print("FAIL")
   exit(-1)
+in_pdf.source_path = pdf_in_path
 
-for k in in_pdf.objects:
-  obj = in_pdf.objects[k]
-  decode_filter = None
-  if 'Filter' in obj.named_values:
-    decode_filter = obj.named_values['Filter']
-  if decode_filter is not None and decode_filter.value == 'FlateDecode':
-    decoded = zlib.decompress(obj.stream_data)
-    obj.stream_data = decoded
-    del obj.named_values['Filter']
-    obj.named_values['Length'] = PDFValue(PDFValue.INT, len(obj.stream_data))
+level = options['--reflate']
+if options['--spill'] is not None:
+  # stream each payload through zlib, spilling large ones to temp files
+  if level is not None:
+    PDFStreamPipeline.reflate_objects(in_pdf, level, options['--spill'])
+  else:
+    PDFStreamPipeline.inflate_objects(in_pdf, options['--spill'])
+elif level is not None:
+  PDFFlateEngine.reflate_objects(in_pdf, level, options['--jobs'])
+else:
+  PDFFlateEngine.inflate_objects(in_pdf, options['--jobs'])
 
 # Write PDF
 ###########
@@ -4,27 +4,51 @@ import sys
 import math
 import csv
 import html
-import zlib
-from html.parser import HTMLParser
+import functools
 from utils.pdf import PDF
 from utils.pdf import PDFParser
+from utils.pdf import PDFLazyLoader
 from utils.pdf import ParserReader
 from utils.pdf import PDFValue
-from utils.pdf import PDFContentStreamParser
+from utils.pdf import PDFContentStreamQuery
+from utils.pdf import PDFContentStreamEditor
 from utils.pdf import PDFWriter
+from utils.pdf import PDFFlateEngine
+from utils.pdf import PDFStreamPipeline
+from utils.pdf import PDFStreamFilters
+from utils.pdf import PDFParseCache
+from utils.rectmatcher import SVGSpace
+from utils.rectmatcher import RectMatcher
+from utils.svgscan import SVGScanner
 
 ################################################################################
 # Command line
 ################################################################################
-if len(sys.argv) != 5:
-  print('Usage: %s <links-csv-file> <svg-file> <inkscape-gen-pdf> <linkified-pdf>'
+args = sys.argv[1:]
+options = {'--jobs': 1, '--level': None}
+flags = {'--no-cache': False}
+while len(args) > 0:
+  if args[0] in flags:
+    flags[args[0]] = True
+    args = args[1:]
+  elif len(args) > 1 and args[0] in options and args[1].isdigit():
+    options[args[0]] = int(args[1])
+    args = args[2:]
+  else:
+    break
+
+if len(args) < 4 or (options['--level'] is not None and options['--level'] > 9):
+  print('Usage: %s [--jobs N] [--level LEVEL] [--no-cache] <links-csv-file> <svg-file> [<svg-file> ...] <inkscape-gen-pdf> <linkified-pdf>'
     % sys.argv[0], file=sys.stderr)
+  print('  one svg file per page, in page order', file=sys.stderr)
+  print('  --level sets the zlib level 0-9 edited content streams are recompressed at', file=sys.stderr)
+  print('  full parses are cached under ${0} when it is set'.format(PDFParseCache.DIR_VARIABLE), file=sys.stderr)
   exit(1)
 
-csv_path = sys.argv[1]
-svg_path = sys.argv[2]
-pdf_in_path = sys.argv[3]
-pdf_out_path = sys.argv[4]
+csv_path = args[0]
+svg_paths = args[1:-2]
+pdf_in_path = args[-2]
+pdf_out_path = args[-1]
 
 ################################################################################
 # Load CSV Links
@@ -39,42 +63,43 @@ with open(csv_path, 'r') as csv_file:
 ################################################################################
 # Load SVG Rects
 ################################################################################
-print("Loading SVG rects from file: {0}".format(svg_path))
-svg_rects = []
-
-class SVGHTMLParser(HTMLParser):
-  def __init__(self):
-    HTMLParser.__init__(self)
-    self.origin_x = 0
-    self.origin_y = 0
-
-  def handle_starttag(self, tag, attrs):
-    if tag.lower() == 'svg':
-      data = {i[0]:i[1] for i in attrs}
-      if 'x' in data:
-        self.origin_x = float(data['x'])
-      if 'y' in data:
-        self.origin_y = float(data['y'])
-
-    if tag.lower() == "rect":
-      rect_data = {i[0]:i[1] for i in attrs}
-      if 'id' not in rect_data:
-        return
-      if rect_data['id'] in links:
-        r = dict(rect_data)
-        r['x'] = float(r['x']) + self.origin_x
-        r['y'] = float(r['y']) + self.origin_y
-        svg_rects.append(r)
-
-  def handle_endtag(self, tag):
-    pass
-
-  def handle_data(self, data):
-    pass
-
-with open(svg_path, 'r') as svg_file:
-  parser = SVGHTMLParser()
-  parser.feed(svg_file.read())
+class SVGPageReader:
+  def read_file(svg_path):
+    # (rects with one of the link ids, page size in user units, user units
+    # at the top left corner) of one page, both from the outermost svg element
+    size = None
+    origin = (0.0, 0.0)
+    has_size = False
+    origin_x = 0
+    origin_y = 0
+    rects = []
+    for element in SVGScanner(links).scan_file(svg_path):
+      if element.name == 'svg':
+        if not has_size:
+          size = SVGSpace.get_size(element.attributes)
+          origin = SVGSpace.get_origin(element.attributes)
+          has_size = True
+        if 'x' in element.attributes:
+          origin_x = float(element.attributes['x'])
+        if 'y' in element.attributes:
+          origin_y = float(element.attributes['y'])
+      else:
+        r = dict(element.attributes)
+        r['x'] = float(r.get('x', 0)) + origin_x
+        r['y'] = float(r.get('y', 0)) + origin_y
+        rects.append(r)
+    return (rects, size, origin)
+
+# one list of rects, one size and one origin per page
+svg_page_rects = []
+svg_page_sizes = []
+svg_page_origins = []
+for svg_path in svg_paths:
+  print("Loading SVG rects from file: {0}".format(svg_path))
+  rects, size, origin = SVGPageReader.read_file(svg_path)
+  svg_page_rects.append(rects)
+  svg_page_sizes.append(size)
+  svg_page_origins.append(origin)
 
 ################################################################################
 # Process Rects
@@ -86,12 +111,27 @@ def set_pdf(pdf):
   global in_pdf
   in_pdf = pdf
 
-parser = PDFParser(set_pdf)
-reader = ParserReader()
-if reader.read_file(parser.begin, pdf_in_path):
+# a damaged xref is rebuilt from the object headers before falling back
+# to parsing the whole file
+in_pdf = PDFLazyLoader.read_file(pdf_in_path, True, True)
+if in_pdf is not None:
+  if getattr(in_pdf, 'recovery', None) is not None:
+    print(in_pdf.recovery.get_report(), file=sys.stderr)
   print("SUCCESS")
 else:
-  print("FAIL")
+  cache = None if flags['--no-cache'] else PDFParseCache.get_default()
+  if cache is not None:
+    in_pdf = cache.read_file(pdf_in_path, True)
+  else:
+    parser = PDFParser(set_pdf)
+    reader = ParserReader()
+    if not reader.read_file(parser.begin, pdf_in_path, True):
+      in_pdf = None
+  if in_pdf is not None:
+    in_pdf.source_path = pdf_in_path
+    print("SUCCESS")
+  else:
+    print("FAIL")
 
 class PDFDeviceRGBColor:
   def __init__(self, r=0.0, g=0.0, b=0.0):
@@ -112,146 +152,193 @@ class PDFDeviceRGBColor:
 class PDFLinkRectsUtils:
   def get_page_objects(pdf):
     root_obj = None
-    for key, obj in pdf.objects.items():
-      obj_type = None
-      if 'Type' in obj.named_values:
-        obj_type = obj.named_values['Type']
-      if obj_type is not None and obj_type.value == 'Pages':
-        root_obj = obj
-        break
+    if 'Root' in pdf.trailer:
+      catalog = pdf.objects[pdf.trailer['Root'].value.get_key()]
+      if 'Pages' in catalog.named_values:
+        root_obj = pdf.objects[catalog.named_values['Pages'].value.get_key()]
+    if root_obj is None:
+      for key, obj in pdf.objects.items():
+        obj_type = None
+        if 'Type' in obj.named_values:
+          obj_type = obj.named_values['Type']
+        if obj_type is not None and obj_type.value == 'Pages':
+          root_obj = obj
+          break
     if root_obj is None:
       raise ValueError("Expected element 'Pages' missing from PDF")
-    if 'Kids' not in root_obj.named_values:
-      raise ValueError("Expected element 'Kids' missing from Pages object")
-    pages = [o.value for o in root_obj.named_values['Kids'].value]
-    return pages
+    return PDFLinkRectsUtils.get_page_kids(pdf, root_obj)
 
-  def get_content_objects(pdf, page_refs):
-    content_refs = [pdf.objects[ref.get_key()].named_values['Contents'].value for ref in page_refs if 'Contents' in pdf.objects[ref.get_key()].named_values]
-    content_objects = [pdf.objects[ref.get_key()] for ref in content_refs]
-    return content_objects
-  
-  def decompress_content_stream(obj):
-    decompressed = obj.stream_data
-    if 'Filter' in obj.named_values:
-      if obj.named_values['Filter'].value == 'FlateDecode':
-        decompressed = zlib.decompress(obj.stream_data).decode()
-      else:
-        raise ValueError("Unsupported Filter type '{0}'".format(obj.named_values['Filter']))
-    return decompressed
-
-  def recompress_content_stream(obj):
-    compressed = obj.stream_data
-    if 'Filter' in obj.named_values:
-      if obj.named_values['Filter'].value == 'FlateDecode':
-        compressed = zlib.compress(obj.stream_data)
+  def get_page_kids(pdf, pages_obj):
+    # page trees can nest, pages are the leaves in document order
+    if 'Kids' not in pages_obj.named_values:
+      raise ValueError("Expected element 'Kids' missing from Pages object")
+    pages = []
+    for kid in pages_obj.named_values['Kids'].value:
+      kid_obj = pdf.objects[kid.value.get_key()]
+      if 'Type' in kid_obj.named_values and kid_obj.named_values['Type'].value == 'Pages':
+        pages.extend(PDFLinkRectsUtils.get_page_kids(pdf, kid_obj))
       else:
-        raise ValueError("Unsupported Filter type '{0}'".format(obj.named_values['Filter']))
-    return compressed
+        pages.append(kid.value)
+    return pages
 
-  def parse_content_stream(content_stream):
-    commands = []
-    def append_command(cmd):
-        commands.append(cmd)
-    reader = ParserReader()
-    parser = PDFContentStreamParser(append_command)
-    print(content_stream)
-    result = reader.read_string(parser.begin, content_stream)
-    if result:
-      return commands
-    raise ValueError("Content stream parsing failed")
+  def get_inherited(pdf, page, key):
+    # inheritable attributes like MediaBox may sit on any Pages node above
+    # the page, the nearest one counts
+    obj = page
+    visited = set()
+    while key not in obj.named_values:
+      parent = obj.named_values.get('Parent')
+      if parent is None or parent.type != PDFValue.REFERENCE or parent.value.get_key() in visited:
+        return None
+      visited.add(parent.value.get_key())
+      obj = pdf.objects[parent.value.get_key()]
+    return PDFLinkRectsUtils.resolve(pdf, obj.named_values[key])
+
+  def resolve(pdf, value):
+    # the value an indirect reference points at, other values as they are
+    if value.type != PDFValue.REFERENCE:
+      return value
+    obj = pdf.objects[value.value.get_key()]
+    return obj.values[0] if len(obj.values) > 0 else None
+
+  def get_media_box(pdf, page_ref):
+    mb = PDFLinkRectsUtils.get_inherited(pdf, pdf.objects[page_ref.get_key()], 'MediaBox')
+    if mb is None or mb.type != PDFValue.ARRAY or len(mb.value) != 4:
+      raise ValueError("Page '{0}' has no MediaBox".format(page_ref))
+    return [PDFLinkRectsUtils.resolve(pdf, v).value for v in mb.value]
+
+  def get_content_objects(pdf, page_ref):
+    page = pdf.objects[page_ref.get_key()]
+    if 'Contents' not in page.named_values:
+      return []
+    contents = page.named_values['Contents']
+    if contents.type == PDFValue.ARRAY:
+      return [pdf.objects[ref.value.get_key()] for ref in contents.value]
+    return [pdf.objects[contents.value.get_key()]]
+
+  def get_payload(obj):
+    # mmap views stay views, PDFFlateEngine.map copies them only when they
+    # cross to a worker process
+    return PDFFlateEngine.get_payload(obj)
 
 class PDFLinkRects:
-  def pull_rects(color, pdf):
-    selected_coords = []
-    # Get 1st Page
-    ##############
-    pages = PDFLinkRectsUtils.get_page_objects(pdf)
-    first_page_ref = pages[0]
-    first_page = pdf.objects[first_page_ref.get_key()]
-    
-    # Get Content Obj
-    #################
-    content_objects = PDFLinkRectsUtils.get_content_objects(pdf, [first_page_ref])
-    content_object = content_objects[0]
-
-    # Get Media Box
-    ###############
-    mb = first_page.named_values['MediaBox']
-    media_box = [mb.value[0].value, mb.value[1].value, mb.value[2].value, mb.value[3].value]
-
-    # Load Commands
-    ###############
-    stream_data = PDFLinkRectsUtils.decompress_content_stream(content_object)
-    commands = PDFLinkRectsUtils.parse_content_stream(stream_data)
-
-    
-    # Filter Commands
-    #################
-    output_commands = []
-    selected_commands = []
-    selected_paths = False
-
-    for cmd in commands:
-      if cmd.name == 'rg':
-        if color.compare(cmd.params[0].value, cmd.params[1].value, cmd.params[2].value) == 0:
-          selected_paths = True
-        else:
-          selected_paths = False
-      if selected_paths:
-        if cmd.name == 'Q':
-          selected_paths = False
-      if selected_paths and cmd.name == 're':
-        selected_commands.append(cmd)
+  def decode_stream(data, filters, threshold):
+    # unfiltered payloads are scanned where they are, decoded ones go
+    # through zlib a chunk at a time and spill to a temp file when large
+    if len(filters) == 0:
+      return (memoryview(data), None)
+    spool = PDFStreamPipeline.collect(PDFStreamPipeline.decode_data(data, filters), threshold)
+    return (spool.get_view(), spool)
+
+  def pull_page_rects(color, payloads, filters, level=PDFFlateEngine.DEFAULT_LEVEL, threshold=PDFStreamPipeline.SPILL_THRESHOLD):
+    # a page may split its drawing over several content streams, they are
+    # searched one after another with the fill colour carried over, and
+    # every rect is cut from the stream it sits in
+    query = PDFContentStreamQuery(['re'], 'rg', lambda operands: len(operands) == 3 and color.compare(*[o.value for o in operands]) == 0, ['Q'])
+    updated = []
+    coords = []
+    for data, f in zip(payloads, filters):
+      # Find Link Rects
+      #################
+      stream, spool = PDFLinkRects.decode_stream(data, f, threshold)
+      selected_commands = query.find(stream)
+      coords.extend(tuple(cmd.get_numbers(stream)) for cmd in selected_commands)
+
+      # Update Commands
+      #################
+      # only the marker rects are cut out, the rest of the page keeps its bytes
+      if len(selected_commands) == 0:
+        updated.append(None)
       else:
-        output_commands.append(cmd)
-
-    # Update Commands
-    #################
-    content_object.stream_data = "\n".join([str(cmd) for cmd in output_commands]).encode()
-    content_object.stream_data = PDFLinkRectsUtils.recompress_content_stream(content_object)
-    content_object.named_values['Length'] = PDFValue(PDFValue.INT, len(content_object.stream_data))
+        editor = PDFContentStreamEditor(stream)
+        for cmd in selected_commands:
+          editor.delete(cmd.start, cmd.end)
+        if len(f) > 0:
+          # edited segments go straight into zlib without joining the stream first
+          updated.append(b''.join(PDFStreamPipeline.deflate(editor.get_segments(), level)))
+        else:
+          updated.append(editor.getvalue())
+      if spool is not None:
+        spool.close()
 
     # Return Results
     ################
-    selected_coords.extend([(cmd.params[0].value, cmd.params[1].value, cmd.params[2].value, cmd.params[3].value) for cmd in selected_commands])
-    return (media_box, selected_coords)
-        
-media_box, pdf_rects = PDFLinkRects.pull_rects(PDFDeviceRGBColor(1.0, 0, 1.0), in_pdf)
+    return (updated, coords)
+
+  def pull_rects(color, pdf, jobs=1, level=PDFFlateEngine.DEFAULT_LEVEL):
+    pages = PDFLinkRectsUtils.get_page_objects(pdf)
+    page_contents = [PDFLinkRectsUtils.get_content_objects(pdf, page_ref) for page_ref in pages]
+    for content_objects in page_contents:
+      for obj in content_objects:
+        if not PDFStreamFilters.is_decodable(obj):
+          raise ValueError("Unsupported Filter type '{0}'".format(obj.named_values['Filter']))
+
+    # pages are independent, each goes through decompress, scan and
+    # recompress on its own
+    results = PDFFlateEngine.map(functools.partial(PDFLinkRects.pull_page_rects, color, level=level), jobs,
+      [[PDFLinkRectsUtils.get_payload(obj) for obj in objs] for objs in page_contents],
+      [[PDFStreamFilters.get_filters(obj) for obj in objs] for objs in page_contents])
+
+    page_rects = []
+    for page_ref, content_objects, (updated, coords) in zip(pages, page_contents, results):
+      for obj, data in zip(content_objects, updated):
+        if data is not None:
+          PDFFlateEngine.set_stream(obj, data, 'Filter' in obj.named_values)
+      media_box = PDFLinkRectsUtils.get_media_box(pdf, page_ref)
+      page_rects.append((page_ref, media_box, coords))
+    return page_rects
+
+level = options['--level'] if options['--level'] is not None else PDFFlateEngine.DEFAULT_LEVEL
+pdf_page_rects = PDFLinkRects.pull_rects(PDFDeviceRGBColor(1.0, 0, 1.0), in_pdf, options['--jobs'], level)
+
+if len(svg_page_rects) > len(pdf_page_rects):
+  print("WARNING: Expected {0} pages in PDF '{1}', found {2} instead".format(len(svg_page_rects), pdf_in_path, len(pdf_page_rects)))
 
 ################################################################################
 # Match Rects
 ################################################################################
 print("Matching rects...")
 
-svg_rects.sort(key = lambda r: (int(r['x']) << 16) & int(r['y']))
-pdf_rects.sort(key = lambda r: (int(r[0]) << 16) & int(media_box[3] - r[1]) )
-
-if len(pdf_rects) != len(svg_rects):
-    print("WARNING: Expected {0} rects in PDF '{1}', found {2} instead".format(len(svg_rects), pdf_in_path, len(pdf_rects)))
+for page_number, (svg_rects, svg_size, svg_origin, (page_ref, media_box, pdf_rects)) in enumerate(zip(svg_page_rects, svg_page_sizes, svg_page_origins, pdf_page_rects)):
+  if svg_size is None:
+    print("WARNING: SVG '{0}' has no viewBox or absolute size, its rects are matched unscaled".format(svg_paths[page_number]))
+  # both sides in PDF user space, each SVG rect takes the nearest PDF rect
+  space = SVGSpace(media_box, svg_size, svg_origin)
+  svg_boxes = [space.get_box(r['x'], r['y'], float(r.get('width', 0)), float(r.get('height', 0))) for r in svg_rects]
+  pdf_boxes = [RectMatcher.get_box(*r[:4]) for r in pdf_rects]
+  pairs, unmatched_svg, unmatched_pdf = RectMatcher.match(svg_boxes, pdf_boxes)
+
+  for i, j in pairs:
+    svg_rects[i]['pdf_rect'] = pdf_rects[j]
+  for i in unmatched_svg:
+    print("WARNING: SVG rect '{0}' on page {1} matches no rect in PDF '{2}'".format(svg_rects[i]['id'], page_number + 1, pdf_in_path))
+  for j in unmatched_pdf:
+    print("WARNING: PDF rect {0} on page {1} of PDF '{2}' matches no SVG rect".format(list(pdf_rects[j]), page_number + 1, pdf_in_path))
 
-for i in range(len(svg_rects)):
-  svg_rects[i]['pdf_rect'] = pdf_rects[i]
-  
 ###############
 # Gen PDF links
 ###############
 print("Generating PDF Links...")
 
 pdf_links = []
-annot_refs = []
 
-for svg_rect in svg_rects:
-  if 'pdf_rect' not in svg_rect:
-    print("PDF rect missing: {0}".format(svg_rect['id']))
-    continue
-  url = links[svg_rect['id']]
+for svg_rects, (page_ref, media_box, pdf_rects) in zip(svg_page_rects, pdf_page_rects):
+  for svg_rect in svg_rects:
+    # rects without a match were reported above
+    if 'pdf_rect' not in svg_rect:
+      continue
+    url = links[svg_rect['id']]
+
+    if url is None or len(url.strip()) < 1:
+      print("Skipping", svg_rect)
+      continue
+    pdf_links.append((page_ref, svg_rect, url))
 
-  if url is None or len(url.strip()) < 1:
-    print("Skipping", svg_rect)
-    continue
+# reserve all annotation ids at once
+link_objs = in_pdf.create_objects(len(pdf_links))
+page_annot_refs = {}
 
-  link_obj = in_pdf.create_new_object()
+for (page_ref, svg_rect, url), link_obj in zip(pdf_links, link_objs):
   annotation_values = {}
   annotation_values['S'] = PDFValue(PDFValue.NAME, 'URI')
   annotation_values['URI'] = PDFValue(PDFValue.STRING, url)
@@ -271,14 +358,23 @@ for svg_rect in svg_rects:
   link_obj.named_values['Type'] = PDFValue(PDFValue.NAME, 'Annot')
   link_obj.named_values['Border'] = PDFValue(PDFValue.ARRAY, border_array)
 
-  annot_refs.append(PDFValue(PDFValue.REFERENCE, link_obj.get_ref()))
-
-# ONLY 1 page PDF support for now
-for key, obj in in_pdf.objects.items():
-  if 'Type' in obj.named_values and obj.named_values['Type'].value == 'Page':
-    obj.named_values['Annots'] = PDFValue(PDFValue.ARRAY, annot_refs)
+  page_annot_refs.setdefault(page_ref.get_key(), []).append(PDFValue(PDFValue.REFERENCE, link_obj.get_ref()))
+
+# every page gets the annots of its own rects, next to the ones it has
+for page_key, annot_refs in page_annot_refs.items():
+  page = in_pdf.objects[page_key]
+  annots = PDFLinkRectsUtils.resolve(in_pdf, page.named_values['Annots']) if 'Annots' in page.named_values else None
+  if annots is not None and annots.type == PDFValue.ARRAY:
+    # an indirect array is extended where it is, which marks its object
+    # for writing
+    annots.value.extend(annot_refs)
+  else:
+    page.named_values['Annots'] = PDFValue(PDFValue.ARRAY, annot_refs)
     
 # Write PDF
 ###########
-PDFWriter.write_file(in_pdf, pdf_out_path)
-
+if getattr(in_pdf, 'recovery', None) is not None:
+  # an update would chain to the damaged xref, write a fresh file instead
+  PDFWriter.write_file(in_pdf, pdf_out_path)
+else:
+  PDFWriter.write_incremental(in_pdf, pdf_in_path, pdf_out_path)
@@ -1,10 +1,11 @@
 import sys
 import csv
-from html.parser import HTMLParser
+import html
 
-from utils.html import HTMLElement
 from utils.html import HTMLStyleBuilder
 from utils.models import LinkEntry
+from utils.svgscan import SVGScanner
+from utils.svgscan import SVGStreamEditor
 
 
 ################################################################################
@@ -29,89 +30,37 @@ with open(links_csv_filename, 'r') as csv_file:
     links[name] = LinkEntry(link[0], link[1], link[2], link[3])
 
 ################################################################################
-# Load Links
+# Link Rects
 ################################################################################
-identifiers = []
-
-class InputSVGHtmlParser(HTMLParser):
-  def __init__(self):
-    HTMLParser.__init__(self)
-    self.root_element = None
-    self.current_element = None
-    self.stack = []
-    self.max_len = 0
-   
-  def handle_starttag(self, tag, attrs):
-    global links
-    data = {i[0]:i[1] for i in attrs}
-
-    element = HTMLElement(tag)
-    for key in data:
-      element.set_attr(key, data[key])
-
-
-    if tag == 'rect':
-      style = data['style']
-      style_parts = style.split(';')
-      pink_rect = False
-      style_builder = HTMLStyleBuilder()
-
-      for style_part in style_parts:
-        attr_parts = style_part.split(':')
-        name = attr_parts[0]
-        value = attr_parts[1]
-        if name == 'fill' and value == 'rgb(255,0,255)':
-          pink_rect = True
-        style_builder.set(name, value)
-
-      if pink_rect:
-        style_builder.set('fill-opacity', '0.0')
-        element.set_attr('style', str(style_builder))
-        a_element = HTMLElement('a')
-        link_id = data['id']
-        link = links[link_id].url
-        a_element.set_attr('href', link).set_attr('target', '_blank')
-        a_element.add_child(element)
-        element = a_element
-
-    
-    if self.root_element is None:
-      self.root_element = element
-      self.current_element = element
-    else:
-      self.current_element.add_child(element)
-    self.stack.append(self.current_element)
-    self.current_element = element
-
-    if len(self.stack) > self.max_len:
-      self.max_len = len(self.stack)
-
-
-
-  def handle_endtag(self, tag):
-    self.current_element = self.stack.pop()
-    
-  def handle_data(self, data):
-    if self.current_element:
-      self.current_element.set_text(data)
-    pass
-
-parser = InputSVGHtmlParser()
-
-with open(input_svg_filename, 'r') as f:
-  parser.feed(f.read())
+# only the pink rects change, everything else is copied through as it is
+editor = SVGStreamEditor()
+
+# styles too long for the scanner to keep are read again through a second handle
+with open(input_svg_filename, 'rb') as source:
+  for element in SVGScanner(links).scan_file(input_svg_filename):
+    if element.name != 'rect' or 'style' not in element.spans:
+      continue
+    pink_rect = False
+    style_builder = HTMLStyleBuilder()
+    for style_part in element.read_attr(source, 'style').split(';'):
+      if ':' not in style_part:
+        continue
+      name, value = style_part.split(':', 1)
+      if name == 'fill' and value == 'rgb(255,0,255)':
+        pink_rect = True
+      style_builder.set(name, value)
+
+    if pink_rect:
+      style_builder.set('fill-opacity', '0.0')
+      link = links[element.get_attr('id')].url
+      value_start, value_end = element.spans['style']
+      editor.insert(element.start, '<a href="{0}" target="_blank">'.format(html.escape(link)).encode())
+      editor.replace(value_start, value_end, html.escape(str(style_builder)).encode())
+      editor.insert(element.end, b'</a>')
 
 ################################################################################
 # Output
 ################################################################################
-
-def test_iterate(element):
-  print(element.name)
-
-#parser.root_element.iterate_children(test_iterate)
-
-#print(parser.max_len)
-
-with open(output_svg_filename, 'w') as f:
-  f.write(str(parser.root_element))
-  pass
\ No newline at end of file
+with open(input_svg_filename, 'rb') as reader:
+  with open(output_svg_filename, 'wb') as writer:
+    editor.write(reader, writer)
@@ -3,6 +3,7 @@ import io
 import base64
 import struct
 import imghdr
+import time
 import logic.context
 from utils.html import HTMLElement
 from utils.html import HTMLStyleBuilder
@@ -836,8 +837,9 @@ class ParserBase:
 # ParserReader
 ##############
 class ParserReader:
-  def __init__(self):
-    pass
+  def __init__(self, profile=None):
+    # an optional ParserProfile, filled in by parse when it is set
+    self.profile = profile
 
   def set_pdf(self, pdf):
     self.pdf = pdf
@@ -857,6 +859,10 @@ class ParserReader:
     return result
 
   def parse(self, parser, reader):
+    profile = self.profile
+    if profile is not None:
+      timer = time.perf_counter
+      started = timer()
     stack = []
     stack.append(parser)
     next_byte_index = 0
@@ -869,6 +875,8 @@ class ParserReader:
 
     if b != b"":
       bytes.append(b[0])
+      if profile is not None:
+        profile.bytes += 1
 
     while bytes_read < len(bytes):
       if next_parser is None:
@@ -882,18 +890,29 @@ class ParserReader:
      
       while peer_parser is not None:
         #print("byte: {0} byte_index: {1} f: {2}".format(chr(next_byte), next_byte_index, peer_parser.__qualname__))
+        if profile is not None:
+          call_started = timer()
         result = peer_parser(next_byte, next_byte_index)
+        if profile is not None:
+          profile.add_state(peer_parser, timer() - call_started)
 
         if result.error_msg is not None:
           print("{0}: byte: {1} byte_index: {2} message: {3}".format(peer_parser.__qualname__, next_byte, next_byte_index, result.error_msg))
+          if profile is not None:
+            profile.seconds += timer() - started
           return False
 
         if result.next_parse_func is not None:
           stack.append(result.next_parse_func)
+          if profile is not None:
+            profile.set_stack_depth(len(stack))
         
         peer_parser = result.peer_parse_func
     
       if result.stream_bytes is not None:
+        if profile is not None:
+          # this reader always copies pushed back bytes in front of the rest
+          profile.add_pushback(len(result.stream_bytes), True)
         stream = []
         stream.extend(result.stream_bytes)
         stream.extend(bytes[bytes_read:])
@@ -910,6 +929,8 @@ class ParserReader:
         else:
           bytes.append(b[0])
           next_byte_index += 1
+          if profile is not None:
+            profile.bytes += 1
 
   
       next_parser = None
@@ -917,6 +938,9 @@ class ParserReader:
       if len(stack) > 0:
         next_parser = stack.pop()
 
+    if profile is not None:
+      profile.seconds += timer() - started
+      profile.add_core('state')
     return True
 
 ###############
@@ -1048,9 +1072,11 @@ class PythonSyntaxSVGHilighter:
     self.font_size = font_size
     self.font_color = font_color
     self.line_spacing = line_spacing
+    # set to a ParserProfile to instrument the syntax parser across lines
+    self.profile = None
 
   def get_hilighted_line_element(self, line, x, y):
-    reader = ParserReader()
+    reader = ParserReader(self.profile)
     parser = PySyntaxParser(None)
     reader.read_string(parser.begin, line)
 
@@ -0,0 +1,104 @@
+import sys
+import os
+import io
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def serialize(self, pdf):
+    return PDFWriter.serialize(pdf, False).getvalue()
+
+  def execute(self, filename, chunk_size):
+    expected = []
+    ParserReader().read_file(PDFParser(expected.append).begin, filename)
+    with open(filename, 'rb') as f:
+      data = f.read()
+    pdfs = []
+    objects = []
+    parser = IncrementalPDFParser(pdfs.append, objects.append)
+    # objects are handed out before the document is complete
+    half = len(data) // 2
+    early = None
+    for i in range(0, len(data), chunk_size):
+      parser.feed(bytearray(data[i:i + chunk_size]))
+      if early is None and i + chunk_size >= half:
+        early = (len(objects), len(pdfs))
+    closed = parser.close()
+    same = len(pdfs) == 1 and self.serialize(pdfs[0]) == self.serialize(expected[0])
+    keys = sorted(obj.get_key() for obj in objects) == sorted(expected[0].objects.keys())
+    if closed and same and keys and early[0] > 0 and early[1] == 0:
+      print("PASS: '{0}' chunk size '{1}' objects '{2}' early '{3}'".format(filename, chunk_size, len(objects), early))
+      return True
+    print("FAIL: '{0}' chunk size '{1}' closed '{2}' same '{3}' keys '{4}' early '{5}'".format(filename, chunk_size, closed, same, keys, early))
+    return False
+
+class TruncatedTestCase:
+  def execute(self, text, expected_objects):
+    pdfs = []
+    objects = []
+    parser = IncrementalPDFParser(pdfs.append, objects.append)
+    parser.feed(text.encode('latin-1'))
+    closed = parser.close()
+    try:
+      parser.feed(b' ')
+      fed = True
+    except ValueError:
+      fed = False
+    received = [obj.get_key() for obj in objects]
+    if not closed and not fed and len(pdfs) == 0 and received == expected_objects:
+      print("PASS: expected '{0}' received '{1}'".format(expected_objects, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}' closed '{2}' fed '{3}'".format(expected_objects, received, closed, fed))
+    return False
+
+class FileTestCase:
+  def execute(self, filename):
+    pdfs = []
+    parser = IncrementalPDFParser(pdfs.append)
+    with open(filename, 'rb') as f:
+      # read1 hands out what is there, like a buffered pipe
+      result = parser.feed_file(io.BytesIO(f.read()), 100) and parser.close()
+    if result and len(pdfs) == 1:
+      print("PASS: '{0}' objects '{1}'".format(filename, len(pdfs[0].objects)))
+      return True
+    print("FAIL: '{0}' result '{1}'".format(filename, result))
+    return False
+
+
+pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf')
+test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'), 1),
+  (os.path.join(pdf_dir, 'simple.pdf'), 17),
+  (os.path.join(pdf_dir, 'simple.pdf'), 256),
+  (os.path.join(pdf_dir, 'out.pdf'), 1000),
+  (os.path.join(pdf_dir, 'out.pdf'), 1 << 16),
+]
+
+truncated_test_case_params = [
+  ("%PDF-1.4\n1 0 obj\n<</A 1>>\nendobj\n2 0 obj\n[1 2", [(1, 0)]),
+  ("%PDF-1.4\n1 0 obj\n(a)\nendobj\n2 0 obj\n(b)\nendobj\nxref\n", [(1, 0), (2, 0)]),
+]
+
+file_test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'),),
+  (os.path.join(pdf_dir, 'out.pdf'),),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in truncated_test_case_params:
+  test_case = TruncatedTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in file_test_case_params:
+  test_case = FileTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,75 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+from utils.benchmark import *
+
+class TestCase:
+  def get_config(self, objects, depth, pages, operators):
+    config = PDFBenchmarkConfig()
+    config.objects = objects
+    config.depth = depth
+    config.pages = pages
+    config.operators = operators
+    config.streams = 2
+    config.stream_size = 1024
+    config.runs = 1
+    return config
+
+  def execute(self, objects, depth, pages, operators):
+    config = self.get_config(objects, depth, pages, operators)
+    report = PDFBenchmark.run(config)
+    results = report['results']
+    expected_objects = objects + config.streams + pages * 2 + 2
+    received_objects = results['PDFParser.buffer']['items']
+    commands = results['PDFContentStreamParser']['items']
+    same = PDFSyntheticDocument.generate(config) == PDFSyntheticDocument.generate(config)
+    # every page starts with a link rect, the query agreed with the parser
+    rects = results['PDFContentStreamQuery']['items']
+    # buffered and unbuffered writes produce the same file
+    writes = [results[name]['bytes'] for name, object_streams, buffered in PDFBenchmark.WRITES]
+    if received_objects == expected_objects and results['PDFParser.stream']['items'] == expected_objects and commands >= pages * operators and same and rects >= pages and writes[0] == writes[1]:
+      print("PASS: expected '{0}' objects received '{1}' commands '{2}' rects '{3}'".format(expected_objects, received_objects, commands, rects))
+      return True
+    print("FAIL: expected '{0}' objects received '{1}' commands '{2}' deterministic '{3}' rects '{4}' writes '{5}'".format(
+      expected_objects, received_objects, commands, same, rects, writes))
+    return False
+
+class CompareTestCase:
+  def execute(self, throughput, peak, expected):
+    baseline = {'results': {'PDFParser.buffer': {'mb_per_s': 10.0, 'peak_bytes': 1000}}}
+    report = {'results': {'PDFParser.buffer': {'mb_per_s': throughput, 'peak_bytes': peak}, 'PDFWriter': {'mb_per_s': 1.0, 'peak_bytes': 1}}}
+    received = [r['metric'] for r in PDFBenchmark.compare(report, baseline, 0.1)]
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+
+test_case_params = [
+  (20, 1, 1, 100),
+  (50, 4, 2, 300),
+]
+
+compare_test_case_params = [
+  (9.5, 1050, []),
+  (8.0, 1000, ['mb_per_s']),
+  (12.0, 1200, ['peak_bytes']),
+  (1.0, 5000, ['mb_per_s', 'peak_bytes']),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in compare_test_case_params:
+  test_case = CompareTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,66 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def execute(self, text, operators, replacement, expected):
+    data = text.encode('latin-1')
+    editor = PDFContentStreamEditor(data)
+    for match in PDFContentStreamScanner.find(data, operators):
+      if replacement is None:
+        editor.delete_match(match)
+      else:
+        editor.replace_match(match, replacement.encode('latin-1'))
+    segments = editor.get_segments()
+    received = editor.getvalue().decode('latin-1')
+    # untouched bytes are handed out as views of the source
+    views = all(type(segment) is memoryview and segment.obj is data for segment in segments if type(segment) is not bytes)
+    if received == expected and views:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}' views '{2}'".format(expected, received, views))
+    return False
+
+class OverlapTestCase:
+  def execute(self, ranges):
+    editor = PDFContentStreamEditor(b'0 0 10 10 re f')
+    for start, end in ranges:
+      editor.delete(start, end)
+    try:
+      editor.getvalue()
+    except ValueError as e:
+      print("PASS: expected error received '{0}'".format(e))
+      return True
+    print("FAIL: expected error for ranges '{0}'".format(ranges))
+    return False
+
+
+test_case_params = [
+  ("q 1 0 1 rg\n1.50 2 3 4 re f\n5 6 7 8 re f Q", ['re'], None, "q 1 0 1 rg\n f\n f Q"),
+  ("q 1 0 1 rg\n1.50 2 3 4 re f\n5 6 7 8 re f Q", ['re'], "0 0 1 1 re", "q 1 0 1 rg\n0 0 1 1 re f\n0 0 1 1 re f Q"),
+  ("BT (a) Tj(b)Tj ET", ['Tj'], None, "BT  ET"),
+  ("0.1234567 0 0 rg 1 1 m", ['m'], None, "0.1234567 0 0 rg "),
+  ("q Q", ['re'], None, "q Q"),
+  ("", None, None, ""),
+]
+
+overlap_test_case_params = [
+  ([(0, 5), (4, 8)],),
+  ([(2, 4), (2, 3)],),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in overlap_test_case_params:
+  test_case = OverlapTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,116 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def get_commands(self, data, operators):
+    commands = []
+    for m in PDFContentStreamScanner.find(data, operators):
+      # the operands of EI are the binary image data
+      operands = ' '.join(str(v.default_value_str()) for v in m.get_operands(data)) if m.name != 'EI' else ''
+      commands.append('{0}:{1}'.format(operands, m.name) if len(operands) > 0 else m.name)
+    return commands
+
+  def execute(self, text, operators, expected):
+    data = text.encode('latin-1')
+    received = ' | '.join(self.get_commands(data, operators))
+    # ranges of the full scan and the selective scan have to agree
+    selected = [m for m in PDFContentStreamScanner.find(data) if operators is None or m.name in operators]
+    ranges = [(m.start, m.operator_start, m.end) for m in selected]
+    selected_ranges = [(m.start, m.operator_start, m.end) for m in PDFContentStreamScanner.find(data, operators)]
+    if received == expected and ranges == selected_ranges:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}' ranges '{2}' selected '{3}'".format(expected, received, ranges, selected_ranges))
+    return False
+
+class QueryTestCase:
+  def execute(self, text, expected):
+    data = text.encode('latin-1')
+    query = PDFContentStreamQuery(['re'], 'rg', lambda operands: [v.value for v in operands] == [1, 0, 1], ['Q'])
+    matches = query.find(data)
+    received = ' | '.join(' '.join(str(v) for v in m.get_numbers(data)) for m in matches)
+    spans = all(data[m.operator_start:m.end] == b're' for m in matches)
+    if received == expected and spans:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+class WritableTestCase:
+  def execute(self, text, expected):
+    # views of writable data, a bytearray or an ACCESS_COPY mmap, scan like bytes
+    data = memoryview(bytearray(text.encode('latin-1')))
+    query = PDFContentStreamQuery(['re'], 'rg', lambda operands: [v.value for v in operands] == [1, 0, 1], ['Q'])
+    received = ' | '.join(' '.join(str(v) for v in m.get_numbers(data)) for m in query.find(data))
+    names = [m.name for m in PDFContentStreamScanner.find(data)]
+    if received == expected and names == [m.name for m in PDFContentStreamScanner.find(bytes(data))]:
+      print("PASS: writable expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: writable expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+class SplitQueryTestCase:
+  def execute(self, parts, expected):
+    # one query over the streams of a page, the scope carries over
+    query = PDFContentStreamQuery(['re'], 'rg', lambda operands: [v.value for v in operands] == [1, 0, 1], ['Q'])
+    received = []
+    for part in parts:
+      data = part.encode('latin-1')
+      received.extend(' '.join(str(v) for v in m.get_numbers(data)) for m in query.find(data))
+    received = ' | '.join(received)
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+
+test_case_params = [
+  ("q 1 0 0 1 0 0 cm 0 0 10 10 re f Q", None, "q | 1 0 0 1 0 0:cm | 0 0 10 10:re | f | Q"),
+  ("q 1 0 0 1 0 0 cm 0 0 10 10 re f Q", ['re', 'Q'], "0 0 10 10:re | Q"),
+  ("BT /F1 12 Tf (a (nested) \\) string) Tj ET", None, "BT | /F1 12:Tf | (a (nested) \\) string):Tj | ET"),
+  ("BT (deep (nesting (of (strings)))) Tj ET", ['Tj', 'ET'], "(deep (nesting (of (strings)))):Tj | ET"),
+  ("q % comment with 1 0 0 rg re Q\n0 0 1 1 re Q", None, "q | 0 0 1 1:re | Q"),
+  ("[(A) -120 (B)] TJ /Name<</A true>> BDC EMC", None, "[(A) -120 (B)]:TJ | /Name <</A true>>:BDC | EMC"),
+  ("BI /W 2 /H 1 ID \x00re Q\xff EI 1 1 m", None, "BI | /W 2 /H 1:ID | EI | 1 1:m"),
+  ("BI /W 2 /H 1 ID \x00re Q\xff EI 1 1 m", ['re', 'Q', 'm'], "1 1:m"),
+  ("/Fre re 0.5 .5 -1 rg", ['re', 'rg'], "/Fre:re | 0.5 .5 -1:rg"),
+  ("<00ff> Tj ) 1 2 l", None, "<00ff>:Tj | 1 2:l"),
+]
+
+query_test_case_params = [
+  ("1 0 1 rg 0 0 10 20 re f Q 1 0 1 rg 5 5 1 1 re", "0 0 10 20 | 5 5 1 1"),
+  ("q 0 0 1 rg 0 0 10 20 re f 1 0 1 rg 1 2 3 4 re Q 5 6 7 8 re", "1 2 3 4"),
+  ("1 0 1 rg (1 2 3 4 re) Tj Q", ""),
+  ("1.0 0 1.0 rg %0 0 1 rg\n2 2 2 2 re", "2 2 2 2"),
+]
+
+split_query_test_case_params = [
+  (["q 1 0 1 rg 0 0 10 20 re\n", "5 5 1 1 re f Q\n", "1 2 3 4 re"], "0 0 10 20 | 5 5 1 1"),
+  (["0 0 1 rg 1 1 1 1 re\n", "1 0 1 rg\n", "2 2 2 2 re 0 0 1 rg 3 3 3 3 re"], "2 2 2 2"),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in query_test_case_params:
+  test_case = QueryTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+  test_case = WritableTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+for params in split_query_test_case_params:
+  test_case = SplitQueryTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
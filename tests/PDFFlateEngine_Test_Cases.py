@@ -0,0 +1,57 @@
+import sys
+import os
+import zlib
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def create_pdf(self, payloads):
+    pdf = PDF()
+    pdf.trailer['Size'] = PDFValue(PDFValue.INT, 1)
+    for i, payload in enumerate(payloads):
+      obj = pdf.create_new_object()
+      if i % 2 == 0:
+        obj.named_values['Filter'] = PDFValue(PDFValue.NAME, 'FlateDecode')
+        obj.stream_data = zlib.compress(payload, 1)
+      else:
+        obj.stream_data = payload
+      obj.named_values['Length'] = PDFValue(PDFValue.INT, len(obj.stream_data))
+    return pdf
+
+  def get_payloads(self, pdf):
+    return [PDFStreamFilters.decode(pdf.objects[k]) for k in sorted(pdf.objects, key=lambda k: pdf.objects[k].name)]
+
+  def execute(self, payloads, jobs, level):
+    pdf = self.create_pdf(payloads)
+    PDFFlateEngine.reflate_objects(pdf, level, jobs)
+    filters = [obj.named_values['Filter'].value for obj in pdf.objects.values()]
+    reflated = self.get_payloads(pdf)
+    PDFFlateEngine.inflate_objects(pdf, jobs)
+    inflated = [bytes(pdf.objects[k].stream_data) for k in sorted(pdf.objects, key=lambda k: pdf.objects[k].name)]
+    lengths = [obj.named_values['Length'].value == len(obj.stream_data) for obj in pdf.objects.values()]
+    unfiltered = ['Filter' not in obj.named_values for obj in pdf.objects.values()]
+    if reflated == payloads and inflated == payloads and all(lengths) and all(unfiltered) and filters == ['FlateDecode'] * len(payloads):
+      print("PASS: jobs '{0}' level '{1}' streams '{2}'".format(jobs, level, len(payloads)))
+      return True
+    print("FAIL: jobs '{0}' level '{1}' filters '{2}' lengths '{3}'".format(jobs, level, filters, lengths))
+    return False
+
+
+payloads = [("q 1 0 0 rg {0} {0} 10 10 re f Q\n".format(i) * (i + 1)).encode() for i in range(12)]
+
+test_case_params = [
+  (payloads, 1, PDFFlateEngine.DEFAULT_LEVEL),
+  (payloads, 2, 9),
+  (payloads[:1], 4, 0),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
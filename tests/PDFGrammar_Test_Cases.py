@@ -0,0 +1,74 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def read_file(self, core, filename, block_size):
+    ParserReader.core = core
+    pdfs = []
+    try:
+      if not ParserReader(block_size).read_file(PDFParser(pdfs.append).begin, filename) or len(pdfs) == 0:
+        return None
+    finally:
+      ParserReader.core = 'state'
+    pdf = pdfs[0]
+    spans = sorted((key, obj.source_span) for key, obj in pdf.objects.items())
+    return (PDFWriter.serialize(pdf, False).getvalue(), spans, repr(pdf.trailer))
+
+  def execute(self, filename, block_size):
+    state = self.read_file('state', filename, block_size)
+    generator = self.read_file('generator', filename, block_size)
+    if state is not None and state == generator:
+      print("PASS: '{0}' block size '{1}' objects '{2}'".format(filename, block_size, len(state[1])))
+      return True
+    print("FAIL: '{0}' block size '{1}' state '{2}' generator '{3}'".format(
+      filename, block_size, state is not None, generator is not None))
+    return False
+
+class ValueTestCase:
+  def execute(self, expected, input_string, block_size):
+    values = []
+    ParserReader.core = 'generator'
+    try:
+      result = ParserReader(block_size).read_string(PDFValueParser(values.append).begin, input_string)
+    finally:
+      ParserReader.core = 'state'
+    received = str(values[0]) if result and len(values) > 0 else None
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+
+pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf')
+test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'), 64),
+  (os.path.join(pdf_dir, 'simple.pdf'), ParserReader.DEFAULT_BLOCK_SIZE),
+  (os.path.join(pdf_dir, 'out.pdf'), 64),
+  (os.path.join(pdf_dir, 'out.pdf'), 4096),
+  (os.path.join(pdf_dir, 'out.pdf'), ParserReader.DEFAULT_BLOCK_SIZE),
+]
+
+value_test_case_params = [
+  ('reference(name: 12 version: 0)', '12 0 R ', 1),
+  ('integer(12)', '12 0 obj ', 2),
+  ("dictionary({'A': array([integer(1), string(a (b) c)]), 'B': hexstring(0f)})", '<</A [1 (a (b) c)] /B <0f>>> ', 3),
+  (None, '<</A 1 2>> ', ParserReader.DEFAULT_BLOCK_SIZE),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in value_test_case_params:
+  test_case = ValueTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,52 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.pdf = None
+
+  def set_pdf(self, pdf):
+    self.pdf = pdf
+
+  def execute(self, filename, key):
+    parser = PDFParser(self.set_pdf)
+    reader = ParserReader()
+    reader.read_file(parser.begin, filename)
+    expected_obj = self.pdf.objects[key]
+
+    lazy_pdf = PDFLazyLoader.read_file(filename)
+    if lazy_pdf is None:
+      print("FAIL: lazy loading of '{0}' failed".format(filename))
+      return False
+
+    loaded_before = [k for k in lazy_pdf.objects if lazy_pdf.objects.is_loaded(k)]
+    obj = lazy_pdf.objects[key]
+    loaded_after = [k for k in lazy_pdf.objects if lazy_pdf.objects.is_loaded(k)]
+
+    if len(loaded_before) == 0 and loaded_after == [key] and str(obj) == str(expected_obj) and len(lazy_pdf.objects) == len(self.pdf.objects):
+      print("PASS: expected '{0}' received '{1}'".format(expected_obj, obj))
+      return True
+    else:
+      print("FAIL: expected '{0}' received '{1}' (loaded: {2})".format(expected_obj, obj, loaded_after))
+    return False
+
+
+test_case_params = [
+  ("./pdf/simple.pdf", (5, 0)),
+  ("./pdf/simple.pdf", (3, 0)),
+  ("./pdf/out.pdf", (5, 0)),
+  ("./pdf/out.pdf", (8, 0)),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(params[0], params[1]) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
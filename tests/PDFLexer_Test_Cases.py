@@ -0,0 +1,62 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.values = []
+
+  def append_value(self, v):
+    self.values.append(v)
+
+  def parse(self, parser_class, input_string, lexer_enabled):
+    self.values = []
+    PDFLexer.enabled = lexer_enabled
+    parser = parser_class(self.append_value)
+    reader = ParserReader()
+    reader.read_string(parser.begin, input_string)
+    PDFLexer.enabled = True
+    return str(self.values)
+
+  def execute(self, parser_class, input_string):
+    expected = self.parse(parser_class, input_string, False)
+    received = self.parse(parser_class, input_string, True)
+
+    if len(self.values) > 0 and received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    else:
+      print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+
+test_case_params = [
+  (PDFValueParser, "1 %EOF"),
+  (PDFValueParser, "-12.5 "),
+  (PDFValueParser, "/Name "),
+  (PDFValueParser, "null "),
+  (PDFValueParser, "<asdf> "),
+  (PDFValueParser, "<> "),
+  (PDFValueParser, "(test(parens) \\) done) "),
+  (PDFValueParser, "1 0 R "),
+  (PDFValueParser, "1 0 obj "),
+  (PDFArrayParser, "[1 0 R 2 0 R 3 0 R] "),
+  (PDFArrayParser, "[ 0 0 595.275574 841.889771 ] "),
+  (PDFArrayParser, "[<444b5072670d21a1ec33f8bc85d74b3f><b986190c72322b28310986f8e9343458>] "),
+  (PDFArrayParser, "[test [nested] (asdf)] "),
+  (PDFDictionaryParser, "<</test value /test1 /value2>> "),
+  (PDFDictionaryParser, "<< /Type /Page /Parent 1 0 R /Group << /S /Transparency /I true >> /Kids [ 5 0 R ] >> "),
+  (PDFContentStreamParser, "q 0 0 0 rg /a0 gs 547.02 776.535 4.156 -0.562 re f Q "),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(params[0], params[1]) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
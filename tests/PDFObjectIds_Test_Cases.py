@@ -0,0 +1,105 @@
+import sys
+import os
+import tempfile
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.pdf = None
+
+  def set_pdf(self, pdf):
+    self.pdf = pdf
+
+  def read_file(self, filename):
+    parser = PDFParser(self.set_pdf)
+    reader = ParserReader()
+    reader.read_file(parser.begin, filename)
+    return self.pdf
+
+  def execute(self, filename, deleted, count, expected_keys, expected_size):
+    pdf = self.read_file(filename)
+    for key in deleted:
+      pdf.delete_object(key)
+    keys = [pdf.create_new_object().get_key()]
+    keys += [obj.get_key() for obj in pdf.create_objects(count)]
+    keys += [pdf.create_new_object().get_key()]
+    size = pdf.get_size()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      out_path = os.path.join(tmp_dir, 'out.pdf')
+      PDFWriter.write_incremental(pdf, filename, out_path)
+      written = PDFLazyLoader.read_file(out_path)
+      written_keys = sorted(written.objects.keys())
+
+    expected_written = sorted(pdf.objects.keys())
+    if keys == expected_keys and size == expected_size and written_keys == expected_written and written.trailer['Size'].value >= expected_size:
+      print("PASS: expected '{0}' received '{1}'".format(expected_keys, keys))
+      return True
+    print("FAIL: expected '{0}' size '{1}' received '{2}' size '{3}' written '{4}'".format(expected_keys, expected_size, keys, size, written_keys))
+    return False
+
+class FreeListTestCase(TestCase):
+  def execute(self, filename, deleted, retired, reuse, expected_free):
+    # retired objects are at the last generation when they are deleted
+    pdf = self.read_file(filename)
+    for key in retired:
+      obj = pdf.objects.pop(key)
+      obj.version = 65534
+      pdf.objects[obj.get_key()] = obj
+    for key in deleted + [(key[0], 65534) for key in retired]:
+      pdf.delete_object(key)
+    reused = [pdf.create_new_object().get_key() for i in range(reuse)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      out_path = os.path.join(tmp_dir, 'out.pdf')
+      PDFWriter.write_incremental(pdf, filename, out_path)
+      written = PDFLazyLoader.read_file(out_path)
+      with open(out_path, 'rb') as f:
+        xref = PDFLazyLoader.read_sections(f, PDFLazyLoader.find_start_xref(f))[0][1]
+    entries = {obj_id: entry for obj_id, entry in xref.get_entries()}
+    # object 0 heads the list of free entries, the last one points back to it
+    free = []
+    obj_id = entries[0].offset
+    while obj_id != 0 and obj_id not in free and len(free) < len(entries):
+      free.append((obj_id, entries[obj_id].generation))
+      obj_id = entries[obj_id].offset
+    gone = all(key[0] not in [obj_id for obj_id, generation in written.objects] for key in retired)
+    if free == expected_free and all(key not in reused for key in retired) and gone:
+      print("PASS: expected free '{0}' received '{1}'".format(expected_free, free))
+      return True
+    print("FAIL: expected free '{0}' received '{1}' reused '{2}' gone '{3}'".format(expected_free, free, reused, gone))
+    return False
+
+
+test_case_params = [
+  ("./pdf/simple.pdf", [], 3, [(8, 0), (9, 0), (10, 0), (11, 0), (12, 0)], 13),
+  ("./pdf/simple.pdf", [(3, 0)], 2, [(3, 1), (8, 0), (9, 0), (10, 0)], 11),
+  ("./pdf/simple.pdf", [(3, 0), (6, 0)], 0, [(3, 1), (6, 1)], 8),
+  ("./pdf/simple.pdf", [(6, 0), (3, 0), (5, 0)], 0, [(3, 1), (5, 1)], 8),
+  ("./pdf/out.pdf", [], 1, [(10, 0), (11, 0), (12, 0)], 13),
+  ("./pdf/out.pdf", [(7, 0)], 0, [(7, 1), (10, 0)], 11),
+]
+
+free_list_test_case_params = [
+  ("./pdf/simple.pdf", [], [(3, 0)], 0, [(3, 65535)]),
+  ("./pdf/simple.pdf", [(5, 0)], [(6, 0), (3, 0)], 1, [(3, 65535), (6, 65535)]),
+  ("./pdf/simple.pdf", [], [(6, 0), (3, 0), (5, 0)], 0, [(3, 65535), (5, 65535), (6, 65535)]),
+  ("./pdf/simple.pdf", [(5, 0), (4, 0), (6, 0)], [(3, 0)], 1, [(3, 65535), (5, 1), (6, 1)]),
+  ("./pdf/out.pdf", [(7, 0)], [(8, 0)], 0, [(7, 1), (8, 65535)]),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in free_list_test_case_params:
+  test_case = FreeListTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
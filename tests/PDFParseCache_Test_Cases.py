@@ -0,0 +1,167 @@
+import sys
+import os
+import time
+import pickle
+import tempfile
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def serialize(self, pdf):
+    return PDFWriter.serialize(pdf, False).getvalue()
+
+  def execute(self, filename, use_mmap):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = PDFParseCache(cache_dir)
+      parsed = cache.read_file(filename, use_mmap)
+      cached = cache.read_file(filename, use_mmap)
+      if parsed is None or cached is None or parsed is cached:
+        print("FAIL: '{0}' mmap '{1}' could not be read".format(filename, use_mmap))
+        return False
+      # parsed objects come back clean so they are still copied raw
+      dirty = [key for key, obj in cached.objects.items() if obj.is_dirty()]
+      same = self.serialize(parsed) == self.serialize(cached)
+      streams = all(bytes(cached.objects[key].stream_data) == bytes(obj.stream_data) for key, obj in parsed.objects.items())
+      if (cache.hits, cache.misses) == (1, 1) and len(dirty) == 0 and same and streams:
+        print("PASS: '{0}' mmap '{1}' hits '{2}' misses '{3}'".format(filename, use_mmap, cache.hits, cache.misses))
+        return True
+      print("FAIL: '{0}' mmap '{1}' hits '{2}' misses '{3}' dirty '{4}' same '{5}' streams '{6}'".format(
+        filename, use_mmap, cache.hits, cache.misses, dirty, same, streams))
+      return False
+
+class DamagedTestCase:
+  def execute(self, filename):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = PDFParseCache(cache_dir)
+      cache.read_file(filename)
+      path = cache.get_path(PDFParseCache.get_digest(filename))
+      with open(path, 'wb') as f:
+        f.write(b'not a cache entry')
+      pdf = cache.read_file(filename)
+      if pdf is not None and (cache.hits, cache.misses) == (0, 2) and os.path.getsize(path) > len(b'not a cache entry'):
+        print("PASS: damaged entry for '{0}' replaced".format(filename))
+        return True
+      print("FAIL: damaged entry for '{0}' hits '{1}' misses '{2}'".format(filename, cache.hits, cache.misses))
+      return False
+
+class Planted:
+  def __init__(self, path):
+    self.path = path
+
+  def __reduce__(self):
+    return (os.makedirs, (self.path,))
+
+class PlantedTestCase:
+  def execute(self, filename):
+    # an entry that would run code on load is a miss instead
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = PDFParseCache(cache_dir)
+      marker = os.path.join(cache_dir, 'planted')
+      with open(cache.get_path(PDFParseCache.get_digest(filename)), 'wb') as f:
+        pickle.dump(Planted(marker), f)
+      pdf = cache.read_file(filename)
+      if pdf is not None and not os.path.exists(marker) and (cache.hits, cache.misses) == (0, 1):
+        print("PASS: planted entry for '{0}' not loaded".format(filename))
+        return True
+      print("FAIL: planted entry for '{0}' ran '{1}' hits '{2}' misses '{3}'".format(filename, os.path.exists(marker), cache.hits, cache.misses))
+      return False
+
+class DirectoryTestCase:
+  def execute(self, filename):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      cache_dir = os.path.join(tmp_dir, 'cache')
+      PDFParseCache(cache_dir).read_file(filename)
+      mode = os.stat(cache_dir).st_mode & 0o777
+      if mode == 0o700:
+        print("PASS: cache directory mode '{0:o}'".format(mode))
+        return True
+      print("FAIL: cache directory mode '{0:o}'".format(mode))
+      return False
+
+class OldEntryTestCase:
+  def execute(self, filename):
+    # entries stored before an attribute existed load with its default
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = PDFParseCache(cache_dir)
+      pdf = cache.read_file(filename)
+      del pdf.recovery
+      cache.store(PDFParseCache.get_digest(filename), filename, pdf)
+      cached = cache.read_file(filename)
+      if cached is not None and cache.hits == 1 and cached.recovery is None and len(cached.objects) == len(pdf.objects):
+        print("PASS: old entry for '{0}' recovery '{1}'".format(filename, cached.recovery))
+        return True
+      print("FAIL: old entry for '{0}' hits '{1}'".format(filename, cache.hits))
+      return False
+
+class EvictTestCase:
+  def execute(self, filenames, keep):
+    with tempfile.TemporaryDirectory() as cache_dir:
+      cache = PDFParseCache(cache_dir)
+      paths = []
+      for i, filename in enumerate(filenames):
+        cache.read_file(filename)
+        path = cache.get_path(PDFParseCache.get_digest(filename))
+        # distinct use times, oldest first
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        paths.append(path)
+      # touching the oldest entry makes it the most recently used
+      cache.read_file(filenames[0])
+      cache.max_size = sum(os.path.getsize(paths[i]) for i in keep)
+      cache.evict()
+      remaining = [i for i, path in enumerate(paths) if os.path.exists(path)]
+      if remaining == keep:
+        print("PASS: expected '{0}' received '{1}'".format(keep, remaining))
+        return True
+      print("FAIL: expected '{0}' received '{1}'".format(keep, remaining))
+      return False
+
+
+pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf')
+test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'), False),
+  (os.path.join(pdf_dir, 'simple.pdf'), True),
+  (os.path.join(pdf_dir, 'out.pdf'), False),
+  (os.path.join(pdf_dir, 'out.pdf'), True),
+]
+
+damaged_test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'),),
+]
+
+planted_test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'),),
+]
+
+evict_test_case_params = [
+  ([os.path.join(pdf_dir, 'simple.pdf'), os.path.join(pdf_dir, 'out.pdf')], [0]),
+  ([os.path.join(pdf_dir, 'simple.pdf'), os.path.join(pdf_dir, 'out.pdf')], [0, 1]),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in damaged_test_case_params:
+  test_case = DamagedTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in planted_test_case_params:
+  test_case = PlantedTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+  test_case = DirectoryTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+  test_case = OldEntryTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in evict_test_case_params:
+  test_case = EvictTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
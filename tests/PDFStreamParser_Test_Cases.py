@@ -0,0 +1,55 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.stream = None
+
+  def set_stream(self, s):
+    self.stream = bytes(s)
+
+  def parse(self, length, input_string, block_size, reference):
+    self.stream = None
+    parser = PDFStreamParser(self.set_stream, length)
+    reader = ParserReader(block_size)
+    reader.read_string(parser.begin_reference if reference else parser.begin, input_string)
+    return self.stream
+
+  def execute(self, expected_stream, length, input_string, reference):
+    modes = [(block_size, False) for block_size in [1, 2, 5, ParserReader.DEFAULT_BLOCK_SIZE]]
+    if reference:
+      modes.append((ParserReader.DEFAULT_BLOCK_SIZE, True))
+    for block_size, use_reference in modes:
+      stream = self.parse(length, input_string, block_size, use_reference)
+      if stream != expected_stream:
+        print("FAIL: expected {0} received {1} block_size: {2} reference: {3}".format(expected_stream, stream, block_size, use_reference))
+        return False
+    print("PASS: expected {0} received {1}".format(expected_stream, stream))
+    return True
+
+
+test_case_params = [
+  (b"abc", 3, "\nabc\nendstream\n", True),
+  (b"abc", None, "\nabc\nendstream\n", True),
+  (b"abc", 3, "\r\nabc\r\nendstream\n", True),
+  (b"abc\n", 4, "\nabc\n\nendstream\n", True),
+  (b"abc", 50, "\nabc\nendstream\nendobj\n2 0 obj\n(" + "z" * 60 + ")\nendobj\n", True),
+  (b"abcdef", 2, "\nabcdef\nendstream\n", True),
+  (b"abendstream", 11, "\nabendstream\nendstream\n", False),
+  (b"ab e", None, "\nab eendstream\n", True),
+  (b"endstrendstreaxendstre", None, "\nendstrendstreaxendstre\nendstream\n", True),
+  (b"endstrendstreaxendstre", 22, "\nendstrendstreaxendstre\nendstream\n", True)
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,67 @@
+import sys
+import os
+import io
+import zlib
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def create_object(self, payload):
+    obj = PDFObject()
+    obj.named_values['Filter'] = PDFValue(PDFValue.NAME, 'FlateDecode')
+    obj.stream_data = zlib.compress(payload)
+    obj.named_values['Length'] = PDFValue(PDFValue.INT, len(obj.stream_data))
+    return obj
+
+  def parse_commands(self, chunks):
+    commands = []
+    reader = ParserReader()
+    if not reader.read_chunks(PDFContentStreamParser(commands.append).begin, chunks):
+      return None
+    return [str(cmd) for cmd in commands]
+
+  def write_stream(self, obj):
+    with io.BytesIO() as f:
+      PDFWriterUtils.write_object(obj, f)
+      return f.getvalue()
+
+  def execute(self, payload, chunk_size, threshold):
+    obj = self.create_object(payload)
+    decoded = b''.join(PDFStreamPipeline.decode(obj, chunk_size))
+    commands = self.parse_commands(PDFStreamPipeline.decode(obj, chunk_size))
+    expected_commands = self.parse_commands([payload])
+
+    spool = PDFStreamPipeline.collect(PDFStreamPipeline.decode(obj, chunk_size), threshold)
+    view = spool.get_view() if threshold is not None else payload
+    deflated = PDFStreamPipeline.collect(PDFStreamPipeline.deflate(PDFStreamPipeline.iter_chunks(spool, chunk_size), 9))
+    written = self.write_stream(self.create_object(payload))
+    spooled_obj = self.create_object(payload)
+    PDFFlateEngine.set_stream(spooled_obj, spool, False)
+    spool_written = self.write_stream(spooled_obj)
+
+    if decoded == payload and commands == expected_commands and bytes(spool) == payload and bytes(view) == payload and zlib.decompress(deflated) == payload and payload in spool_written and len(spool) == spooled_obj.named_values['Length'].value:
+      print("PASS: chunk size '{0}' threshold '{1}' commands '{2}'".format(chunk_size, threshold, len(commands)))
+      return True
+    print("FAIL: chunk size '{0}' threshold '{1}' decoded '{2}' commands '{3}'".format(chunk_size, threshold, decoded[:40], commands[:4] if commands else commands))
+    return False
+
+
+payload = ''.join(["q 0 0 1 rg {0} {1} 10.5 20 re f Q\n".format(i, i * 2) for i in range(200)]).encode()
+
+test_case_params = [
+  (payload, 1 << 16, None),
+  (payload, 7, 64),
+  (payload, 1, 1 << 20),
+  (b'', 16, 16),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,64 @@
+import sys
+import os
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.values = []
+
+  def set_value(self, v):
+    self.values.append(v)
+
+  def read_value(self, text):
+    reader = ParserReader()
+    parser = PDFArrayParser(self.set_value)
+    reader.read_string(parser.begin, "[{0} ] ".format(text))
+    return self.values[-1].value[0]
+
+  def is_immutable(self, value):
+    try:
+      value.value = None
+    except AttributeError:
+      return True
+    return False
+
+  def execute(self, text, expected, shared):
+    first = self.read_value(text)
+    second = self.read_value(text)
+    received = first.default_value_str()
+    if received == expected and (first is second) == shared and self.is_immutable(first) == shared:
+      print("PASS: expected '{0}' shared '{1}' received '{2}'".format(expected, shared, received))
+      return True
+    print("FAIL: expected '{0}' shared '{1}' received '{2}' shared '{3}'".format(expected, shared, received, first is second))
+    return False
+
+
+test_case_params = [
+  ("/Type", "/Type", True),
+  ("/Length", "/Length", True),
+  ("0", "0", True),
+  ("1024", "1024", True),
+  ("1025", "1025", False),
+  ("-3", "-3", True),
+  ("true", "true", True),
+  ("false", "false", True),
+  ("null", "null", True),
+  ("1.5", "1.5", False),
+  ("(text)", "(text)", False),
+  ("<< /A 1 >>", "<</A 1>>", False),
+]
+
+result = True
+for params in test_case_params:
+  for lexer in [True, False]:
+    PDFLexer.enabled = lexer
+    test_case = TestCase()
+    if test_case.execute(*params) != True:
+      result = False
+PDFLexer.enabled = True
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,137 @@
+import sys
+import os
+import tempfile
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.pdf = None
+
+  def set_pdf(self, pdf):
+    self.pdf = pdf
+
+  def read_file(self, filename):
+    self.pdf = None
+    parser = PDFParser(self.set_pdf)
+    reader = ParserReader()
+    reader.read_file(parser.begin, filename)
+    return self.pdf
+
+  def write_incremental(self, pdf, filename, out_path):
+    PDFWriter.write_incremental(pdf, filename, out_path)
+    with open(filename, 'rb') as f:
+      original = f.read()
+    with open(out_path, 'rb') as f:
+      return f.read().startswith(original)
+
+  def write_file(self, pdf, filename, out_path, object_streams=False, buffered=True):
+    pdf.source_path = filename
+    PDFWriter.write_file(pdf, out_path, object_streams, buffered)
+    with open(filename, 'rb') as f:
+      original = f.read()
+    with open(out_path, 'rb') as f:
+      written = f.read()
+    # both backends produce the same bytes
+    if written != PDFWriter.serialize(pdf, object_streams).getvalue():
+      return False
+    # untouched objects are copied verbatim from the source
+    for key, obj in pdf.objects.items():
+      if object_streams or obj.source_span is None:
+        continue
+      if not obj.is_dirty() and original[obj.source_span[0]:obj.source_span[1]] not in written:
+        return False
+    return True
+
+  def execute(self, filename, key, mode):
+    pdf = self.read_file(filename)
+    pdf.objects[key].named_values['Modified'] = PDFValue(PDFValue.INT, 1)
+    new_obj = pdf.create_new_object()
+    new_obj.named_values['Type'] = PDFValue(PDFValue.NAME, 'Annot')
+    expected = {k:str(o) for k, o in pdf.objects.items()}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      out_path = os.path.join(tmp_dir, 'out.pdf')
+      if mode == 'incremental':
+        written = self.write_incremental(pdf, filename, out_path)
+      else:
+        written = self.write_file(pdf, filename, out_path, mode == 'object streams', mode != 'unbuffered')
+      received = {k:str(o) for k, o in self.read_file(out_path).objects.items()}
+      lazy_pdf = PDFLazyLoader.read_file(out_path)
+      lazy_received = None
+      if lazy_pdf is not None:
+        lazy_received = {k:str(o) for k, o in lazy_pdf.objects.items()}
+
+    if written and received == expected and lazy_received == expected:
+      print("PASS: {0} update of '{1}' object '{2}'".format(mode, filename, key))
+      return True
+    print("FAIL: {0} update of '{1}' expected '{2}' received '{3}' lazy '{4}'".format(mode, filename, expected, received, lazy_received))
+    return False
+
+class NestedTestCase(TestCase):
+  # edits inside arrays and dictionaries of parsed objects
+  EDITS = {
+    'kids': lambda pdf: pdf.objects[(1, 0)].named_values['Kids'].value.append(PDFValue(PDFValue.REFERENCE, PDFReference(5, 0))),
+    'media box': lambda pdf: pdf.objects[(5, 0)].named_values['MediaBox'].value.__setitem__(2, PDFValue(PDFValue.FLOAT, 612.5)),
+    'nested dictionary': lambda pdf: pdf.objects[(2, 0)].named_values['ExtGState'].value['a0'].value.pop('ca'),
+  }
+
+  def execute(self, filename, edit, mode, expected_bytes):
+    pdf = self.read_file(filename)
+    NestedTestCase.EDITS[edit](pdf)
+    expected = {k:str(o) for k, o in pdf.objects.items()}
+    dirty = sorted(obj.get_key() for obj in pdf.get_modified_objects())
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      out_path = os.path.join(tmp_dir, 'out.pdf')
+      if mode == 'incremental':
+        written = self.write_incremental(pdf, filename, out_path)
+      else:
+        written = self.write_file(pdf, filename, out_path, mode == 'object streams')
+      with open(out_path, 'rb') as f:
+        written = written and expected_bytes in f.read()
+      received = {k:str(o) for k, o in self.read_file(out_path).objects.items()}
+
+    if written and received == expected and len(dirty) == 1:
+      print("PASS: {0} update of '{1}' edit '{2}'".format(mode, filename, edit))
+      return True
+    print("FAIL: {0} update of '{1}' edit '{2}' dirty '{3}' written '{4}' received '{5}'".format(mode, filename, edit, dirty, written, received))
+    return False
+
+
+test_case_params = [
+  ("./pdf/simple.pdf", (3, 0), 'incremental'),
+  ("./pdf/simple.pdf", (7, 0), 'incremental'),
+  ("./pdf/simple.pdf", (3, 0), 'full'),
+  ("./pdf/simple.pdf", (7, 0), 'full'),
+  ("./pdf/simple.pdf", (7, 0), 'object streams'),
+  ("./pdf/simple.pdf", (7, 0), 'unbuffered'),
+  ("./pdf/out.pdf", (5, 0), 'incremental'),
+  ("./pdf/out.pdf", (5, 0), 'full'),
+  ("./pdf/out.pdf", (8, 0), 'object streams'),
+  ("./pdf/out.pdf", (8, 0), 'unbuffered'),
+]
+
+nested_test_case_params = [
+  ("./pdf/simple.pdf", 'kids', 'full', b'/Kids [5 0 R 5 0 R]'),
+  ("./pdf/simple.pdf", 'kids', 'incremental', b'/Kids [5 0 R 5 0 R]'),
+  ("./pdf/simple.pdf", 'media box', 'full', b'612.5'),
+  ("./pdf/simple.pdf", 'media box', 'incremental', b'612.5'),
+  ("./pdf/simple.pdf", 'nested dictionary', 'full', b'/a0 <</CA 0.0980392>>'),
+  ("./pdf/simple.pdf", 'nested dictionary', 'incremental', b'/a0 <</CA 0.0980392>>'),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(params[0], params[1], params[2]) != True:
+    result = False
+for params in nested_test_case_params:
+  test_case = NestedTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,111 @@
+import sys
+import os
+import re
+import tempfile
+import io
+import contextlib
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def read_file(self, filename):
+    pdfs = []
+    reader = ParserReader()
+    reader.read_file(PDFParser(pdfs.append).begin, filename)
+    return pdfs[0]
+
+  def damage(self, data, damage):
+    if damage == 'startxref':
+      return re.sub(rb'startxref\s+\d+', b'startxref\n1', data)
+    if damage == 'xref':
+      # every offset in the table points into the middle of its header
+      return re.sub(rb'(\d{10}) (\d{5}) n', lambda m: b'%010d %s n' % (int(m.group(1)) + 3, m.group(2)), data)
+    if damage == 'tail':
+      return data[:data.rindex(b'endobj') + len(b'endobj')] + b'\n'
+    return data
+
+  def execute(self, filename, damage, block_size, expected_trailer):
+    expected = self.read_file(filename)
+    with open(filename, 'rb') as f:
+      data = self.damage(f.read(), damage)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'damaged.pdf')
+      with open(path, 'wb') as f:
+        f.write(data)
+      saved = PDFXrefRecovery.BLOCK_SIZE
+      PDFXrefRecovery.BLOCK_SIZE = block_size
+      output = io.StringIO()
+      try:
+        # the probe of the damaged xref fails without printing
+        with contextlib.redirect_stdout(output):
+          pdf = PDFLazyLoader.read_file(path, False, True)
+      finally:
+        PDFXrefRecovery.BLOCK_SIZE = saved
+      if output.getvalue() != '':
+        print("FAIL: '{0}' damage '{1}' printed '{2}'".format(filename, damage, output.getvalue()))
+        return False
+      if pdf is None or pdf.recovery is None:
+        print("FAIL: '{0}' damage '{1}' was not recovered".format(filename, damage))
+        return False
+      same = sorted(pdf.objects) == sorted(expected.objects) and all(str(pdf.objects[key]) == str(obj) for key, obj in expected.objects.items())
+      root = pdf.trailer['Root'].value.get_key() == expected.trailer['Root'].value.get_key()
+      trailer = sorted(pdf.trailer.keys()) == expected_trailer
+      if same and root and trailer:
+        print("PASS: '{0}' damage '{1}' block size '{2}' {3}".format(filename, damage, block_size, pdf.recovery.get_report().split('\n')[0]))
+        return True
+      print("FAIL: '{0}' damage '{1}' block size '{2}' same '{3}' root '{4}' trailer '{5}'".format(
+        filename, damage, block_size, same, root, sorted(pdf.trailer.keys())))
+    return False
+
+class UpdateTestCase:
+  def execute(self, text, expected_ids, expected_superseded, expected_values):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'update.pdf')
+      with open(path, 'wb') as f:
+        f.write(text.encode('latin-1'))
+      recovery = PDFXrefRecovery()
+      pdf = recovery.read_file(path)
+      if pdf is None:
+        print("FAIL: '{0}' was not recovered".format(text))
+        return False
+      values = {key: pdf.objects[key].values[0].value for key in expected_values}
+      superseded = sorted(key for key, offset in recovery.superseded)
+      if recovery.get_ids() == expected_ids and superseded == expected_superseded and values == expected_values:
+        print("PASS: expected '{0}' received '{1}'".format(expected_values, values))
+        return True
+      print("FAIL: ids '{0}' superseded '{1}' values '{2}'".format(recovery.get_ids(), superseded, values))
+      return False
+
+
+pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf')
+test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'), 'startxref', 1 << 22, ['Info', 'Root', 'Size']),
+  (os.path.join(pdf_dir, 'simple.pdf'), 'startxref', 7, ['Info', 'Root', 'Size']),
+  (os.path.join(pdf_dir, 'simple.pdf'), 'xref', 1 << 22, ['Info', 'Root', 'Size']),
+  (os.path.join(pdf_dir, 'simple.pdf'), 'tail', 1 << 22, ['Root', 'Size']),
+  (os.path.join(pdf_dir, 'out.pdf'), 'startxref', 1 << 22, ['ID', 'Info', 'Root', 'Size']),
+  (os.path.join(pdf_dir, 'out.pdf'), 'startxref', 64, ['ID', 'Info', 'Root', 'Size']),
+]
+
+update_test_case_params = [
+  ("%PDF-1.4\n1 0 obj\n<</Type /Catalog>>\nendobj\n2 0 obj\n(old)\nendobj\n3 0 obj 7 endobj\n"
+   "2 0 obj\n(new)\nendobj\n4 0 obj\n[1 2 0 obj]\nendobj\ntrailer\n<</Root 1 0 R /Prev 99>>\n",
+   '1-4', [(2, 0), (2, 0)], {(2, 0): 'new', (3, 0): 7}),
+  ("%PDF-1.4\n1 0 obj\n<</Type /Catalog>>\nendobj\n12 0 obj\n(a)\nendobj\n",
+   '1 12', [], {(12, 0): 'a'}),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in update_test_case_params:
+  test_case = UpdateTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
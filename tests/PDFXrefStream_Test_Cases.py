@@ -0,0 +1,59 @@
+import sys
+import os
+import zlib
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def create_xref_stream(self, rows, widths, predictor):
+    row_size = sum(widths)
+    data = bytearray()
+    prior = bytes(row_size)
+    for row in rows:
+      if predictor:
+        # PNG 'Up' filter
+        data.append(2)
+        data += bytes([(row[i] - prior[i]) & 0xff for i in range(row_size)])
+      else:
+        data += row
+      prior = row
+    obj = PDFObject()
+    obj.named_values['Type'] = PDFValue(PDFValue.NAME, 'XRef')
+    obj.named_values['Size'] = PDFValue(PDFValue.INT, len(rows))
+    obj.named_values['Root'] = PDFValue(PDFValue.REFERENCE, PDFReference(1, 0))
+    obj.named_values['W'] = PDFValue(PDFValue.ARRAY, [PDFValue(PDFValue.INT, w) for w in widths])
+    obj.named_values['Filter'] = PDFValue(PDFValue.NAME, 'FlateDecode')
+    if predictor:
+      params = {'Predictor': PDFValue(PDFValue.INT, 12), 'Columns': PDFValue(PDFValue.INT, row_size)}
+      obj.named_values['DecodeParms'] = PDFValue(PDFValue.DICTIONARY, params)
+    obj.stream_data = zlib.compress(bytes(data))
+    return obj
+
+  def execute(self, expected_entries, rows, widths, predictor):
+    xref, trailer = PDFXrefStream.read(self.create_xref_stream(rows, widths, predictor))
+    entries = [(obj_id, e.offset, e.generation, e.flag) for obj_id, e in xref.get_entries()]
+    if entries == expected_entries and list(trailer.keys()) == ['Size', 'Root']:
+      print("PASS: expected '{0}' received '{1}'".format(expected_entries, entries))
+      return True
+    print("FAIL: expected '{0}' received '{1}' trailer '{2}'".format(expected_entries, entries, trailer))
+    return False
+
+
+rows = [bytes([0, 0, 0, 0xff]), bytes([1, 0, 15, 0]), bytes([2, 0, 9, 3]), bytes([1, 3, 0x20, 1])]
+expected_entries = [(0, 0, 0xff, 'f'), (1, 15, 0, 'n'), (2, 9, 3, 'c'), (3, 0x320, 1, 'n')]
+
+test_case_params = [
+  (expected_entries, rows, [1, 2, 1], False),
+  (expected_entries, rows, [1, 2, 1], True),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
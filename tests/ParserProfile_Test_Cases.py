@@ -0,0 +1,113 @@
+import sys
+import os
+import subprocess
+import tempfile
+from context import utils
+from utils.pdf import *
+from utils.parserprofile import ParserProfile
+
+class TestCase:
+  def read_file(self, filename, use_mmap, profile):
+    pdfs = []
+    reader = ParserReader(profile=profile)
+    if not reader.read_file(PDFParser(pdfs.append).begin, filename, use_mmap) or len(pdfs) == 0:
+      return None
+    return pdfs[0]
+
+  def execute(self, filename, use_mmap, expected_states):
+    profile = ParserProfile()
+    plain = self.read_file(filename, use_mmap, None)
+    profiled = self.read_file(filename, use_mmap, profile)
+    # the profiled loop parses exactly like the plain one
+    same = PDFWriter.serialize(plain, False).getvalue() == PDFWriter.serialize(profiled, False).getvalue()
+    names = [state[0] for state in profile.get_states()]
+    missing = [name for name in expected_states if name not in names]
+    ordered = all(a[2] >= b[2] for a, b in zip(profile.get_states(), profile.get_states()[1:]))
+    counts = profile.bytes == os.path.getsize(filename) and profile.max_stack_depth > 0 and profile.pushbacks > 0
+    report = profile.get_report(3)
+    if same and len(missing) == 0 and ordered and counts and len(report.split('\n')) == 5:
+      print("PASS: '{0}' mmap '{1}' states '{2}' stack depth '{3}' pushbacks '{4}'".format(
+        filename, use_mmap, len(names), profile.max_stack_depth, profile.pushbacks))
+      return True
+    print("FAIL: '{0}' mmap '{1}' same '{2}' missing '{3}' ordered '{4}' bytes '{5}' stack depth '{6}' pushbacks '{7}'".format(
+      filename, use_mmap, same, missing, ordered, profile.bytes, profile.max_stack_depth, profile.pushbacks))
+    return False
+
+class CoreTestCase:
+  def execute(self, filename, core, incremental):
+    # whichever core parses is the one reported, push parsing included
+    profile = ParserProfile()
+    pdfs = []
+    ParserReader.core = core
+    try:
+      if incremental:
+        parser = IncrementalPDFParser(pdfs.append, profile=profile)
+        with open(filename, 'rb') as f:
+          parser.feed_file(f, 4096)
+        parsed = parser.close()
+      else:
+        parsed = ParserReader(profile=profile).read_file(PDFParser(pdfs.append).begin, filename)
+    finally:
+      ParserReader.core = 'state'
+    report = profile.get_report(3)
+    if parsed and len(pdfs) > 0 and profile.cores == {core} and report.startswith('core: {0} '.format(core)) and profile.bytes == os.path.getsize(filename):
+      print("PASS: '{0}' core '{1}' incremental '{2}' states '{3}'".format(filename, core, incremental, len(profile.states)))
+      return True
+    print("FAIL: '{0}' core '{1}' incremental '{2}' cores '{3}' bytes '{4}'".format(filename, core, incremental, profile.cores, profile.bytes))
+    return False
+
+class StdinTestCase:
+  def execute(self, filename):
+    # deflate_pdf reads '-' from stdin through IncrementalPDFParser
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'deflate_pdf.py')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      with open(filename, 'rb') as f:
+        process = subprocess.run([sys.executable, script, '--profile', '-', os.path.join(tmp_dir, 'out.pdf')], stdin=f, capture_output=True)
+    report = process.stderr.decode().split('\n')
+    counts = report[0].startswith('core: {0} bytes: {1} '.format(ParserReader.core, os.path.getsize(filename)))
+    # the state core reports parser states, the generator core grammar rules
+    states = any(line.endswith(('PDFParser.begin_object', 'PDFGrammar.parse_document')) for line in report[2:])
+    if process.returncode == 0 and counts and states:
+      print("PASS: '{0}' stdin '{1}'".format(filename, report[0].split(' seconds')[0]))
+      return True
+    print("FAIL: '{0}' stdin returncode '{1}' report '{2}'".format(filename, process.returncode, report))
+    return False
+
+
+pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pdf')
+test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'), False, ['PDFParser.begin_object', 'PDFObjectParser.process_value', 'PDFValueParser.begin']),
+  (os.path.join(pdf_dir, 'simple.pdf'), True, ['PDFParser.begin_object', 'PDFStreamParser.begin']),
+  (os.path.join(pdf_dir, 'out.pdf'), False, ['PDFParser.begin_object', 'PDFStreamParser.begin', 'PDFStartXrefParser.read']),
+]
+
+core_test_case_params = [
+  (os.path.join(pdf_dir, 'out.pdf'), 'state', False),
+  (os.path.join(pdf_dir, 'out.pdf'), 'generator', False),
+  (os.path.join(pdf_dir, 'out.pdf'), 'state', True),
+  (os.path.join(pdf_dir, 'out.pdf'), 'generator', True),
+]
+
+stdin_test_case_params = [
+  (os.path.join(pdf_dir, 'simple.pdf'),),
+  (os.path.join(pdf_dir, 'out.pdf'),),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in core_test_case_params:
+  test_case = CoreTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in stdin_test_case_params:
+  test_case = StdinTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,106 @@
+import sys
+import os
+import zlib
+from context import utils
+from utils.pdf import *
+
+class TestCase:
+  def __init__(self):
+    self.pdf = None
+
+  def set_pdf(self, pdf):
+    self.pdf = pdf
+
+  def stream_data(self, pdf):
+    return {k:bytes(obj.stream_data) for k, obj in pdf.objects.items()}
+
+  def execute(self, expected_pdf, filename, block_size, use_mmap=False):
+    self.expected_pdf = expected_pdf
+    parser = PDFParser(self.set_pdf)
+    reader = ParserReader(block_size)
+    reader.read_file(parser.begin, filename, use_mmap)
+
+    if self.pdf is not None and str(self.pdf) == str(self.expected_pdf) and self.stream_data(self.pdf) == self.stream_data(self.expected_pdf):
+      print("PASS: block size {0} mmap {1}".format(block_size, use_mmap))
+      return True
+    else:
+      print("FAIL: block size {0} mmap {1} expected '{2}' received '{3}'".format(block_size, use_mmap, self.expected_pdf, self.pdf))
+    return False
+
+class BytesTestCase:
+  def execute(self, expected_pdf, data):
+    pdfs = []
+    result = ParserReader().read_bytes(PDFParser(pdfs.append).begin, data)
+    pdf = pdfs[0] if result and len(pdfs) > 0 else None
+    # streams are views of the input, nothing was copied
+    views = pdf is not None and all(type(obj.stream_data) is memoryview for obj in pdf.objects.values() if len(obj.stream_data) > 0)
+    if pdf is not None and str(pdf) == str(expected_pdf) and views:
+      print("PASS: read_bytes '{0}'".format(type(data).__name__))
+      return True
+    print("FAIL: read_bytes '{0}' views '{1}' received '{2}'".format(type(data).__name__, views, pdf))
+    return False
+
+class ContentStreamTestCase:
+  def execute(self, expected, data):
+    commands = []
+    ParserReader().read_bytes(PDFContentStreamParser(commands.append).begin, data)
+    received = [str(command) for command in commands]
+    # non-ASCII bytes come through unchanged, edited and deflated
+    editor = PDFContentStreamEditor(data)
+    for match in PDFContentStreamScanner.find(data, ['re']):
+      editor.delete_match(match)
+    inflated = zlib.decompress(b''.join(PDFStreamPipeline.deflate(editor.get_segments())))
+    if received == expected and inflated == editor.getvalue() and b'\xe9' in inflated:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}' inflated '{2}'".format(expected, received, inflated))
+    return False
+
+
+reference = TestCase()
+ParserReader().read_file(PDFParser(reference.set_pdf).begin, "./pdf/simple.pdf")
+out_reference = TestCase()
+ParserReader().read_file(PDFParser(out_reference.set_pdf).begin, "./pdf/out.pdf")
+
+test_case_params = [
+  (reference.pdf, "./pdf/simple.pdf", 1),
+  (reference.pdf, "./pdf/simple.pdf", 2),
+  (reference.pdf, "./pdf/simple.pdf", 7),
+  (reference.pdf, "./pdf/simple.pdf", 64),
+  (reference.pdf, "./pdf/simple.pdf", 64, True),
+  (out_reference.pdf, "./pdf/out.pdf", 4096),
+  (out_reference.pdf, "./pdf/out.pdf", 4096, True),
+]
+
+with open("./pdf/simple.pdf", 'rb') as f:
+  simple_data = f.read()
+bytes_test_case_params = [
+  (reference.pdf, simple_data),
+  (reference.pdf, bytearray(simple_data)),
+  (reference.pdf, memoryview(simple_data)),
+]
+
+content_stream = b'BT /F1 12 Tf (caf\xe9) Tj ET 0 0 1 1 re f\n'
+content_stream_test_case_params = [
+  (['BT', '/F1 12 Tf', '(caf\xe9)Tj', 'ET', '0 0 1 1 re', 'f'], content_stream),
+  (['BT', '/F1 12 Tf', '(caf\xe9)Tj', 'ET', '0 0 1 1 re', 'f'], memoryview(bytearray(content_stream))),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in bytes_test_case_params:
+  test_case = BytesTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in content_stream_test_case_params:
+  test_case = ContentStreamTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
@@ -0,0 +1,114 @@
+import sys
+import os
+import random
+from context import utils
+from utils.rectmatcher import *
+
+class TestCase:
+  def execute(self, expected, boxes, targets, tolerance=RectMatcher.DEFAULT_TOLERANCE):
+    received = RectMatcher.match(boxes, targets, tolerance)
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+class ShuffleTestCase:
+  def execute(self, count, missing):
+    # thousands of rects on a page, in unrelated orders on both sides
+    rng = random.Random(count)
+    rects = [(rng.randrange(0, 500) + rng.random(), rng.randrange(0, 800) + rng.random(), 20, -8) for i in range(count)]
+    order = list(range(count))
+    rng.shuffle(order)
+    space = SVGSpace([0, 0, 595.0, 842.0], (595.0 * 4 / 3, 842.0 * 4 / 3))
+    # the same rects as an SVG in px would have them
+    boxes = [space.get_box(x * 4 / 3, (842.0 - y) * 4 / 3, w * 4 / 3, -h * 4 / 3) for x, y, w, h in rects]
+    # the first missing rects are left out of the PDF
+    order = [i for i in order if i >= missing]
+    targets = [RectMatcher.get_box(*rects[i]) for i in order]
+    pairs, unmatched_boxes, unmatched_targets = RectMatcher.match(boxes, targets, 0.01)
+    expected = sorted((i, j) for j, i in enumerate(order))
+    if pairs == expected and unmatched_boxes == list(range(missing)) and unmatched_targets == []:
+      print("PASS: '{0}' rects '{1}' missing".format(count, missing))
+      return True
+    print("FAIL: '{0}' rects '{1}' missing pairs '{2}' unmatched '{3}' '{4}'".format(count, missing, len(pairs), unmatched_boxes[:10], unmatched_targets[:10]))
+    return False
+
+class SizeTestCase:
+  def execute(self, expected, attrs):
+    received = SVGSpace.get_size(attrs)
+    if received is not None and expected is not None:
+      received = tuple(round(v, 3) for v in received)
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+class BoxTestCase:
+  def execute(self, expected, attrs, media_box, rect):
+    space = SVGSpace(media_box, SVGSpace.get_size(attrs), SVGSpace.get_origin(attrs))
+    received = space.get_box(*rect)
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+
+a = (100, 690, 140, 700)
+b = (200, 638, 230, 650)
+test_case_params = [
+  (([(0, 1), (1, 0)], [], []), [a, b], [b, a]),
+  (([(0, 0)], [1], []), [a, b], [a]),
+  (([(0, 0)], [], [1]), [a], [a, b]),
+  (([], [0], [0]), [a], [(100, 692, 140, 702)]),
+  (([(0, 0)], [], []), [a], [(100, 692, 140, 702)], 2.0),
+  # the closest pair wins even when a worse one is found first
+  (([(0, 1), (1, 0)], [], []), [(0, 0, 10, 10), (0.5, 0, 10.5, 10)], [(0.6, 0, 10.6, 10), (0.1, 0, 10.1, 10)]),
+]
+
+shuffle_test_case_params = [
+  (2000, 0),
+  (5000, 17),
+]
+
+size_test_case_params = [
+  ((595.276, 841.89), {'width': '595.275574', 'height': '841.889771'}),
+  ((793.701, 1122.52), {'width': '210mm', 'height': '297mm'}),
+  ((100.0, 50.0), {'width': '210mm', 'height': '297mm', 'viewBox': '0 0 100 50'}),
+  ((100.0, 50.0), {'viewBox': '0,0,100,50'}),
+  (None, {'width': '100%', 'height': '100%'}),
+  (None, {}),
+]
+
+box_test_case_params = [
+  ((0.0, 90.0, 20.0, 100.0), {'viewBox': '0 0 100 50'}, [0, 0, 200, 100], (0, 0, 10, 5)),
+  # the viewBox origin is the top left corner of the page
+  ((0.0, 90.0, 20.0, 100.0), {'viewBox': '10 20 100 50'}, [0, 0, 200, 100], (10, 20, 10, 5)),
+  ((20.0, 10.0, 40.0, 20.0), {'viewBox': '-10 -20 100 50'}, [0, 0, 200, 100], (0, 20, 10, 5)),
+  ((10.0, 100.0, 20.0, 120.0), {'width': '10', 'height': '10'}, [0, 0, 100, 200], (1, 4, 1, 1)),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in shuffle_test_case_params:
+  test_case = ShuffleTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in size_test_case_params:
+  test_case = SizeTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in box_test_case_params:
+  test_case = BoxTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
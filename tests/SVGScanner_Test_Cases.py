@@ -0,0 +1,101 @@
+import sys
+import os
+import io
+from context import utils
+from utils.svgscan import *
+
+svg = (b'<?xml version="1.0"?>\n<!DOCTYPE svg>\n<svg viewBox="0 0 100 50" width=\'210mm\'>'
+  b'<!-- <rect id="a" x="9"/> --><![CDATA[ <rect id="a"/> ]]>'
+  b'<image href="data:' + b'Q' * 20000 + b'"/>'
+  b'<g><rect id="a" x=1 y = "2" style="fill:rgb(255,0,255)">\n<title>t</title></rect></g>'
+  b'<rect id="b" x="&lt;5"/><rect id="c"/><svg x="10" y="20"><rect id="b" x="7"/></svg></svg>')
+
+class TestCase:
+  def execute(self, expected, data, ids, chunk_size):
+    elements = list(SVGScanner(ids, chunk_size).scan(io.BytesIO(data)))
+    received = [(e.name, e.attributes, bytes(data[e.start:e.end])) for e in elements]
+    # every span points at the raw value in the input
+    spans = all(data[start:end].decode() == e.attributes[name].replace('<', '&lt;') for e in elements for name, (start, end) in e.spans.items())
+    if received == expected and spans:
+      print("PASS: chunk size '{0}' elements '{1}'".format(chunk_size, len(received)))
+      return True
+    print("FAIL: chunk size '{0}' expected '{1}' received '{2}' spans '{3}'".format(chunk_size, expected, received, spans))
+    return False
+
+class LimitTestCase:
+  def execute(self, size):
+    # values past MAX_VALUE are skipped, the rest of the element is kept
+    data = b'<svg><rect id="a" d="' + b'x' * size + b'" x="1"/></svg>'
+    elements = list(SVGScanner(None, 1000).scan(io.BytesIO(data)))
+    rect = elements[-1]
+    kept = 'd' in rect.attributes
+    # skipped values can still be read again through their span
+    value = rect.read_attr(io.BytesIO(data), 'd')
+    if rect.get_attr('x') == '1' and kept == (size <= SVGScanner.MAX_VALUE) and value == 'x' * size:
+      print("PASS: value size '{0}' kept '{1}'".format(size, kept))
+      return True
+    print("FAIL: value size '{0}' kept '{1}' attributes '{2}' spans '{3}'".format(size, kept, list(rect.attributes), list(rect.spans)))
+    return False
+
+class EditorTestCase:
+  def execute(self, expected, data, edits):
+    editor = SVGStreamEditor()
+    for start, end, replacement in edits:
+      editor.replace(start, end, replacement)
+    output = io.BytesIO()
+    editor.write(io.BytesIO(data), output, 3)
+    received = output.getvalue()
+    if received == expected:
+      print("PASS: expected '{0}' received '{1}'".format(expected, received))
+      return True
+    print("FAIL: expected '{0}' received '{1}'".format(expected, received))
+    return False
+
+
+expected = [
+  ('svg', {'viewBox': '0 0 100 50', 'width': '210mm'}, b'<svg viewBox="0 0 100 50" width=\'210mm\'>'),
+  ('rect', {'id': 'a', 'x': '1', 'y': '2', 'style': 'fill:rgb(255,0,255)'}, b'<rect id="a" x=1 y = "2" style="fill:rgb(255,0,255)">\n<title>t</title></rect>'),
+  ('rect', {'id': 'b', 'x': '<5'}, b'<rect id="b" x="&lt;5"/>'),
+  ('svg', {'x': '10', 'y': '20'}, b'<svg x="10" y="20">'),
+  ('rect', {'id': 'b', 'x': '7'}, b'<rect id="b" x="7"/>'),
+]
+
+test_case_params = [
+  (expected, svg, {'a', 'b'}, 1),
+  (expected, svg, {'a', 'b'}, 7),
+  (expected, svg, {'a', 'b'}, 4096),
+  (expected, svg, {'a', 'b'}, SVGScanner.CHUNK_SIZE),
+  (expected[:3] + [('rect', {'id': 'c'}, b'<rect id="c"/>')] + expected[3:], svg, None, 64),
+  ([], b'', None, 64),
+  ([], b'<svg', None, 64),
+]
+
+limit_test_case_params = [
+  (SVGScanner.MAX_VALUE,),
+  (SVGScanner.MAX_VALUE + 1,),
+  (100000,),
+]
+
+editor_test_case_params = [
+  (b'<a><rect style="x;y"/></a>', b'<rect style="x"/>', [(0, 0, b'<a>'), (13, 14, b'x;y'), (17, 17, b'</a>')]),
+  (b'<rect/>', b'<rect/>', []),
+]
+
+result = True
+for params in test_case_params:
+  test_case = TestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in limit_test_case_params:
+  test_case = LimitTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+for params in editor_test_case_params:
+  test_case = EditorTestCase()
+  if test_case.execute(*params) != True:
+    result = False
+
+if result:
+  print("PASSED")
+else:
+  print("FAILED")
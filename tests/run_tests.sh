@@ -19,3 +19,69 @@ python3 PDFValueParser_Test_Cases.py
 python3 PDFXrefEntryParser_Test_Cases.py
 
 python3 PDFXrefParser_Test_Cases.py
+
+python3 ParserReader_Test_Cases.py
+
+python3 PDFLexer_Test_Cases.py
+
+python3 PDFLazyLoader_Test_Cases.py
+
+python3 PDFStreamParser_Test_Cases.py
+
+python3 PDFWriter_Test_Cases.py
+
+python3 PDFXrefStream_Test_Cases.py
+
+python3 PDFFlateEngine_Test_Cases.py
+
+python3 PDFStreamPipeline_Test_Cases.py
+
+python3 PDFObjectIds_Test_Cases.py
+
+python3 PDFValueCache_Test_Cases.py
+
+python3 PDFContentStreamScanner_Test_Cases.py
+
+python3 PDFContentStreamEditor_Test_Cases.py
+
+python3 PDFParseCache_Test_Cases.py
+
+python3 PDFBenchmark_Test_Cases.py
+
+python3 ParserProfile_Test_Cases.py
+
+python3 PDFXrefRecovery_Test_Cases.py
+
+python3 IncrementalPDFParser_Test_Cases.py
+
+python3 PDFGrammar_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 basic_test_case.py
+
+PDF_PARSER_CORE=generator python3 out_test_case.py
+
+PDF_PARSER_CORE=generator python3 PDFArrayParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFDictionaryParser_Test_Case.py
+
+PDF_PARSER_CORE=generator python3 PDFObjectParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFStringParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFTokenParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFValueParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFXrefEntryParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFXrefParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 ParserReader_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 PDFStreamParser_Test_Cases.py
+
+PDF_PARSER_CORE=generator python3 IncrementalPDFParser_Test_Cases.py
+
+python3 RectMatcher_Test_Cases.py
+
+python3 SVGScanner_Test_Cases.py
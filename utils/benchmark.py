@@ -0,0 +1,256 @@
+import io
+import gc
+import os
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+from utils.pdf import PDFParser
+from utils.pdf import PDFContentStreamParser
+from utils.pdf import PDFContentStreamQuery
+from utils.pdf import ParserReader
+from utils.pdf import PDFWriter
+
+####################
+# PDFBenchmarkConfig
+####################
+class PDFBenchmarkConfig:
+  def __init__(self):
+    # plain dictionary objects, each nested depth levels deep
+    self.objects = 2000
+    self.depth = 3
+    self.array_size = 8
+    # binary stream objects of stream_size bytes each
+    self.streams = 16
+    self.stream_size = 1 << 16
+    # pages with an uncompressed content stream of operators operators
+    self.pages = 4
+    self.operators = 20000
+    # every link_rects-th fill is a link rect, drawn in 1 0 1 rg
+    self.link_rects = 50
+    self.runs = 3
+    self.seed = 1
+
+  def to_dict(self):
+    return dict(self.__dict__)
+
+######################
+# PDFSyntheticDocument
+######################
+# Builds a well formed PDF as bytes, independent of PDFWriter so the writer
+# can be measured on the parsed result.
+class PDFSyntheticDocument:
+  def get_value(rng, config, max_id):
+    kind = rng.randrange(6)
+    if kind == 0:
+      return b'%d' % rng.randrange(-100000, 100000)
+    if kind == 1:
+      return b'%.4f' % (rng.random() * 1000)
+    if kind == 2:
+      return b'(text \\(%d\\) value)' % rng.randrange(1000)
+    if kind == 3:
+      return b'%d 0 R' % rng.randrange(1, max_id + 1)
+    if kind == 4:
+      return b'/Name' + str(rng.randrange(64)).encode()
+    return b'[' + b' '.join(b'%d' % rng.randrange(1000) for i in range(config.array_size)) + b']'
+
+  def get_dictionary(rng, depth, config, max_id):
+    entries = [b'/Type /Synthetic']
+    for i in range(4):
+      entries.append(b'/Key' + str(i).encode() + b' ' + PDFSyntheticDocument.get_value(rng, config, max_id))
+    if depth > 1:
+      entries.append(b'/Child ' + PDFSyntheticDocument.get_dictionary(rng, depth - 1, config, max_id))
+    return b'<<' + b' '.join(entries) + b'>>'
+
+  def get_content_stream(rng, config):
+    commands = []
+    count = 0
+    fills = 0
+    while count < config.operators:
+      x = rng.random() * 500
+      y = rng.random() * 800
+      colour = b'%.3f %.3f %.3f' % (rng.random(), rng.random(), rng.random())
+      if config.link_rects > 0 and fills % config.link_rects == 0:
+        colour = b'1 0 1'
+      fills += 1
+      commands.append(b'q %s rg %.2f %.2f %.2f %.2f re f Q' % (colour, x, y, 20, 10))
+      commands.append(b'BT /F1 %d Tf %.2f %.2f Td (Synthetic \\(text\\) run) Tj ET' % (rng.randrange(6, 24), x, y))
+      commands.append(b'1 0 0 1 %.2f %.2f cm %.2f %.2f m %.2f %.2f l S' % (x, y, 0, 0, 10, 10))
+      count += 14
+    return b'\n'.join(commands) + b'\n'
+
+  def generate(config):
+    rng = random.Random(config.seed)
+    bodies = []
+    # 1 catalog, 2 page tree, then pages with their content, then the rest
+    page_ids = [3 + i * 2 for i in range(config.pages)]
+    first_id = 3 + config.pages * 2
+    max_id = first_id + config.objects + config.streams - 1
+    bodies.append(b'<</Type /Catalog /Pages 2 0 R>>')
+    bodies.append(b'<</Type /Pages /Kids [' + b' '.join(b'%d 0 R' % i for i in page_ids) + b'] /Count %d>>' % config.pages)
+    for page_id in page_ids:
+      bodies.append(b'<</Type /Page /Parent 2 0 R /MediaBox [0 0 595.28 841.89] /Contents %d 0 R /Resources <<>>>>' % (page_id + 1))
+      content = PDFSyntheticDocument.get_content_stream(rng, config)
+      bodies.append(b'<</Length %d>>\nstream\n' % len(content) + content + b'\nendstream')
+    for i in range(config.objects):
+      bodies.append(PDFSyntheticDocument.get_dictionary(rng, config.depth, config, max_id))
+    for i in range(config.streams):
+      data = rng.getrandbits(8 * config.stream_size).to_bytes(config.stream_size, 'little')
+      bodies.append(b'<</Length %d /Filter /FlateDecode>>\nstream\n' % len(data) + data + b'\nendstream')
+
+    out = bytearray(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for obj_id, body in enumerate(bodies, 1):
+      offsets.append(len(out))
+      out += b'%d 0 obj\n' % obj_id + body + b'\nendobj\n'
+    start_xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(bodies) + 1)
+    for offset in offsets:
+      out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<</Size %d /Root 1 0 R>>\nstartxref\n%d\n%%%%EOF\n' % (len(bodies) + 1, start_xref)
+    return bytes(out)
+
+##############
+# PDFBenchmark
+##############
+class PDFBenchmark:
+  # (name, object streams, buffered) of each PDFWriter.write_file run
+  WRITES = (('PDFWriter.file', False, False), ('PDFWriter.buffered', False, True), ('PDFWriter.object_streams', True, True))
+
+  def parse_buffer(data):
+    pdfs = []
+    if not ParserReader().parse_buffer(PDFParser(pdfs.append).begin, memoryview(data)) or len(pdfs) == 0:
+      raise ValueError("Synthetic document failed to parse")
+    return pdfs[0]
+
+  def parse_stream(data):
+    pdfs = []
+    with io.BytesIO(data) as f:
+      if not ParserReader().parse(PDFParser(pdfs.append).begin, f) or len(pdfs) == 0:
+        raise ValueError("Synthetic document failed to parse")
+    return pdfs[0]
+
+  def get_content_streams(pdf):
+    streams = []
+    for obj in pdf.objects.values():
+      if 'Type' in obj.named_values and obj.named_values['Type'].value == 'Page':
+        streams.append(bytes(pdf.objects[obj.named_values['Contents'].value.get_key()].stream_data))
+    return streams
+
+  def parse_content_streams(streams):
+    commands = []
+    for stream in streams:
+      if not ParserReader().read_bytes(PDFContentStreamParser(commands.append).begin, stream):
+        raise ValueError("Synthetic content stream failed to parse")
+    return commands
+
+  def is_link_colour(operands):
+    return [value.value for value in operands] == [1, 0, 1]
+
+  def get_link_rects(commands):
+    # what link_pdf looks for, the 're' operands inside a 1 0 1 rg fill
+    rects = []
+    selected = False
+    for command in commands:
+      if command.name == 'rg':
+        selected = PDFBenchmark.is_link_colour(command.params)
+      elif command.name == 'Q':
+        selected = False
+      elif command.name == 're' and selected:
+        rects.append([param.value for param in command.params])
+    return rects
+
+  def query_content_streams(streams):
+    rects = []
+    for stream in streams:
+      query = PDFContentStreamQuery(['re'], 'rg', PDFBenchmark.is_link_colour, ['Q'])
+      rects.extend(match.get_numbers(stream) for match in query.find(stream))
+    return rects
+
+  def serialize(pdf):
+    return PDFWriter.serialize(pdf, False).getvalue()
+
+  def write_file(pdf, filename, object_streams, buffered):
+    PDFWriter.write_file(pdf, filename, object_streams, buffered)
+    return os.path.getsize(filename)
+
+  def measure(func, arg, runs):
+    # best of runs for time, then one traced run for peak memory since
+    # tracemalloc slows everything it watches
+    best = None
+    for i in range(runs):
+      gc.collect()
+      start = time.perf_counter()
+      result = func(arg)
+      elapsed = time.perf_counter() - start
+      if best is None or elapsed < best:
+        best = elapsed
+    result = None
+    gc.collect()
+    tracemalloc.start()
+    result = func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return (best, peak, result)
+
+  def get_result(size, count, seconds, peak):
+    seconds = max(seconds, 1e-9)
+    return {
+      'bytes': size,
+      'items': count,
+      'seconds': round(seconds, 6),
+      'mb_per_s': round(size / seconds / (1 << 20), 3),
+      'items_per_s': round(count / seconds, 1),
+      'peak_bytes': peak,
+    }
+
+  def run(config):
+    data = PDFSyntheticDocument.generate(config)
+    results = {}
+
+    seconds, peak, pdf = PDFBenchmark.measure(PDFBenchmark.parse_buffer, data, config.runs)
+    results['PDFParser.buffer'] = PDFBenchmark.get_result(len(data), len(pdf.objects), seconds, peak)
+    seconds, peak, pdf = PDFBenchmark.measure(PDFBenchmark.parse_stream, data, config.runs)
+    results['PDFParser.stream'] = PDFBenchmark.get_result(len(data), len(pdf.objects), seconds, peak)
+
+    streams = PDFBenchmark.get_content_streams(pdf)
+    seconds, peak, commands = PDFBenchmark.measure(PDFBenchmark.parse_content_streams, streams, config.runs)
+    results['PDFContentStreamParser'] = PDFBenchmark.get_result(sum(len(s) for s in streams), len(commands), seconds, peak)
+    seconds, peak, rects = PDFBenchmark.measure(PDFBenchmark.query_content_streams, streams, config.runs)
+    results['PDFContentStreamQuery'] = PDFBenchmark.get_result(sum(len(s) for s in streams), len(rects), seconds, peak)
+    if rects != PDFBenchmark.get_link_rects(commands):
+      raise ValueError("Content stream query and parser found different link rects")
+
+    # every object goes through the serializer instead of the raw copy path
+    for obj in pdf.objects.values():
+      obj.set_dirty(True)
+    seconds, peak, output = PDFBenchmark.measure(PDFBenchmark.serialize, pdf, config.runs)
+    results['PDFWriter'] = PDFBenchmark.get_result(len(output), len(pdf.objects), seconds, peak)
+    with tempfile.TemporaryDirectory() as temp_dir:
+      filename = os.path.join(temp_dir, 'out.pdf')
+      for name, object_streams, buffered in PDFBenchmark.WRITES:
+        write = lambda pdf: PDFBenchmark.write_file(pdf, filename, object_streams, buffered)
+        seconds, peak, size = PDFBenchmark.measure(write, pdf, config.runs)
+        results[name] = PDFBenchmark.get_result(size, len(pdf.objects), seconds, peak)
+
+    return {
+      'python': sys.version.split()[0],
+      'config': config.to_dict(),
+      'document_bytes': len(data),
+      'results': results,
+    }
+
+  def compare(report, baseline, tolerance=0.1):
+    # a benchmark regresses when it loses more than tolerance of its
+    # throughput or grows its peak memory by more than tolerance
+    regressions = []
+    for name, result in report['results'].items():
+      if name not in baseline.get('results', {}):
+        continue
+      base = baseline['results'][name]
+      if result['mb_per_s'] < base['mb_per_s'] * (1 - tolerance):
+        regressions.append({'benchmark': name, 'metric': 'mb_per_s', 'baseline': base['mb_per_s'], 'current': result['mb_per_s']})
+      if result['peak_bytes'] > base['peak_bytes'] * (1 + tolerance):
+        regressions.append({'benchmark': name, 'metric': 'peak_bytes', 'baseline': base['peak_bytes'], 'current': result['peak_bytes']})
+    return regressions
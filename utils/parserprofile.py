@@ -0,0 +1,59 @@
+###############
+# ParserProfile
+###############
+# Collected by a ParserReader that is given one. The reader loop checks for
+# it around each parse function call, readers without one skip the timing.
+class ParserProfile:
+  def __init__(self):
+    # __qualname__ -> [calls, seconds]
+    self.states = {}
+    self.bytes = 0
+    self.pushbacks = 0
+    self.pushback_bytes = 0
+    # pushed back bytes that could not be rewound in place and were copied
+    self.replayed_bytes = 0
+    self.max_stack_depth = 0
+    self.seconds = 0.0
+    # the parser cores that ran, see ParserReader.core
+    self.cores = set()
+
+  def add_core(self, core):
+    self.cores.add(core)
+
+  def add_state(self, func, seconds):
+    name = getattr(func, '__qualname__', None) or type(func).__qualname__
+    state = self.states.get(name)
+    if state is None:
+      state = self.states[name] = [0, 0.0]
+    state[0] += 1
+    state[1] += seconds
+
+  def add_pushback(self, count, replayed):
+    self.pushbacks += 1
+    self.pushback_bytes += count
+    if replayed:
+      self.replayed_bytes += count
+
+  def set_stack_depth(self, depth):
+    if depth > self.max_stack_depth:
+      self.max_stack_depth = depth
+
+  def get_states(self):
+    # (name, calls, seconds) with the most expensive state first
+    return sorted([(name, calls, seconds) for name, (calls, seconds) in self.states.items()], key=lambda s: (-s[2], -s[1], s[0]))
+
+  def get_report(self, limit=None):
+    states = self.get_states()
+    if limit is not None:
+      states = states[:limit]
+    total = max(sum(state[1] for state in self.states.values()), 1e-9)
+    lines = []
+    lines.append('core: {0} bytes: {1} seconds: {2:.3f} pushbacks: {3} pushback bytes: {4} replayed bytes: {5} max stack depth: {6}'.format(
+      ', '.join(sorted(self.cores)), self.bytes, self.seconds, self.pushbacks, self.pushback_bytes, self.replayed_bytes, self.max_stack_depth))
+    lines.append('{0:>12} {1:>10} {2:>7} {3:>10}  {4}'.format('calls', 'seconds', '%', 'us/call', 'state'))
+    for name, calls, seconds in states:
+      lines.append('{0:>12} {1:>10.4f} {2:>6.1f}% {3:>10.3f}  {4}'.format(calls, seconds, seconds * 100 / total, seconds * 1e6 / calls, name))
+    return '\n'.join(lines)
+
+  def __str__(self):
+    return self.get_report()
@@ -1,6 +1,20 @@
 import re
+import sys
 import zlib
 import io
+import os
+import mmap
+import shutil
+import tempfile
+import collections.abc
+import concurrent.futures
+import functools
+import heapq
+import bisect
+import time
+import hashlib
+import pickle
+import multiprocessing
 
 ################################################################################
 # PDF Parser
@@ -50,21 +64,90 @@ class PDF:
     self.objects = {}
     self.trailer = {}
     self.xref = None
+    self.start_xref = None
+    self.xref_stream = False
+    # original file contents, used to copy unmodified objects verbatim
+    self.source = None
+    self.source_path = None
+    # the PDFXrefRecovery that indexed the file when its xref was unreadable
+    self.recovery = None
+    # id allocation state, set up on first use once parsing is done
+    self.next_id = None
+    self.free_ids = None
+    self.deleted_ids = {}
+
+  def __setstate__(self, state):
+    # entries pickled before an attribute existed load with its default
+    self.__init__()
+    self.__dict__.update(state)
+
+  def get_object_ids(self):
+    # keys are read instead of objects so lazy objects stay unloaded
+    return [key[0] for key in self.objects]
+
+  def init_ids(self):
+    if self.next_id is not None:
+      return
+    ids = set(self.get_object_ids())
+    next_id = max(ids, default=0) + 1
+    if 'Size' in self.trailer:
+      # xref and object stream containers use ids without being objects
+      next_id = max(next_id, self.trailer['Size'].value)
+    self.free_ids = []
+    if self.xref is not None:
+      for obj_id, entry in self.xref.get_entries():
+        if entry.flag == 'f' and obj_id != 0 and obj_id < next_id and obj_id not in ids and entry.generation < 65535:
+          self.free_ids.append((obj_id, entry.generation))
+    # lowest ids are handed out first
+    heapq.heapify(self.free_ids)
+    self.next_id = next_id
 
   def get_next_obj_id(self):
-    next_id = 1
-    for key, obj in self.objects.items():
-      if obj.name >= next_id:
-        next_id = obj.name + 1
-    return next_id
+    self.init_ids()
+    return self.next_id
+
+  def allocate_id(self):
+    self.init_ids()
+    if len(self.free_ids) > 0:
+      obj_id, generation = heapq.heappop(self.free_ids)
+      self.deleted_ids.pop(obj_id, None)
+      return (obj_id, generation)
+    obj_id = self.next_id
+    self.next_id += 1
+    return (obj_id, 0)
 
   def create_new_object(self):
     obj = PDFObject()
-    obj.name = self.get_next_obj_id()
+    obj.name, obj.version = self.allocate_id()
     self.objects[obj.get_key()] = obj
-    self.trailer['Size'].value = len(self.objects)
     return obj
 
+  def create_objects(self, count):
+    # one contiguous range past the highest id, free ids are left alone
+    self.init_ids()
+    objects = []
+    for obj_id in range(self.next_id, self.next_id + count):
+      obj = PDFObject()
+      obj.name = obj_id
+      self.objects[obj.get_key()] = obj
+      objects.append(obj)
+    self.next_id += count
+    return objects
+
+  def delete_object(self, key):
+    self.init_ids()
+    obj = self.objects.pop(key)
+    # an id at the last generation is freed for good and never handed out
+    generation = min(obj.version + 1, 65535)
+    if generation < 65535:
+      heapq.heappush(self.free_ids, (obj.name, generation))
+    self.deleted_ids[obj.name] = generation
+    return obj
+
+  def get_size(self):
+    self.init_ids()
+    return self.next_id
+
   def get_first_obj_id(self):
     first_id = 0
     for key, obj in self.objects.items():
@@ -75,6 +158,13 @@ class PDF:
   def get_obj_count(self):
     return len(self.objects)
 
+  def get_modified_objects(self):
+    objects = self.objects.values()
+    if isinstance(self.objects, PDFLazyObjects):
+      # objects that were never loaded cannot have been modified
+      objects = self.objects.loaded.values()
+    return [obj for obj in objects if obj.is_dirty()]
+
   def __str__(self):
     obj_str = ''
     for k in self.objects:
@@ -92,9 +182,18 @@ class PDFXref:
     self.initial_object_id = initial_object_id
     self.object_count = object_count
     self.entries = []
+    self.subsections = []
+
+  def get_entries(self):
+    for xref in [self] + self.subsections:
+      for i, entry in enumerate(xref.entries):
+        yield (xref.initial_object_id + i, entry)
 
   def __str__(self):
-    return "initial ID: {0} obj count: {1} entries: {2}".format(self.initial_object_id, self.object_count, self.entries)
+    s = "initial ID: {0} obj count: {1} entries: {2}".format(self.initial_object_id, self.object_count, self.entries)
+    for xref in self.subsections:
+      s = "{0} {1}".format(s, xref)
+    return s
 
   def __repr__(self):
     return self.__str__()
@@ -104,6 +203,8 @@ class PDFXref:
 # PDFXrefEntry
 ##############
 class PDFXrefEntry:
+  __slots__ = ('offset', 'generation', 'flag')
+
   def __init__(self, offset, generation, flag):
     self.offset = offset
     self.generation = generation
@@ -119,18 +220,20 @@ class PDFXrefEntry:
 # PDFValue
 ##########
 class PDFValue:
-  ARRAY = 'array'
-  INT = 'integer'
-  FLOAT = 'float'
-  STRING = 'string'
-  HEXSTRING = 'hexstring'
-  NAME = 'name'
-  BOOLEAN = 'boolean'
-  NULL = 'null'
-  DICTIONARY = 'dictionary'
-  ARRAY = 'array'
-  REFERENCE = 'reference'
-  TOKEN = 'token'
+  __slots__ = ('type', 'value')
+
+  TOKEN = 0
+  INT = 1
+  FLOAT = 2
+  STRING = 3
+  HEXSTRING = 4
+  NAME = 5
+  BOOLEAN = 6
+  NULL = 7
+  DICTIONARY = 8
+  ARRAY = 9
+  REFERENCE = 10
+  TYPE_NAMES = ('token', 'integer', 'float', 'string', 'hexstring', 'name', 'boolean', 'null', 'dictionary', 'array', 'reference')
   
   def __init__(self, t, v):
     self.type = t
@@ -151,9 +254,14 @@ class PDFValue:
     elif self.type == PDFValue.NAME:
       s = '/{0}'.format(self.value)
     elif self.type == PDFValue.FLOAT:
-      s = '{:f}'.format(self.value)
+      # shortest round-tripping form, PDF numbers have no exponent
+      s = repr(float(self.value))
+      if 'e' in s or 'n' in s:
+        s = '{:f}'.format(self.value)
     elif self.type == PDFValue.BOOLEAN:
       s = str(self.value).lower()
+    elif self.type == PDFValue.NULL:
+      s = 'null'
     else:
       s = '{0}'.format(self.value)
     return s
@@ -165,21 +273,73 @@ class PDFValue:
         display_value = 'True'
       else:
         display_value = 'False'
-    return "{0}({1})".format(self.type, display_value)
+    return "{0}({1})".format(PDFValue.TYPE_NAMES[self.type], display_value)
 
   def __repr__(self):
     return self.__str__()
 
+###############
+# PDFConstValue
+###############
+class PDFConstValue(PDFValue):
+  # instances are shared by every parsed document, so they can not change
+  __slots__ = ()
+
+  def __init__(self, t, v):
+    object.__setattr__(self, 'type', t)
+    object.__setattr__(self, 'value', v)
+
+  def __setattr__(self, attr, value):
+    raise AttributeError("Shared value '{0}' is immutable, assign a new PDFValue instead".format(self))
+
+  def __reduce__(self):
+    return (PDFConstValue, (self.type, self.value))
+
+###############
+# PDFValueCache
+###############
+class PDFValueCache:
+  MIN_INT = -16
+  MAX_INT = 1024
+  # names are cached as they are seen, up to this many
+  MAX_NAMES = 4096
+
+  INTS = tuple(PDFConstValue(PDFValue.INT, i) for i in range(MIN_INT, MAX_INT + 1))
+  TRUE = PDFConstValue(PDFValue.BOOLEAN, True)
+  FALSE = PDFConstValue(PDFValue.BOOLEAN, False)
+  NULL = PDFConstValue(PDFValue.NULL, None)
+  NAMES = {}
+
+  def get_int(i):
+    if PDFValueCache.MIN_INT <= i <= PDFValueCache.MAX_INT:
+      return PDFValueCache.INTS[i - PDFValueCache.MIN_INT]
+    return PDFValue(PDFValue.INT, i)
+
+  def get_name(name):
+    value = PDFValueCache.NAMES.get(name)
+    if value is not None:
+      return value
+    name = sys.intern(name)
+    if len(PDFValueCache.NAMES) >= PDFValueCache.MAX_NAMES:
+      return PDFValue(PDFValue.NAME, name)
+    value = PDFValueCache.NAMES[name] = PDFConstValue(PDFValue.NAME, name)
+    return value
+
+  def get_boolean(b):
+    return PDFValueCache.TRUE if b else PDFValueCache.FALSE
+
 ##############
 # PDFReference
 ##############
 class PDFReference:
+  __slots__ = ('name', 'version')
+
   def __init__(self, name, version):
     self.name = name
     self.version = version
 
   def get_key(self):
-    return '{0}.{1}'.format(self.name, self.version)
+    return (self.name, self.version)
 
   def __str__(self):
     return "name: {0} version: {1}".format(self.name, self.version)
@@ -187,23 +347,170 @@ class PDFReference:
   def __repr__(self):
     return self.__str__()
 
+################
+# PDFNamedValues
+################
+class PDFNamedValues(dict):
+  __slots__ = ('dirty',)
+
+  def __init__(self, *args, **kwargs):
+    dict.__init__(self, *args, **kwargs)
+    self.dirty = False
+
+  def __setitem__(self, key, value):
+    self.dirty = True
+    dict.__setitem__(self, key, value)
+
+  def __delitem__(self, key):
+    self.dirty = True
+    dict.__delitem__(self, key)
+
+  def clear(self):
+    self.dirty = True
+    dict.clear(self)
+
+  def pop(self, *args):
+    self.dirty = True
+    return dict.pop(self, *args)
+
+  def popitem(self):
+    self.dirty = True
+    return dict.popitem(self)
+
+  def setdefault(self, key, default=None):
+    if key not in self:
+      self.dirty = True
+    return dict.setdefault(self, key, default)
+
+  def update(self, *args, **kwargs):
+    self.dirty = True
+    dict.update(self, *args, **kwargs)
+
+##############
+# PDFValueList
+##############
+# The list of an array value, or the values of an object, that remembers
+# being changed like PDFNamedValues does for dictionaries.
+class PDFValueList(list):
+  __slots__ = ('dirty',)
+
+  def __init__(self, *args):
+    list.__init__(self, *args)
+    self.dirty = False
+
+  def __setitem__(self, index, value):
+    self.dirty = True
+    list.__setitem__(self, index, value)
+
+  def __delitem__(self, index):
+    self.dirty = True
+    list.__delitem__(self, index)
+
+  def __iadd__(self, values):
+    self.dirty = True
+    return list.__iadd__(self, values)
+
+  def __imul__(self, count):
+    self.dirty = True
+    return list.__imul__(self, count)
+
+  def append(self, value):
+    self.dirty = True
+    list.append(self, value)
+
+  def extend(self, values):
+    self.dirty = True
+    list.extend(self, values)
+
+  def insert(self, index, value):
+    self.dirty = True
+    list.insert(self, index, value)
+
+  def pop(self, *args):
+    self.dirty = True
+    return list.pop(self, *args)
+
+  def remove(self, value):
+    self.dirty = True
+    list.remove(self, value)
+
+  def clear(self):
+    self.dirty = True
+    list.clear(self)
+
+  def sort(self, *args, **kwargs):
+    self.dirty = True
+    list.sort(self, *args, **kwargs)
+
+  def reverse(self):
+    self.dirty = True
+    list.reverse(self)
+
 ###########
 # PDFObject
 ###########
 class PDFObject:
+  __slots__ = ('comments', 'name', 'version', 'named_values', 'values', 'stream_data', 'source_span', 'dirty')
+  TRACKED_ATTRS = frozenset(['name', 'version', 'named_values', 'values', 'stream_data'])
+
   def __init__(self):
-    self.comments = []
+    # shared empty defaults, most objects have neither comments nor a stream
+    self.comments = ()
     self.name = 0
     self.version = 0
-    self.named_values = {}
-    self.values = []
-    self.stream_data = []
+    self.named_values = PDFNamedValues()
+    self.values = PDFValueList()
+    self.stream_data = b''
+    self.source_span = None
+    self.dirty = True
+
+  def __setattr__(self, attr, value):
+    if attr in PDFObject.TRACKED_ATTRS:
+      object.__setattr__(self, 'dirty', True)
+    object.__setattr__(self, attr, value)
+
+  def add_comment(self, comment):
+    if len(self.comments) == 0:
+      self.comments = []
+    self.comments.append(comment)
+
+  def is_changed(values):
+    # True when a container, or one nested in it, was changed in place or
+    # is not one the parser made
+    if type(values) is PDFNamedValues:
+      if values.dirty:
+        return True
+      values = values.values()
+    elif type(values) is not PDFValueList or values.dirty:
+      return True
+    for value in values:
+      if (value.type == PDFValue.ARRAY or value.type == PDFValue.DICTIONARY) and PDFObject.is_changed(value.value):
+        return True
+    return False
+
+  def set_changed(values, changed):
+    if type(values) is not PDFNamedValues and type(values) is not PDFValueList:
+      return
+    values.dirty = changed
+    for value in (values.values() if type(values) is PDFNamedValues else values):
+      if value.type == PDFValue.ARRAY or value.type == PDFValue.DICTIONARY:
+        PDFObject.set_changed(value.value, changed)
+
+  def is_dirty(self):
+    # in place changes to nested arrays and dictionaries count as well,
+    # scalar values are changed by assigning a new PDFValue
+    return self.dirty or PDFObject.is_changed(self.named_values) or PDFObject.is_changed(self.values)
+
+  def set_dirty(self, dirty):
+    self.dirty = dirty
+    PDFObject.set_changed(self.named_values, dirty)
+    PDFObject.set_changed(self.values, dirty)
 
   def get_ref(self):
     return PDFReference(self.name, self.version)
 
   def get_key(self):
-    return '{0}.{1}'.format(self.name, self.version)
+    return (self.name, self.version)
 
   def __str__(self):
     s = ("Object: {0} {1} Named Values: {2} Values: {3} Stream Len: {4}".format(self.name, self.version, self.named_values, self.values, len(self.stream_data)))
@@ -245,11 +552,174 @@ class PDFContentStreamCommand:
 # PDFParseResult
 ################
 class PDFParseResult:
-  def __init__(self, error_msg, peer_parse_func, next_parse_func, stream_bytes=None):
+  def __init__(self, error_msg, peer_parse_func, next_parse_func, stream_bytes=None, skip_bytes=0):
     self.error_msg = error_msg
     self.peer_parse_func = peer_parse_func
     self.next_parse_func = next_parse_func
     self.stream_bytes = stream_bytes
+    self.skip_bytes = skip_bytes
+
+###################
+# PDFBlockParseFunc
+###################
+# Marks a parse function that also receives the current input block. The
+# reader calls it as f(b, n, data, pos) where data[pos - 1] == b; the function
+# may consume bytes past b directly from data and report how many through
+# PDFParseResult.skip_bytes. Such functions must not return a peer after
+# skipping. Called as f(b, n) they behave like any other parse function.
+class PDFBlockParseFunc:
+  def __init__(self, func, obj=None):
+    self.func = func
+    self.obj = obj
+    self.__qualname__ = func.__qualname__
+
+  def __get__(self, obj, objtype=None):
+    if obj is None:
+      return self
+    return PDFBlockParseFunc(self.func, obj)
+
+  def __call__(self, b, n, data=None, pos=0):
+    return self.func(self.obj, b, n, data, pos)
+
+##########
+# PDFLexer
+##########
+# Scans whole tokens and values out of a bytes-like block with compiled
+# regular expressions. Results mirror what the byte-at-a-time parsers produce;
+# whenever a token touches the end of the block (or the input is something the
+# state machine would treat specially) None is returned and callers fall back
+# to the state machine, which stays available as the reference mode.
+class PDFLexer:
+  enabled = True
+
+  WHITESPACE = frozenset(b'\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0')
+  TOKEN_RE = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]*(?:([^\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0()<>\[\]{}/%#]+)|(<<|>>|[()<>\[\]{}/%#]))')
+  NAME_RE = re.compile(rb'[^\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0()<>\[\]{}/%#]+')
+  HEX_STRING_RE = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]*([^\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0()<>\[\]{}/%#]*)>')
+  STRING_RE = re.compile(rb'[()\\]')
+  INT_RE = re.compile(rb'[\+-]?\d+')
+  NUMBER_RE = re.compile(r'[\+-]?\d+(\.\d+)?')
+
+  def create_value(token):
+    if PDFUtils.is_special(token):
+      return PDFValue(PDFValue.TOKEN, token)
+    m = PDFLexer.NUMBER_RE.fullmatch(token)
+    if m is not None:
+      if m.group(1) is None:
+        return PDFValueCache.get_int(int(token))
+      return PDFValue(PDFValue.FLOAT, float(token))
+    if token == 'true' or token == 'false':
+      return PDFValueCache.get_boolean(token == 'true')
+    if token == 'null':
+      return PDFValueCache.NULL
+    return PDFValue(PDFValue.TOKEN, token)
+
+  def read_string(data, pos):
+    depth = 1
+    start = pos
+    search = PDFLexer.STRING_RE.search
+    while True:
+      m = search(data, pos)
+      if m is None:
+        return None
+      c = m.group()
+      if c == b'\\':
+        pos = m.end() + 1
+        continue
+      pos = m.end()
+      if c == b'(':
+        depth += 1
+      else:
+        depth -= 1
+        if depth == 0:
+          return (PDFValue(PDFValue.STRING, str(data[start:pos - 1], 'latin-1')), pos)
+
+  def read_token(data, pos):
+    m = PDFLexer.TOKEN_RE.match(data, pos)
+    if m is None:
+      return None
+    end = m.end()
+    if end >= len(data):
+      return None
+    regular = m.group(1)
+    if regular is not None:
+      return (PDFLexer.create_value(str(regular, 'latin-1')), end)
+
+    delimiter = m.group(2)
+    if delimiter == b'(':
+      return PDFLexer.read_string(data, end)
+    if delimiter == b'/':
+      m = PDFLexer.NAME_RE.match(data, end)
+      if m is None or m.end() >= len(data):
+        return None
+      return (PDFValueCache.get_name(str(m.group(), 'latin-1')), m.end())
+    if delimiter == b'<':
+      m = PDFLexer.HEX_STRING_RE.match(data, end)
+      if m is None or m.end() >= len(data):
+        return None
+      hex_string = m.group(1)
+      if len(hex_string) == 0 and data[m.end()] == ord('>'):
+        return None
+      return (PDFValue(PDFValue.HEXSTRING, str(hex_string, 'latin-1')), m.end())
+    return (PDFValue(PDFValue.TOKEN, str(delimiter, 'latin-1')), end)
+
+  def read_reference(data, value, pos):
+    if data[pos] not in PDFLexer.WHITESPACE:
+      return (value, pos)
+    m = PDFLexer.TOKEN_RE.match(data, pos)
+    if m is None or m.end() >= len(data):
+      return None
+    version = m.group(1)
+    end = m.end()
+    if version is None or PDFLexer.INT_RE.fullmatch(version) is None or data[end] not in PDFLexer.WHITESPACE:
+      return (value, pos)
+    m = PDFLexer.TOKEN_RE.match(data, end)
+    if m is None or m.end() >= len(data):
+      return None
+    if m.group(1) == b'R':
+      return (PDFValue(PDFValue.REFERENCE, PDFReference(value.value, int(version))), m.end())
+    return (value, pos)
+
+  def read_array(data, pos):
+    array = []
+    while True:
+      item = PDFLexer.read_value(data, pos)
+      if item is None:
+        return None
+      value, pos = item
+      if value.type == PDFValue.TOKEN and value.value == ']':
+        return (PDFValue(PDFValue.ARRAY, PDFValueList(array)), pos)
+      array.append(value)
+
+  def read_dictionary(data, pos):
+    dictionary = {}
+    while True:
+      item = PDFLexer.read_value(data, pos)
+      if item is None:
+        return None
+      name, pos = item
+      if name.type == PDFValue.TOKEN and name.value == '>>':
+        return (PDFValue(PDFValue.DICTIONARY, PDFNamedValues(dictionary)), pos)
+      if name.type != PDFValue.NAME:
+        return None
+      item = PDFLexer.read_value(data, pos)
+      if item is None:
+        return None
+      dictionary[name.value], pos = item
+
+  def read_value(data, pos):
+    item = PDFLexer.read_token(data, pos)
+    if item is None:
+      return None
+    value, end = item
+    if value.type == PDFValue.INT:
+      return PDFLexer.read_reference(data, value, end)
+    if value.type == PDFValue.TOKEN:
+      if value.value == '[':
+        return PDFLexer.read_array(data, end)
+      if value.value == '<<':
+        return PDFLexer.read_dictionary(data, end)
+    return item
 
 ###############
 # ParserBase
@@ -349,7 +819,13 @@ class PDFArrayParser(ParserBase):
     if v.type == PDFValue.TOKEN:
       self.last_token = v
 
-  def begin(self, b, n):
+  @PDFBlockParseFunc
+  def begin(self, b, n, data=None, pos=0):
+    if data is not None and PDFLexer.enabled:
+      item = PDFLexer.read_value(data, pos - 1)
+      if item is not None and item[0].type == PDFValue.ARRAY:
+        self.set_value(item[0])
+        return PDFParseResult(None, None, None, None, item[1] - pos)
     if str(chr(b)).isspace():
       return PDFParseResult(None, None, self.begin)
     if chr(b) != '[':
@@ -359,7 +835,7 @@ class PDFArrayParser(ParserBase):
   def read_value(self, b, n):
     if self.last_token is not None and self.last_token.value == ']':
       self.array.pop()
-      self.set_value(PDFValue(PDFValue.ARRAY, self.array))
+      self.set_value(PDFValue(PDFValue.ARRAY, PDFValueList(self.array)))
       return PDFParseResult(None, None, None, [b])
     return PDFParseResult(None, PDFValueParser(self.append_array_value).begin, self.read_value)
 
@@ -432,22 +908,15 @@ class PDFValueParser(ParserBase):
     self.set_value(s)
 
   def create_value_from_token(self, t):
-    value = None
-    if PDFUtils.is_special(self.token):
-      value = PDFValue(PDFValue.TOKEN, self.token)
-    elif re.match(r'^[\+-]?\d+\.\d+$', self.token) is not None:
-      value = PDFValue(PDFValue.FLOAT, float(self.token))
-    elif re.match('^[\+-]?\d+$', self.token) is not None:
-      value = PDFValue(PDFValue.INT, int(self.token))
-    elif re.match('^true$|^false$', self.token) is not None:
-      value = PDFValue(PDFValue.BOOLEAN, bool(self.token))
-    elif re.match('^null$', self.token) is not None:
-      value = PDFValue(PDFValue.NULL, None)
-    else:
-      value = PDFValue(PDFValue.TOKEN, self.token)
-    return value
-
-  def begin(self, b, n):
+    return PDFLexer.create_value(self.token)
+
+  @PDFBlockParseFunc
+  def begin(self, b, n, data=None, pos=0):
+    if data is not None and PDFLexer.enabled:
+      item = PDFLexer.read_value(data, pos - 1)
+      if item is not None:
+        self.set_value(item[0])
+        return PDFParseResult(None, None, None, None, item[1] - pos)
     return PDFParseResult(None, PDFTokenParser(self.set_token).begin, self.initial_token_complete)
 
   def initial_token_complete(self, b, n):
@@ -480,7 +949,7 @@ class PDFValueParser(ParserBase):
     return PDFParseResult("Expected '>', received '{0}'".format(chr(b)), None, None)
 
   def process_name_token(self, b, n):
-    self.set_value(PDFValue(PDFValue.NAME, self.token))
+    self.set_value(PDFValueCache.get_name(self.token))
     return PDFParseResult(None, None, None, [b])
 
   def check_reference_value_2(self, b, n):
@@ -535,7 +1004,13 @@ class PDFDictionaryParser(ParserBase):
       return PDFParseResult(None, self.begin, None)
     return PDFParseResult(None, self.verify_name_token, None)
 
-  def begin(self, b, n):
+  @PDFBlockParseFunc
+  def begin(self, b, n, data=None, pos=0):
+    if data is not None and PDFLexer.enabled:
+      item = PDFLexer.read_value(data, pos - 1)
+      if item is not None and item[0].type == PDFValue.DICTIONARY:
+        self.set_value(item[0])
+        return PDFParseResult(None, None, None, None, item[1] - pos)
     if str(chr(b)).isspace():
       return PDFParseResult(None, None, self.begin)
     return PDFParseResult(None,PDFTokenParser(self.set_open_token).begin, self.verify_open_token)
@@ -552,7 +1027,7 @@ class PDFDictionaryParser(ParserBase):
     if self.name_token.type == PDFValue.NAME:
       return PDFParseResult(None, self.read_value, None) 
     if self.name_token.type == PDFValue.TOKEN and self.name_token.value == '>>':
-      self.set_value(PDFValue(PDFValue.DICTIONARY, self.dictionary))
+      self.set_value(PDFValue(PDFValue.DICTIONARY, PDFNamedValues(self.dictionary)))
       return PDFParseResult(None, None, None, [b])
     return PDFParseResult("Dictionary missing name entry (expected name, found '{0}' instead).".format(self.name_token), None, None)
 
@@ -563,30 +1038,198 @@ class PDFDictionaryParser(ParserBase):
 # PDFStreamParser
 #################
 class PDFStreamParser(ParserBase):
-  def __init__(self, set_value):
+  END_TOKEN_RE = re.compile(b'endstream')
+  WHITESPACE = b'\x00\t\n\x0c\r '
+  MAX_LENGTH_GAP = 32
+  LENGTH_END_RE = re.compile(b'[\x00\t\n\x0c\r ]{0,32}endstream')
+  END_OBJECT_RE = re.compile(b'endstream[\x00\t\n\x0c\r ]*endobj')
+  LENGTH_END_PREFIX_RE = re.compile(b'[\x00\t\n\x0c\r ]{0,32}(?:e(?:n(?:d(?:s(?:t(?:r(?:e(?:am?)?)?)?)?)?)?)?)?')
+  # KMP failure table of the end token, so a partial match never hides the
+  # start of the real one
+  END_TOKEN_FAILURE = [0, 0, 0, 0, 0, 0, 1, 0, 0]
+
+  def __init__(self, set_value, length=None):
     ParserBase.__init__(self, set_value)
     self.stream = []
     self.end_token = "endstream"
     self.end_token_pos = 0
-
-  def begin(self, b, n):
+    self.chunks = []
+    self.length = length
+    self.remaining = length
+    self.counted = False
+    self.gap = b''
+    self.skip_lf = False
+
+  def zero_copy(data):
+    return isinstance(data, (mmap.mmap, memoryview))
+
+  def tail(chunks, count):
+    tail = b''
+    for chunk in reversed(chunks):
+      if len(tail) >= count:
+        break
+      tail = bytes(chunk[-count:]) + tail
+    return tail[-count:]
+
+  def trim(chunks, count):
+    while count > 0 and len(chunks) > 0:
+      last = chunks.pop()
+      if len(last) > count:
+        chunks.append(last[:len(last) - count])
+        count = 0
+      else:
+        count -= len(last)
+    return chunks
+
+  def strip_eol(chunks):
+    tail = PDFStreamParser.tail(chunks, 2)
+    if tail.endswith(b'\r\n'):
+      return PDFStreamParser.trim(chunks, 2)
+    if tail.endswith(b'\n') or tail.endswith(b'\r'):
+      return PDFStreamParser.trim(chunks, 1)
+    return chunks
+
+  def length_gap(self, chunks):
+    if self.length is None:
+      return None
+    gap = sum(len(chunk) for chunk in chunks) - self.length
+    if gap < 0 or gap > PDFStreamParser.MAX_LENGTH_GAP:
+      return None
+    if len(PDFStreamParser.tail(chunks, gap).strip(PDFStreamParser.WHITESPACE)) > 0:
+      return None
+    return gap
+
+  def trim_stream(self, chunks):
+    gap = self.length_gap(chunks)
+    if gap is not None:
+      return PDFStreamParser.trim(chunks, gap)
+    return PDFStreamParser.strip_eol(chunks)
+
+  def recover(self, data, start, pos):
+    # the direct /Length was wrong, search everything counted so far
+    counted = b''.join(self.chunks) + self.gap
+    joined = counted + bytes(data[start:])
+    self.chunks = []
+    self.counted = False
+    self.length = None
+    m = PDFStreamParser.END_TOKEN_RE.search(joined)
+    if m is None:
+      self.chunks.append(joined)
+      return PDFParseResult(None, None, self.read_next_block, None, len(data) - pos)
+    self.set_value(b''.join(PDFStreamParser.strip_eol([joined[:m.start()]])))
+    if m.end() >= len(counted):
+      return PDFParseResult(None, None, None, None, start + m.end() - len(counted) - pos)
+    return PDFParseResult(None, None, None, counted[m.end():], start - pos)
+
+  def complete_stream(self, data, start, end):
+    if len(self.chunks) == 0 and PDFStreamParser.zero_copy(data):
+      chunks = [memoryview(data)[start:end]]
+    else:
+      self.chunks.append(bytes(data[start:end]))
+      chunks = self.chunks
+    chunks = self.trim_stream(chunks)
+    if len(chunks) == 1:
+      self.set_value(chunks[0])
+    else:
+      self.set_value(b''.join(chunks))
+
+  def read_length(self, data, start, pos):
+    # jump past a direct /Length and expect endstream right after it
+    end = start + self.remaining
+    if end > len(data):
+      if not self.counted and PDFStreamParser.END_OBJECT_RE.search(data, start) is not None:
+        # the object ends in this block, the /Length runs past it
+        self.remaining = None
+        return None
+      self.chunks.append(bytes(data[start:]))
+      self.remaining = end - len(data)
+      self.counted = True
+      return PDFParseResult(None, None, self.read_next_block, None, len(data) - pos)
+    after = self.gap + bytes(data[end:end + PDFStreamParser.MAX_LENGTH_GAP + len(self.end_token)])
+    m = PDFStreamParser.LENGTH_END_RE.match(after)
+    if m is not None:
+      self.remaining = None
+      self.complete_stream(data, start, end)
+      return PDFParseResult(None, None, None, None, end + m.end() - len(self.gap) - pos)
+    if end + len(after) - len(self.gap) >= len(data) and PDFStreamParser.LENGTH_END_PREFIX_RE.fullmatch(after) is not None:
+      # endstream may still follow in the next block
+      if end > start:
+        self.chunks.append(bytes(data[start:end]))
+      self.gap = after
+      self.remaining = 0
+      self.counted = True
+      return PDFParseResult(None, None, self.read_next_block, None, len(data) - pos)
+    self.remaining = None
+    if self.counted:
+      return self.recover(data, start, pos)
+    return None
+
+  def read_block(self, data, start, pos):
+    if self.remaining is not None:
+      result = self.read_length(data, start, pos)
+      if result is not None:
+        return result
+    m = PDFStreamParser.END_TOKEN_RE.search(data, start)
+    if m is None:
+      self.chunks.append(bytes(data[start:]))
+      return PDFParseResult(None, None, self.read_next_block, None, len(data) - pos)
+    self.complete_stream(data, start, m.start())
+    return PDFParseResult(None, None, None, None, m.end() - pos)
+
+  @PDFBlockParseFunc
+  def read_next_block(self, b, n, data=None, pos=0):
+    if self.skip_lf:
+      self.skip_lf = False
+      if b == ord('\n'):
+        if pos >= len(data):
+          return PDFParseResult(None, None, self.read_next_block)
+        return self.read_block(data, pos, pos)
+    if self.remaining is not None:
+      return self.read_block(data, pos - 1, pos)
+    # the end token may straddle the previous blocks and this one
+    tail = PDFStreamParser.tail(self.chunks, len(self.end_token) - 1)
+    head = bytes(data[pos - 1:pos - 1 + len(self.end_token) - 1])
+    m = PDFStreamParser.END_TOKEN_RE.search(tail + head)
+    if m is not None and m.start() < len(tail):
+      PDFStreamParser.trim(self.chunks, len(tail) - m.start())
+      self.set_value(b''.join(self.trim_stream(self.chunks)))
+      return PDFParseResult(None, None, None, None, m.end() - len(tail) - 1)
+    return self.read_block(data, pos - 1, pos)
+
+  @PDFBlockParseFunc
+  def begin(self, b, n, data=None, pos=0):
+    if data is None:
+      return self.begin_reference(b, n)
+    start = pos - 1
+    if b == ord('\r'):
+      start = pos
+      if pos >= len(data):
+        self.skip_lf = True
+      elif data[start] == ord('\n'):
+        start += 1
+    elif b in PDFLexer.WHITESPACE:
+      start = pos
+    return self.read_block(data, start, pos)
+
+  def begin_reference(self, b, n):
     if str(chr(b)).isspace():
-      return PDFParseResult(None, None, self.begin)
+      return PDFParseResult(None, None, self.begin_reference)
     return PDFParseResult(None, self.read, None)
 
   def read(self, b, n):
     self.stream.append(b)
-    if chr(b) == self.end_token[self.end_token_pos]:
+    c = chr(b)
+    while self.end_token_pos > 0 and c != self.end_token[self.end_token_pos]:
+      self.end_token_pos = PDFStreamParser.END_TOKEN_FAILURE[self.end_token_pos - 1]
+    if c == self.end_token[self.end_token_pos]:
       self.end_token_pos += 1
       return PDFParseResult(None, self.verify_token_state, None)
-    else:
-      self.end_token_pos = 0
     return PDFParseResult(None, None, self.read)
 
   def verify_token_state(self, b, n):
     if self.end_token_pos == len(self.end_token):
-      input_stream = bytes(self.stream[:len(self.stream)-(len(self.end_token) + 1)])
-      self.set_value(input_stream)
+      input_stream = bytes(self.stream[:len(self.stream) - len(self.end_token)])
+      self.set_value(b''.join(self.trim_stream([input_stream])))
       return PDFParseResult(None,None,None)
     return PDFParseResult(None, None, self.read)
     
@@ -601,9 +1244,10 @@ class PDFObjectParser(ParserBase):
     self.last_token = ''
     self.name = None
     self.version = None
+    self.start = None
 
   def set_comment(self, v):
-    self.obj.comments.append(''.join(v))
+    self.obj.add_comment(''.join(v))
 
   def set_name(self, name):
     self.name = name
@@ -628,11 +1272,18 @@ class PDFObjectParser(ParserBase):
   def set_stream_data(self, d):
     self.obj.stream_data = d
 
+  def get_stream_length(self):
+    length = self.obj.named_values.get('Length')
+    if length is not None and length.type == PDFValue.INT:
+      return length.value
+    return None
+
   def begin(self, b, n):
     if str(chr(b)).isspace():
       return PDFParseResult(None, None, self.begin)
     if chr(b) == '%':
       return PDFParseResult(None,PDFCommentParser(self.set_comment).begin, self.begin)
+    self.start = n
     return PDFParseResult(None, self.read_name, None)
 
   def read_name(self, b, n):
@@ -640,7 +1291,7 @@ class PDFObjectParser(ParserBase):
 
   def verify_name(self, b, n):
     if self.name.type != PDFValue.INT:
-      return PDFParseResult("Expected int name, but received '{0}'".format(self.obj.name.value), None, None)
+      return PDFParseResult("Expected int name, but received '{0}'".format(self.name.value), None, None)
     self.obj.name = self.name.value
     return PDFParseResult(None, PDFValueParser(self.set_version).begin, self.verify_version)
 
@@ -660,8 +1311,10 @@ class PDFObjectParser(ParserBase):
 
   def process_value(self, b, n):
     if self.last_token.lower() == 'stream':
-      return PDFParseResult(None, PDFStreamParser(self.set_stream_data).begin, self.read_value)
+      return PDFParseResult(None, PDFStreamParser(self.set_stream_data, self.get_stream_length()).begin, self.read_value)
     if self.last_token.lower() == 'endobj':
+      self.obj.source_span = (self.start, n)
+      self.obj.set_dirty(False)
       self.set_value(self.obj)
       return PDFParseResult(None, None, None, [b])
     return PDFParseResult(None, self.read_value, None)
@@ -732,19 +1385,20 @@ class PDFXrefParser(ParserBase):
   def __init__(self, set_value):
     ParserBase.__init__(self, set_value)
     self.xref = PDFXref()
+    self.section = self.xref
     self.open_token = None
 
   def set_open_token(self, t):
     self.open_token = t
 
   def set_initial_id(self, v):
-    self.xref.initial_object_id = v.value
+    self.section.initial_object_id = v.value
 
   def set_obj_count(self, v):
-    self.xref.object_count = v.value
+    self.section.object_count = v.value
 
   def append_entry(self, e):
-    self.xref.entries.append(e)
+    self.section.entries.append(e)
 
   def begin(self, b, n):
     return PDFParseResult(None, PDFTokenParser(self.set_open_token).begin, self.verify_open_token)
@@ -761,11 +1415,21 @@ class PDFXrefParser(ParserBase):
     return PDFParseResult(None, PDFValueParser(self.set_obj_count).begin, self.read_entry)
 
   def read_entry(self, b, n):
-    if len(self.xref.entries) == self.xref.object_count:
-      self.set_value(self.xref)
-      return PDFParseResult(None, None, None)
+    if len(self.section.entries) == self.section.object_count:
+      if self.section is self.xref:
+        self.set_value(self.xref)
+      return PDFParseResult(None, None, self.read_subsection, [b])
     return PDFParseResult(None, PDFXrefEntryParser(self.append_entry).begin, self.read_entry)
 
+  def read_subsection(self, b, n):
+    if str(chr(b)).isspace():
+      return PDFParseResult(None, None, self.read_subsection)
+    if chr(b).isdigit():
+      self.section = PDFXref()
+      self.xref.subsections.append(self.section)
+      return PDFParseResult(None, self.read_start_index, None)
+    return PDFParseResult(None, None, None, [b])
+
 ####################
 # PDFStartXrefParser
 ####################
@@ -796,15 +1460,900 @@ class PDFStartXrefParser(ParserBase):
       return PDFParseResult("Expected integer index, received 'None'", None, None)
     if self.index.type != PDFValue.INT:
       return PDFParseResult("Expected integer index, received token of type '{0}'".format(self.index.type))
+    self.set_value(self.index.value)
+    return PDFParseResult(None, None, None, [b])
+
+#################
+# PDFHeaderParser
+#################
+class PDFHeaderParser(ParserBase):
+  def __init__(self, set_value):
+    ParserBase.__init__(self, set_value)
+    self.header_line_1 = []
+    self.header_line_2 = []
+
+  def set_header_line_1(self, v):
+    self.header_line_1 = v
+
+  def set_header_line_2(self, v):
+    self.header_line_2 = v
+
+  def begin(self, b, n):
+    return PDFParseResult(None, PDFCommentParser(self.set_header_line_1).begin, self.begin_header_line_2)
+
+  def begin_header_line_2(self, b, n):
+    if b == ord('%'):
+      return PDFParseResult(None, PDFCommentParser(self.set_header_line_2).begin, self.complete)
+    return PDFParseResult(None, self.complete, None)
+
+  def complete(self, b, n):
+    self.set_value((self.header_line_1, self.header_line_2))
     return PDFParseResult(None, None, None, [b])
 
+######################
+# PDFXrefSectionParser
+######################
+class PDFXrefSectionParser(ParserBase):
+  def __init__(self, set_value):
+    ParserBase.__init__(self, set_value)
+    self.xref = None
+    self.trailer = None
+
+  def set_xref(self, x):
+    self.xref = x
+
+  def set_trailer(self, t):
+    self.trailer = t
+
+  def begin(self, b, n):
+    if str(chr(b)).isspace():
+      return PDFParseResult(None, None, self.begin)
+    return PDFParseResult(None, PDFXrefParser(self.set_xref).begin, self.read_trailer)
+
+  def read_trailer(self, b, n):
+    return PDFParseResult(None, PDFTrailerParser(self.set_trailer).begin, self.complete)
+
+  def complete(self, b, n):
+    self.set_value((self.xref, self.trailer))
+    return PDFParseResult(None, None, None, [b])
+
+##################
+# PDFStreamFilters
+##################
+class PDFStreamFilters:
+  def get_filters(obj):
+    filters = obj.named_values.get('Filter')
+    params = obj.named_values.get('DecodeParms')
+    if filters is None:
+      return []
+    if filters.type != PDFValue.ARRAY:
+      filters = [filters]
+      params = [params]
+    else:
+      filters = filters.value
+      if params is None or params.type != PDFValue.ARRAY:
+        params = [params] * len(filters)
+      else:
+        params = params.value
+    return [(f.value, p.value if p is not None and p.type == PDFValue.DICTIONARY else {}) for f, p in zip(filters, params)]
+
+  def get_param(params, key, default):
+    if key in params:
+      return params[key].value
+    return default
+
+  def decode_predictor(data, params):
+    predictor = PDFStreamFilters.get_param(params, 'Predictor', 1)
+    if predictor < 10:
+      if predictor != 1:
+        raise ValueError("Unsupported predictor '{0}'".format(predictor))
+      return data
+    colors = PDFStreamFilters.get_param(params, 'Colors', 1)
+    bits = PDFStreamFilters.get_param(params, 'BitsPerComponent', 8)
+    columns = PDFStreamFilters.get_param(params, 'Columns', 1)
+    bpp = max(1, (colors * bits) // 8)
+    row_size = (colors * bits * columns + 7) // 8
+    out = bytearray()
+    prior = bytearray(row_size)
+    for i in range(0, len(data) - row_size, row_size + 1):
+      png_filter = data[i]
+      row = bytearray(data[i + 1:i + 1 + row_size])
+      if png_filter == 1:
+        for j in range(bpp, len(row)):
+          row[j] = (row[j] + row[j - bpp]) & 0xff
+      elif png_filter == 2:
+        for j in range(len(row)):
+          row[j] = (row[j] + prior[j]) & 0xff
+      elif png_filter == 3:
+        for j in range(len(row)):
+          left = row[j - bpp] if j >= bpp else 0
+          row[j] = (row[j] + ((left + prior[j]) >> 1)) & 0xff
+      elif png_filter == 4:
+        for j in range(len(row)):
+          a = row[j - bpp] if j >= bpp else 0
+          b = prior[j]
+          c = prior[j - bpp] if j >= bpp else 0
+          p = a + b - c
+          pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+          if pa <= pb and pa <= pc:
+            row[j] = (row[j] + a) & 0xff
+          elif pb <= pc:
+            row[j] = (row[j] + b) & 0xff
+          else:
+            row[j] = (row[j] + c) & 0xff
+      elif png_filter != 0:
+        raise ValueError("Unsupported PNG filter type '{0}'".format(png_filter))
+      out += row
+      prior = row
+    return bytes(out)
+
+  def is_decodable(obj):
+    return all(name == 'FlateDecode' for name, params in PDFStreamFilters.get_filters(obj))
+
+  def decode_data(data, filters):
+    for name, params in filters:
+      if name == 'FlateDecode':
+        data = PDFStreamFilters.decode_predictor(zlib.decompress(data), params)
+      else:
+        raise ValueError("Unsupported Filter type '{0}'".format(name))
+    return bytes(data)
+
+  def decode(obj):
+    return PDFStreamFilters.decode_data(obj.stream_data, PDFStreamFilters.get_filters(obj))
+
+################
+# PDFFlateEngine
+################
+class PDFFlateEngine:
+  DEFAULT_LEVEL = zlib.Z_DEFAULT_COMPRESSION
+  # batches handed to each worker per round trip
+  CHUNKS_PER_JOB = 4
+
+  def map(func, jobs, *payloads):
+    count = len(payloads[0]) if payloads else 0
+    if jobs is None or jobs <= 1 or count < 2:
+      return list(map(func, *payloads))
+    # payloads cross a process boundary, mmap slices have to become bytes
+    payloads = [[PDFFlateEngine.get_portable(p) for p in column] for column in payloads]
+    chunk_size = max(1, count // (jobs * PDFFlateEngine.CHUNKS_PER_JOB))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=PDFFlateEngine.get_context()) as executor:
+      return list(executor.map(func, *payloads, chunksize=chunk_size))
+
+  def get_portable(payload):
+    if isinstance(payload, memoryview):
+      return bytes(payload)
+    if isinstance(payload, list):
+      return [PDFFlateEngine.get_portable(p) for p in payload]
+    return payload
+
+  def get_context():
+    # the command line scripts have no __main__ guard, so fork workers where
+    # possible instead of having them re-import the calling script
+    if 'fork' in multiprocessing.get_all_start_methods():
+      return multiprocessing.get_context('fork')
+    return None
+
+  def compress(data, level=DEFAULT_LEVEL):
+    return zlib.compress(data, level)
+
+  def reflate(data, filters, level=DEFAULT_LEVEL):
+    return zlib.compress(PDFStreamFilters.decode_data(data, filters), level)
+
+  def compress_all(payloads, level=DEFAULT_LEVEL, jobs=1):
+    return PDFFlateEngine.map(functools.partial(PDFFlateEngine.compress, level=level), jobs, payloads)
+
+  def get_stream_objects(pdf):
+    return [obj for obj in pdf.objects.values() if len(obj.stream_data) > 0 and PDFStreamFilters.is_decodable(obj)]
+
+  def get_payload(obj):
+    if isinstance(obj.stream_data, PDFStreamSpool):
+      return bytes(obj.stream_data)
+    return obj.stream_data
+
+  def set_stream(obj, data, filtered):
+    obj.stream_data = data
+    obj.named_values.pop('DecodeParms', None)
+    if filtered:
+      obj.named_values['Filter'] = PDFValue(PDFValue.NAME, 'FlateDecode')
+    else:
+      obj.named_values.pop('Filter', None)
+    obj.named_values['Length'] = PDFValue(PDFValue.INT, len(data))
+
+  def inflate_objects(pdf, jobs=1):
+    objects = [obj for obj in PDFFlateEngine.get_stream_objects(pdf) if 'Filter' in obj.named_values]
+    results = PDFFlateEngine.map(PDFStreamFilters.decode_data, jobs,
+      [PDFFlateEngine.get_payload(obj) for obj in objects], [PDFStreamFilters.get_filters(obj) for obj in objects])
+    for obj, data in zip(objects, results):
+      PDFFlateEngine.set_stream(obj, data, False)
+    return len(objects)
+
+  def reflate_objects(pdf, level=DEFAULT_LEVEL, jobs=1):
+    objects = PDFFlateEngine.get_stream_objects(pdf)
+    results = PDFFlateEngine.map(functools.partial(PDFFlateEngine.reflate, level=level), jobs,
+      [PDFFlateEngine.get_payload(obj) for obj in objects], [PDFStreamFilters.get_filters(obj) for obj in objects])
+    for obj, data in zip(objects, results):
+      PDFFlateEngine.set_stream(obj, data, True)
+    return len(objects)
+
+################
+# PDFStreamSpool
+################
+class PDFStreamSpool:
+  def __init__(self, threshold):
+    self.file = tempfile.SpooledTemporaryFile(max_size=threshold)
+    self.threshold = threshold
+    self.size = 0
+
+  def __len__(self):
+    return self.size
+
+  def __bytes__(self):
+    return b''.join(self.read_chunks(PDFStreamPipeline.CHUNK_SIZE))
+
+  def write(self, data):
+    self.file.seek(self.size)
+    self.file.write(data)
+    self.size += len(data)
+
+  def read_chunks(self, chunk_size):
+    pos = 0
+    while pos < self.size:
+      self.file.seek(pos)
+      chunk = self.file.read(chunk_size)
+      pos += len(chunk)
+      yield chunk
+
+  def get_view(self):
+    # the whole payload as one buffer, a spilled one is mapped from its temp
+    # file instead of being read back into memory
+    if self.size <= self.threshold:
+      return memoryview(bytes(self))
+    self.file.flush()
+    return memoryview(mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ))
+
+  def close(self):
+    self.file.close()
+
+###################
+# PDFStreamPipeline
+###################
+class PDFStreamPipeline:
+  CHUNK_SIZE = 1 << 16
+  SPILL_THRESHOLD = 1 << 24
+
+  def iter_chunks(data, chunk_size=CHUNK_SIZE):
+    if isinstance(data, PDFStreamSpool):
+      yield from data.read_chunks(chunk_size)
+      return
+    if len(data) == 0:
+      return
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+      yield view[i:i + chunk_size]
+
+  def inflate(chunks, chunk_size=CHUNK_SIZE):
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+      # bound each output block, highly compressed input can expand a lot
+      while len(chunk) > 0:
+        out = decompressor.decompress(chunk, chunk_size)
+        if len(out) > 0:
+          yield out
+        chunk = decompressor.unconsumed_tail
+      if decompressor.eof:
+        break
+    out = decompressor.flush()
+    if len(out) > 0:
+      yield out
+
+  def deflate(chunks, level=PDFFlateEngine.DEFAULT_LEVEL):
+    compressor = zlib.compressobj(level)
+    for chunk in chunks:
+      out = compressor.compress(chunk)
+      if len(out) > 0:
+        yield out
+    yield compressor.flush()
+
+  def undo_predictor(chunks, params):
+    # predictors work on whole rows, only these payloads are joined up
+    yield PDFStreamFilters.decode_predictor(b''.join(chunks), params)
+
+  def decode(obj, chunk_size=CHUNK_SIZE):
+    return PDFStreamPipeline.decode_data(obj.stream_data, PDFStreamFilters.get_filters(obj), chunk_size)
+
+  def decode_data(data, filters, chunk_size=CHUNK_SIZE):
+    chunks = PDFStreamPipeline.iter_chunks(data, chunk_size)
+    for name, params in filters:
+      if name != 'FlateDecode':
+        raise ValueError("Unsupported Filter type '{0}'".format(name))
+      chunks = PDFStreamPipeline.inflate(chunks, chunk_size)
+      if PDFStreamFilters.get_param(params, 'Predictor', 1) != 1:
+        chunks = PDFStreamPipeline.undo_predictor(chunks, params)
+    return chunks
+
+  def collect(chunks, threshold=None):
+    if threshold is None:
+      return b''.join(chunks)
+    spool = PDFStreamSpool(threshold)
+    for chunk in chunks:
+      spool.write(chunk)
+    return spool
+
+  def inflate_objects(pdf, threshold=SPILL_THRESHOLD):
+    objects = [obj for obj in PDFFlateEngine.get_stream_objects(pdf) if 'Filter' in obj.named_values]
+    for obj in objects:
+      data = PDFStreamPipeline.collect(PDFStreamPipeline.decode(obj), threshold)
+      PDFFlateEngine.set_stream(obj, data, False)
+    return len(objects)
+
+  def reflate_objects(pdf, level=PDFFlateEngine.DEFAULT_LEVEL, threshold=SPILL_THRESHOLD):
+    objects = PDFFlateEngine.get_stream_objects(pdf)
+    for obj in objects:
+      data = PDFStreamPipeline.collect(PDFStreamPipeline.deflate(PDFStreamPipeline.decode(obj), level), threshold)
+      PDFFlateEngine.set_stream(obj, data, True)
+    return len(objects)
+
+###############
+# PDFXrefStream
+###############
+class PDFXrefStream:
+  # stream dictionary keys that do not belong in the trailer
+  STREAM_KEYS = frozenset(['Type', 'Length', 'Filter', 'DecodeParms', 'F', 'FFilter', 'FDecodeParms', 'DL', 'W', 'Index'])
+  FLAGS = ['f', 'n', 'c']
+
+  def is_xref_stream(obj):
+    return 'Type' in obj.named_values and obj.named_values['Type'].value == 'XRef'
+
+  def get_trailer(obj):
+    return {k:v for k, v in obj.named_values.items() if k not in PDFXrefStream.STREAM_KEYS}
+
+  def read_field(data, pos, width, default):
+    if width == 0:
+      return default
+    return int.from_bytes(data[pos:pos + width], 'big')
+
+  def read(obj):
+    # compressed ('c') entries hold the object stream number as offset and
+    # the index within that stream as generation
+    data = PDFStreamFilters.decode(obj)
+    widths = [w.value for w in obj.named_values['W'].value]
+    index = [0, obj.named_values['Size'].value]
+    if 'Index' in obj.named_values:
+      index = [i.value for i in obj.named_values['Index'].value]
+    entry_size = sum(widths)
+    xref = None
+    pos = 0
+    for i in range(0, len(index) - 1, 2):
+      section = PDFXref(index[i], index[i + 1])
+      if xref is None:
+        xref = section
+      else:
+        xref.subsections.append(section)
+      for j in range(index[i + 1]):
+        if pos + entry_size > len(data):
+          break
+        entry_type = PDFXrefStream.read_field(data, pos, widths[0], 1)
+        field_2 = PDFXrefStream.read_field(data, pos + widths[0], widths[1], 0)
+        field_3 = PDFXrefStream.read_field(data, pos + widths[0] + widths[1], widths[2], 0)
+        pos += entry_size
+        flag = PDFXrefStream.FLAGS[entry_type] if entry_type < len(PDFXrefStream.FLAGS) else 'f'
+        section.entries.append(PDFXrefEntry(field_2, field_3, flag))
+    if xref is None:
+      xref = PDFXref()
+    return (xref, PDFXrefStream.get_trailer(obj))
+
+#################
+# PDFObjectStream
+#################
+class PDFObjectStream:
+  HEADER_RE = re.compile(rb'\s*(\d+)\s+(\d+)')
+
+  def is_object_stream(obj):
+    return 'Type' in obj.named_values and obj.named_values['Type'].value == 'ObjStm'
+
+  def read_header(obj, data):
+    # (object number, offset) pairs in stream order
+    count = obj.named_values['N'].value
+    first = obj.named_values['First'].value
+    header = []
+    pos = 0
+    for i in range(count):
+      m = PDFObjectStream.HEADER_RE.match(data, pos, first)
+      if m is None:
+        raise ValueError("Invalid object stream header in object '{0}'".format(obj.get_key()))
+      header.append((int(m.group(1)), int(m.group(2))))
+      pos = m.end()
+    return header
+
+  def read_objects(obj):
+    data = PDFStreamFilters.decode(obj) + b'\n'
+    first = obj.named_values['First'].value
+    header = PDFObjectStream.read_header(obj, data)
+
+    objects = []
+    for name, offset in header:
+      value = PDFLazyLoader.parse_buffer_at(PDFValueParser, data, first + offset)
+      if value is None:
+        raise ValueError("Object '{0}' not found in object stream '{1}'".format(name, obj.get_key()))
+      contained = PDFObject()
+      contained.name = name
+      if value.type == PDFValue.DICTIONARY:
+        contained.named_values.update(value.value)
+      else:
+        contained.values.append(value)
+      contained.set_dirty(False)
+      objects.append(contained)
+    return objects
+
+################
+# PDFLazyObjects
+################
+class PDFLazyObjects(collections.abc.MutableMapping):
+  def __init__(self, filename, offsets, data=None, compressed=None, streams=None):
+    self.filename = filename
+    self.offsets = offsets
+    self.data = data
+    # key -> (object stream key, index) and object stream key -> offset
+    self.compressed = compressed if compressed is not None else {}
+    self.streams = streams if streams is not None else {}
+    self.stream_objects = {}
+    self.loaded = {}
+
+  def is_loaded(self, key):
+    return key in self.loaded
+
+  def load_at(self, key, offset):
+    if self.data is not None:
+      obj = PDFLazyLoader.parse_buffer_at(PDFObjectParser, self.data, offset)
+    else:
+      with open(self.filename, 'rb') as f:
+        obj = PDFLazyLoader.parse_at(PDFObjectParser, f, offset)
+    if obj is None or obj.get_key() != key:
+      raise ValueError("Object '{0}' not found at offset {1} of '{2}'".format(key, offset, self.filename))
+    return obj
+
+  def load_compressed(self, key):
+    stream_key, index = self.compressed[key]
+    if stream_key not in self.streams:
+      raise ValueError("Object stream '{0}' of object '{1}' not found in '{2}'".format(stream_key, key, self.filename))
+    contained = self.stream_objects.get(stream_key)
+    if contained is None:
+      # decode each object stream once for all the objects it holds
+      contained = PDFObjectStream.read_objects(self.load_at(stream_key, self.streams[stream_key]))
+      self.stream_objects[stream_key] = contained
+    if index >= len(contained) or contained[index].get_key() != key:
+      raise ValueError("Object '{0}' not found in object stream '{1}' of '{2}'".format(key, stream_key, self.filename))
+    return contained[index]
+
+  def load(self, key):
+    if key in self.compressed:
+      return self.load_compressed(key)
+    return self.load_at(key, self.offsets[key])
+
+  def __getitem__(self, key):
+    obj = self.loaded.get(key)
+    if obj is None:
+      if key not in self.offsets and key not in self.compressed:
+        raise KeyError(key)
+      obj = self.load(key)
+      self.loaded[key] = obj
+    return obj
+
+  def __setitem__(self, key, obj):
+    self.loaded[key] = obj
+
+  def __delitem__(self, key):
+    if key not in self:
+      raise KeyError(key)
+    self.loaded.pop(key, None)
+    self.offsets.pop(key, None)
+    self.compressed.pop(key, None)
+
+  def __contains__(self, key):
+    return key in self.loaded or key in self.offsets or key in self.compressed
+
+  def __iter__(self):
+    for key in self.offsets:
+      yield key
+    for key in self.compressed:
+      yield key
+    for key in self.loaded:
+      if key not in self.offsets and key not in self.compressed:
+        yield key
+
+  def __len__(self):
+    return len(self.offsets) + len(self.compressed) + len([key for key in self.loaded if key not in self.offsets and key not in self.compressed])
+
+###############
+# PDFLazyLoader
+###############
+class PDFLazyLoader:
+  TAIL_SIZE = 1024
+  BLOCK_SIZE = 1 << 16
+  START_XREF_RE = re.compile(rb'startxref\s+(\d+)')
+
+  def parse_at(parser_class, f, offset, quiet=False):
+    values = []
+    f.seek(offset)
+    reader = ParserReader(PDFLazyLoader.BLOCK_SIZE, quiet=quiet)
+    if not reader.parse(parser_class(values.append).begin, f, offset) or len(values) == 0:
+      return None
+    return values[0]
+
+  def parse_buffer_at(parser_class, data, offset):
+    values = []
+    reader = ParserReader()
+    if not reader.parse_buffer(parser_class(values.append).begin, memoryview(data)[offset:], offset) or len(values) == 0:
+      return None
+    return values[0]
+
+  def find_start_xref(f):
+    f.seek(0, io.SEEK_END)
+    size = f.tell()
+    f.seek(max(0, size - PDFLazyLoader.TAIL_SIZE))
+    matches = PDFLazyLoader.START_XREF_RE.findall(f.read())
+    if len(matches) == 0:
+      return None
+    return int(matches[-1])
+
+  def read_section(f, offset, quiet=False):
+    f.seek(offset)
+    if f.read(4) == b'xref':
+      section = PDFLazyLoader.parse_at(PDFXrefSectionParser, f, offset, quiet)
+      if section is None or section[1] is None:
+        return None
+      return (offset, section[0], section[1], False)
+    obj = PDFLazyLoader.parse_at(PDFObjectParser, f, offset, quiet)
+    if obj is None or not PDFXrefStream.is_xref_stream(obj):
+      return None
+    xref, trailer = PDFXrefStream.read(obj)
+    return (offset, xref, trailer, True)
+
+  def read_sections(f, offset, quiet=False):
+    # (offset, xref, trailer, is_stream) tuples, newest first; the stream of
+    # a hybrid file comes right before its table with a trailer of None
+    sections = []
+    visited = set()
+    while offset is not None and offset not in visited:
+      visited.add(offset)
+      section = PDFLazyLoader.read_section(f, offset, quiet)
+      if section is None:
+        return None
+      trailer = section[2]
+      if not section[3] and 'XRefStm' in trailer:
+        hybrid = PDFLazyLoader.read_section(f, trailer['XRefStm'].value, quiet)
+        if hybrid is not None and hybrid[3]:
+          sections.append((hybrid[0], hybrid[1], None, True))
+      sections.append(section)
+      offset = None
+      if 'Prev' in trailer:
+        offset = trailer['Prev'].value
+    return sections
+
+  def read_file(filename, use_mmap=False, recover=False):
+    # with recover set, a file whose xref chain cannot be read is indexed
+    # from its object headers instead
+    pdf = PDF()
+    data = None
+    with open(filename, 'rb') as f:
+      header = PDFLazyLoader.parse_at(PDFHeaderParser, f, 0)
+      start_xref = PDFLazyLoader.find_start_xref(f)
+      sections = None
+      if header is not None and start_xref is not None:
+        # a damaged chain is not an error when it can be recovered from
+        sections = PDFLazyLoader.read_sections(f, start_xref, recover)
+      if sections is None:
+        if recover and header is not None:
+          return PDFXrefRecovery().read_file(filename, use_mmap)
+        return None
+      if use_mmap:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    newest = [section for section in sections if section[2] is not None][0]
+    pdf.header_line_1, pdf.header_line_2 = header
+    pdf.xref, pdf.trailer = newest[1], newest[2]
+    pdf.xref_stream = newest[3]
+    pdf.start_xref = start_xref
+    pdf.source = data
+    pdf.source_path = filename
+
+    entries = {}
+    for offset, xref, trailer, is_stream in reversed(sections):
+      for obj_id, entry in xref.get_entries():
+        entries[obj_id] = entry
+    stream_offsets = set([section[0] for section in sections if section[3]])
+    offsets = {}
+    compressed = {}
+    for obj_id, entry in entries.items():
+      if entry.flag == 'n' and entry.offset not in stream_offsets:
+        offsets[(obj_id, entry.generation)] = entry.offset
+      elif entry.flag == 'c':
+        compressed[(obj_id, 0)] = ((entry.offset, 0), entry.generation)
+    # object streams are containers, not document objects
+    streams = {}
+    for stream_key, index in compressed.values():
+      if stream_key in offsets:
+        streams[stream_key] = offsets.pop(stream_key)
+    if recover:
+      with open(filename, 'rb') as f:
+        source = data if data is not None else mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        valid = PDFXrefRecovery.verify_offsets(source, offsets) and PDFXrefRecovery.verify_offsets(source, streams)
+        if source is not data:
+          source.close()
+      if not valid:
+        if data is not None:
+          data.close()
+        return PDFXrefRecovery().read_file(filename, use_mmap)
+    pdf.objects = PDFLazyObjects(filename, offsets, data, compressed, streams)
+    return pdf
+
+#################
+# PDFXrefRecovery
+#################
+# Rebuilds the offset table of a file whose xref is missing or stale from the
+# "N G obj" headers themselves. The headers are matched on reversed blocks of
+# the file so the pattern starts with a literal and the regex engine skips
+# straight to each candidate instead of trying every digit. Later headers win,
+# as they do in incremental updates.
+class PDFXrefRecovery:
+  BLOCK_SIZE = 1 << 22
+  # longest header the regex can match, so no block boundary splits one
+  OVERLAP = 64
+  REVERSED_HEADER_RE = re.compile(rb'jbo[\x00\t\n\x0c\r ]{1,16}(\d{1,5})[\x00\t\n\x0c\r ]{1,16}(\d{1,10})(?![0-9])')
+  HEADER_RE = re.compile(rb'[\x00\t\n\x0c\r ]*(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj')
+  TYPE_RE = re.compile(rb'/Type[\x00\t\n\x0c\r ]*/(ObjStm|XRef|Catalog)(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])')
+  TRAILER_RE = re.compile(rb'trailer[\x00\t\n\x0c\r ]*<<')
+  DELIMITERS = frozenset(b'\x00\t\n\x0c\r ()<>[]{}/%')
+
+  def __init__(self):
+    self.offsets = {}
+    # (key, offset) of headers replaced by a later one
+    self.superseded = []
+    self.compressed = {}
+    self.streams = {}
+    self.xref_streams = []
+    self.trailer = None
+    # offset of the trailer dictionary or xref stream the trailer came from,
+    # None when it was built around a catalog
+    self.trailer_offset = None
+    self.headers = 0
+    self.seconds = 0.0
+
+  def find_headers(data):
+    # (offset, key) of every header, last in the file first
+    headers = []
+    size = len(data)
+    end = size
+    while end > 0:
+      start = max(0, end - PDFXrefRecovery.BLOCK_SIZE)
+      window_start = max(0, start - PDFXrefRecovery.OVERLAP)
+      # one byte past the keyword of a header ending the block
+      window_end = min(size, end + 3)
+      block = data[window_start:window_end][::-1]
+      # reversed, a match starts at the end of its keyword; keywords outside
+      # [start, end) belong to the neighbouring blocks
+      first = window_end - end - 3
+      last = window_end - start - 3
+      for m in PDFXrefRecovery.REVERSED_HEADER_RE.finditer(block):
+        keyword, header = m.span()
+        if keyword <= first:
+          continue
+        if keyword > last:
+          break
+        if keyword > 0 and block[keyword - 1] not in PDFXrefRecovery.DELIMITERS:
+          continue
+        generation, number = m.groups()
+        headers.append((window_end - header, (int(number[::-1]), int(generation[::-1]))))
+      end = start
+    return headers
+
+  def verify_duplicates(self, data, positions):
+    # a header quoted in a string or stream of a later object would win, so
+    # keys seen more than once keep their newest header that parses and is
+    # not inside the object before it
+    candidates = {}
+    for key, offset in self.superseded:
+      candidates.setdefault(key, [self.offsets[key]]).append(offset)
+    self.superseded = [item for item in self.superseded if item[0] not in candidates]
+    for key, offsets in candidates.items():
+      for offset in offsets:
+        obj = PDFXrefRecovery.load(data, offset)
+        if obj is None or obj.get_key() != key:
+          continue
+        i = bisect.bisect_left(positions, offset) - 1
+        previous = PDFXrefRecovery.load(data, positions[i]) if i >= 0 else None
+        if previous is None or previous.source_span[1] <= offset:
+          break
+      else:
+        offset = offsets[0]
+      self.offsets[key] = offset
+      self.superseded.extend((key, other) for other in offsets if other != offset)
+
+  def verify_offsets(data, offsets):
+    # tables pointing anywhere but at the header of their object are stale
+    for key, offset in offsets.items():
+      m = PDFXrefRecovery.HEADER_RE.match(data, offset)
+      if m is None or (int(m.group(1)), int(m.group(2))) != key:
+        return False
+    return True
+
+  def get_owners(self, data, headers, positions):
+    # objects by /Type, each match attributed to the header before it
+    owners = {offset: key for offset, key in headers}
+    types = {b'ObjStm': [], b'XRef': [], b'Catalog': []}
+    for m in PDFXrefRecovery.TYPE_RE.finditer(data):
+      i = bisect.bisect_right(positions, m.start()) - 1
+      if i < 0:
+        continue
+      key = owners[positions[i]]
+      if self.offsets.get(key) == positions[i] and key not in types[m.group(1)]:
+        types[m.group(1)].append(key)
+    return types
+
+  def load(data, offset):
+    try:
+      return PDFLazyLoader.parse_buffer_at(PDFObjectParser, data, offset)
+    except Exception:
+      return None
+
+  def add_object_stream(self, data, key):
+    offset = self.offsets[key]
+    obj = PDFXrefRecovery.load(data, offset)
+    if obj is None or not PDFObjectStream.is_object_stream(obj):
+      return
+    try:
+      header = PDFObjectStream.read_header(obj, PDFStreamFilters.decode(obj) + b'\n')
+    except Exception:
+      return
+    self.streams[key] = self.offsets.pop(key)
+    for index, (name, position) in enumerate(header):
+      contained = (name, 0)
+      if contained in self.offsets and self.offsets[contained] > offset:
+        continue
+      if contained in self.compressed and self.streams[self.compressed[contained][0]] > offset:
+        continue
+      if contained in self.offsets:
+        self.superseded.append((contained, self.offsets.pop(contained)))
+      self.compressed[contained] = (key, index)
+
+  def add_xref_stream(self, data, key):
+    obj = PDFXrefRecovery.load(data, self.offsets[key])
+    if obj is None or not PDFXrefStream.is_xref_stream(obj):
+      return
+    offset = self.offsets.pop(key)
+    self.xref_streams.append((offset, PDFXrefStream.get_trailer(obj)))
+
+  def find_trailer(self, data, catalogs):
+    candidates = list(self.xref_streams)
+    for m in PDFXrefRecovery.TRAILER_RE.finditer(data):
+      trailer = None
+      try:
+        trailer = PDFLazyLoader.parse_buffer_at(PDFTrailerParser, data, m.start())
+      except Exception:
+        pass
+      if trailer is not None:
+        candidates.append((m.start(), trailer))
+    # the newest trailer whose catalog was recovered
+    for offset, trailer in sorted(candidates, key=lambda c: -c[0]):
+      root = trailer.get('Root')
+      if root is not None and root.type == PDFValue.REFERENCE and self.has_key(root.value.get_key()):
+        trailer = dict(trailer)
+        # the offsets these point at are the ones being replaced
+        trailer.pop('Prev', None)
+        trailer.pop('XRefStm', None)
+        self.trailer_offset = offset
+        return trailer
+    root = None
+    for key in sorted(catalogs, key=lambda k: -self.offsets[k]):
+      obj = PDFXrefRecovery.load(data, self.offsets[key])
+      if obj is not None and obj.get_key() == key and 'Type' in obj.named_values and obj.named_values['Type'].value == 'Catalog':
+        root = key
+        break
+    if root is None:
+      root = self.find_compressed_catalog(data)
+    if root is None:
+      return None
+    return {'Root': PDFValue(PDFValue.REFERENCE, PDFReference(root[0], root[1]))}
+
+  def find_compressed_catalog(self, data):
+    for stream_key, offset in sorted(self.streams.items(), key=lambda s: -s[1]):
+      try:
+        contained = PDFObjectStream.read_objects(PDFXrefRecovery.load(data, offset))
+      except Exception:
+        continue
+      for obj in contained:
+        if self.compressed.get(obj.get_key(), (None,))[0] != stream_key:
+          continue
+        if 'Type' in obj.named_values and obj.named_values['Type'].value == 'Catalog':
+          return obj.get_key()
+    return None
+
+  def has_key(self, key):
+    return key in self.offsets or key in self.compressed
+
+  def scan(self, data):
+    start = time.perf_counter()
+    headers = PDFXrefRecovery.find_headers(data)
+    self.headers = len(headers)
+    for offset, key in headers:
+      if key in self.offsets:
+        self.superseded.append((key, offset))
+      else:
+        self.offsets[key] = offset
+    positions = sorted(offset for offset, key in headers)
+    if len(self.superseded) > 0:
+      self.verify_duplicates(data, positions)
+    types = self.get_owners(data, headers, positions)
+    for key in types[b'XRef']:
+      self.add_xref_stream(data, key)
+    for key in types[b'ObjStm']:
+      self.add_object_stream(data, key)
+    self.trailer = self.find_trailer(data, [key for key in types[b'Catalog'] if key in self.offsets])
+    if self.trailer is not None:
+      self.trailer['Size'] = PDFValue(PDFValue.INT, max([key[0] for key in self.offsets] + [key[0] for key in self.compressed], default=0) + 1)
+    self.seconds = time.perf_counter() - start
+    return self.trailer is not None
+
+  def read_file(self, filename, use_mmap=False):
+    pdf = PDF()
+    with open(filename, 'rb') as f:
+      header = PDFLazyLoader.parse_at(PDFHeaderParser, f, 0)
+      if header is None:
+        return None
+      data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    if not self.scan(data):
+      data.close()
+      return None
+    if not use_mmap:
+      data.close()
+      data = None
+
+    pdf.header_line_1, pdf.header_line_2 = header
+    pdf.trailer = self.trailer
+    pdf.source = data
+    pdf.source_path = filename
+    pdf.recovery = self
+    pdf.objects = PDFLazyObjects(filename, dict(self.offsets), data, dict(self.compressed), dict(self.streams))
+    return pdf
+
+  def get_ids(self):
+    # recovered object numbers as ranges, e.g. '1-12 14 20-25'
+    ids = sorted(set([key[0] for key in self.offsets] + [key[0] for key in self.compressed]))
+    ranges = []
+    for obj_id in ids:
+      if len(ranges) > 0 and ranges[-1][1] == obj_id - 1:
+        ranges[-1][1] = obj_id
+      else:
+        ranges.append([obj_id, obj_id])
+    return ' '.join(str(a) if a == b else '{0}-{1}'.format(a, b) for a, b in ranges)
+
+  def get_report(self):
+    lines = []
+    lines.append('headers: {0} objects: {1} compressed: {2} object streams: {3} xref streams: {4} superseded: {5} seconds: {6:.3f}'.format(
+      self.headers, len(self.offsets), len(self.compressed), len(self.streams), len(self.xref_streams), len(self.superseded), self.seconds))
+    if self.trailer is None:
+      lines.append('trailer: not found')
+    elif self.trailer_offset is None:
+      lines.append('trailer: rebuilt around catalog {0}'.format(self.trailer['Root'].value.get_key()))
+    else:
+      lines.append('trailer: offset {0}'.format(self.trailer_offset))
+    lines.append('ids: {0}'.format(self.get_ids()))
+    return '\n'.join(lines)
+
+  def __str__(self):
+    return self.get_report()
+
 ############
 # PDF Parser
 ############
 class PDFParser(ParserBase):
-  def __init__(self, set_value):
+  def __init__(self, set_value, set_object=None):
     ParserBase.__init__(self, set_value)
     self.pdf = PDF()
+    self.completed = False
+    # called with each object as soon as it is parsed, set_value only gets
+    # the document once its trailer is read
+    self.set_object = set_object
 
   def set_header_line_1(self, v):
     self.pdf.header_line_1 = v
@@ -816,13 +2365,27 @@ class PDFParser(ParserBase):
     self.last_value = v
 
   def append_object(self, o):
+    if PDFXrefStream.is_xref_stream(o):
+      # the stream only indexes this revision, keep its entries and trailer
+      self.pdf.xref, self.pdf.trailer = PDFXrefStream.read(o)
+      self.pdf.xref_stream = True
+      return
+    if PDFObjectStream.is_object_stream(o):
+      for contained in PDFObjectStream.read_objects(o):
+        self.pdf.objects[contained.get_key()] = contained
+        if self.set_object is not None:
+          self.set_object(contained)
+      return
     self.pdf.objects[o.get_key()] = o
+    if self.set_object is not None:
+      self.set_object(o)
 
   def set_trailer(self, t):
     self.pdf.trailer = t
+    self.pdf.xref_stream = False
 
   def set_start_xref(self, n):
-    pass
+    self.pdf.start_xref = n
 
   def set_xref(self, x):
     self.pdf.xref = x
@@ -847,9 +2410,184 @@ class PDFParser(ParserBase):
     return PDFParseResult(None, PDFObjectParser(self.append_object).begin, self.begin_object)
    
   def complete(self, b, n):
-    self.set_value(self.pdf)
+    if not self.completed:
+      self.completed = True
+      self.set_value(self.pdf)
+    return PDFParseResult(None, self.read_update, None)
+
+  def read_update(self, b, n):
+    # incremental updates append objects, an xref and a trailer after %%EOF
+    if str(chr(b)).isspace():
+      return PDFParseResult(None, None, self.read_update)
+    if chr(b) == '%':
+      return PDFParseResult(None, PDFCommentParser(PDFUtils.noop).begin, self.read_update)
+    if chr(b).isdigit() or chr(b) in 'xst':
+      return PDFParseResult(None, self.begin_object, None)
     return PDFParseResult(None, None, None)
 
+#######################
+# PDFParseCacheUnpickler
+#######################
+# Cache entries only hold parsed PDF data, so no other global may be named
+# by one. An entry naming anything else, os.system for example, is refused
+# instead of being run.
+class PDFParseCacheUnpickler(pickle.Unpickler):
+  CLASSES = frozenset(['PDF', 'PDFXref', 'PDFXrefEntry', 'PDFValue', 'PDFConstValue', 'PDFReference', 'PDFNamedValues', 'PDFValueList', 'PDFObject'])
+
+  def find_class(self, module, name):
+    if module == __name__ and name in PDFParseCacheUnpickler.CLASSES:
+      return globals()[name]
+    raise pickle.UnpicklingError("Cache entry refers to '{0}.{1}'".format(module, name))
+
+###############
+# PDFParseCache
+###############
+# Parsed documents on disk, keyed by a hash of the file contents and the
+# parser version. Stream payloads are not stored, only their offsets in the
+# source file; they are sliced out of the file again on load. Files are
+# evicted least recently used first once the directory grows past max_size.
+# Only entries owned by the current user are loaded, through
+# PDFParseCacheUnpickler.
+class PDFParseCache:
+  # bump whenever parsing or the layout of the parsed classes changes
+  VERSION = 4
+  DEFAULT_MAX_SIZE = 1 << 28
+  DIR_VARIABLE = 'PDF_PARSE_CACHE_DIR'
+  SUFFIX = '.pdfcache'
+  HASH_BLOCK_SIZE = 1 << 20
+
+  def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+    self.directory = directory
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+
+  def get_default(max_size=DEFAULT_MAX_SIZE):
+    # opt in by pointing the environment variable at a directory
+    directory = os.environ.get(PDFParseCache.DIR_VARIABLE)
+    if directory is None or len(directory) == 0:
+      return None
+    return PDFParseCache(directory, max_size)
+
+  def get_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+      for block in iter(functools.partial(f.read, PDFParseCache.HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+  def get_path(self, digest):
+    return os.path.join(self.directory, '{0}-{1}{2}'.format(digest, PDFParseCache.VERSION, PDFParseCache.SUFFIX))
+
+  def find_stream(obj, source):
+    # the payload sits right before endstream, optionally followed by an EOL
+    if obj.source_span is None or len(obj.stream_data) == 0:
+      return None
+    start, end = obj.source_span
+    size = len(obj.stream_data)
+    stream_end = source.rfind(b'endstream', start, end)
+    for eol in range(3):
+      offset = stream_end - eol - size
+      if offset >= start and source[offset:offset + size] == obj.stream_data:
+        return (offset, offset + size)
+    return None
+
+  def read_file(self, filename, use_mmap=False):
+    digest = PDFParseCache.get_digest(filename)
+    pdf = self.load(digest, filename, use_mmap)
+    if pdf is not None:
+      self.hits += 1
+      return pdf
+    self.misses += 1
+    pdfs = []
+    if not ParserReader().read_file(PDFParser(pdfs.append).begin, filename, use_mmap) or len(pdfs) == 0:
+      return None
+    pdf = pdfs[0]
+    pdf.source_path = filename
+    self.store(digest, filename, pdf)
+    return pdf
+
+  def load(self, digest, filename, use_mmap=False):
+    path = self.get_path(digest)
+    if not os.path.exists(path):
+      return None
+    with open(filename, 'rb') as f:
+      if use_mmap and os.fstat(f.fileno()).st_size > 0:
+        source = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY))
+      else:
+        source = f.read()
+    try:
+      with open(path, 'rb') as f:
+        if not PDFParseCache.is_trusted(os.fstat(f.fileno())):
+          return None
+        unpickler = PDFParseCacheUnpickler(f)
+        unpickler.persistent_load = lambda span: source[span[0]:span[1]]
+        pdf = unpickler.load()
+    except Exception:
+      # a damaged or foreign entry is a miss, parsing again replaces it
+      PDFParseCache.remove(path)
+      return None
+    pdf.source_path = filename
+    # loads count as use for the least recently used order
+    os.utime(path)
+    return pdf
+
+  def is_trusted(stat):
+    # entries written by another user are not loaded, they may be planted
+    return not hasattr(os, 'getuid') or stat.st_uid == os.getuid()
+
+  def store(self, digest, filename, pdf):
+    with open(filename, 'rb') as f:
+      if os.fstat(f.fileno()).st_size == 0:
+        return False
+      source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    streams = {}
+    for obj in pdf.objects.values():
+      span = PDFParseCache.find_stream(obj, source)
+      if span is not None:
+        streams[id(obj.stream_data)] = span
+    source.close()
+
+    # only the current user may write entries
+    os.makedirs(self.directory, 0o700, exist_ok=True)
+    path = self.get_path(digest)
+    fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda value: streams.get(id(value))
+        source_value, pdf.source = pdf.source, None
+        try:
+          pickler.dump(pdf)
+        finally:
+          pdf.source = source_value
+      os.replace(temp_path, path)
+    except Exception:
+      PDFParseCache.remove(temp_path)
+      raise
+    self.evict()
+    return True
+
+  def evict(self):
+    entries = []
+    for name in os.listdir(self.directory):
+      if name.endswith(PDFParseCache.SUFFIX):
+        path = os.path.join(self.directory, name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(entry[1] for entry in entries)
+    for mtime, size, path in sorted(entries):
+      if total <= self.max_size:
+        break
+      PDFParseCache.remove(path)
+      total -= size
+
+  def remove(path):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
 ########################
 # PDFContentStreamParser
 ########################
@@ -870,12 +2608,309 @@ class PDFContentStreamParser(ParserBase):
     return PDFParseResult(None, PDFValueParser(self.append_value).begin, self.begin)
 
 
+#######################
+# PDFContentStreamMatch
+#######################
+class PDFContentStreamMatch:
+  __slots__ = ('name', 'start', 'operator_start', 'end')
+
+  def __init__(self, name, start, operator_start, end):
+    # start is the first operand byte (comments in front of the operands
+    # included), or operator_start if there are none
+    self.name = name
+    self.start = start
+    self.operator_start = operator_start
+    self.end = end
+
+  def get_operands(self, data):
+    operands = []
+    pos = self.start
+    while True:
+      pos = PDFContentStreamScanner.SEPARATOR_RE.match(data, pos).end()
+      if pos >= self.operator_start:
+        break
+      # operands are never references, which saves reading ahead past the
+      # operator at the end of the stream
+      item = PDFLexer.read_token(data, pos)
+      if item is not None and item[0].type == PDFValue.TOKEN and item[0].value in ('[', '<<'):
+        item = PDFLexer.read_value(data, pos)
+      if item is None:
+        raise ValueError("Unreadable operands for '{0}' at offset {1}".format(self.name, self.start))
+      value, pos = item
+      operands.append(value)
+    return operands
+
+  def get_numbers(self, data):
+    return [value.value for value in self.get_operands(data)]
+
+  def __str__(self):
+    return "{0} [{1}:{2}]".format(self.name, self.start, self.end)
+
+  def __repr__(self):
+    return self.__str__()
+
+#########################
+# PDFContentStreamScanner
+#########################
+# Walks a decoded content stream operator by operator with compiled regular
+# expressions. Operands are skipped over, not parsed; callers get the byte
+# range of each command and read operands only for the commands they keep.
+class PDFContentStreamScanner:
+  REGULAR = rb'[^\x00\t\n\x0c\r ()<>\[\]{}/%]'
+  WHITESPACE = rb'[\x00\t\n\x0c\r ]*'
+  # a template on the number of the group that makes comments atomic
+  OPERAND = (rb'(?:/' + REGULAR.replace(b'%', b'%%') + rb'*(?!' + REGULAR.replace(b'%', b'%%') + rb')|[+\-.0-9]' + REGULAR.replace(b'%', b'%%') + rb'*(?!' + REGULAR.replace(b'%', b'%%') + rb')'
+    rb'|(?:true|false|null)(?!' + REGULAR.replace(b'%', b'%%') + rb')|\((?:[^()\\]|\\.|\((?:[^()\\]|\\.)*\))*\)|<<|>>|<[^<>]*>|[\[\]{}]|(?=(%%[^\r\n]*))\%d)')
+  # operators start a token, so they never begin inside a name or number
+  OPERATOR = rb'(?<!' + REGULAR[:-1] + rb'/])(?!(?:true|false|null)(?!' + REGULAR + rb'))[^\x00\t\n\x0c\r ()<>\[\]{}/%+\-.0-9]' + REGULAR + rb'*'
+  # groups: 1 operands, 2 comment, 3 operator
+  COMMAND_RE = re.compile(WHITESPACE + rb'((?:' + OPERAND % 2 + WHITESPACE + rb')*)(' + OPERATOR + rb')', re.DOTALL)
+  OPERAND_RE = re.compile(WHITESPACE + rb'(' + OPERAND % 2 + rb')', re.DOTALL)
+  OPERATOR_RE = re.compile(OPERATOR)
+  WHITESPACE_RE = re.compile(WHITESPACE)
+  SEPARATOR_RE = re.compile(rb'(?:[\x00\t\n\x0c\r ]|%[^\r\n]*)*')
+  INLINE_IMAGE_END_RE = re.compile(rb'(?<=[\x00\t\n\x0c\r ])EI(?!' + REGULAR + rb')')
+  SELECTIVE_RES = {}
+
+  def get_command_re(operators):
+    # commands outside the selection are matched as a run in front of the
+    # next selected one, so skipping them costs no work outside the regex
+    # engine. ID is always selected to step over inline image data.
+    if operators is None:
+      return PDFContentStreamScanner.COMMAND_RE
+    command_re = PDFContentStreamScanner.SELECTIVE_RES.get(operators)
+    if command_re is None:
+      cls = PDFContentStreamScanner
+      selected = rb'(?:' + b'|'.join(re.escape(op) for op in sorted(operators | {b'ID'})) + rb')(?!' + cls.REGULAR + rb')'
+      skip = cls.WHITESPACE + rb'(?:' + cls.OPERAND % 1 + cls.WHITESPACE + rb')*(?!' + selected + rb')' + cls.OPERATOR
+      # groups: 1 skipped comment, 2 operands, 3 comment, 4 operator
+      command_re = re.compile(rb'(?:' + skip + rb')*' + cls.WHITESPACE + rb'((?:' + cls.OPERAND % 3 + cls.WHITESPACE + rb')*)'
+        rb'(?=' + selected + rb')(' + cls.OPERATOR + rb')', re.DOTALL)
+      cls.SELECTIVE_RES[operators] = command_re
+    return command_re
+
+  def skip_string(data, pos):
+    depth = 0
+    search = PDFLexer.STRING_RE.search
+    while True:
+      m = search(data, pos)
+      if m is None:
+        return len(data)
+      c = m.group()
+      pos = m.end()
+      if c == b'\\':
+        pos += 1
+      elif c == b'(':
+        depth += 1
+      else:
+        depth -= 1
+        if depth == 0:
+          return pos
+
+  def scan(data, pos=0, operators=None):
+    # yields (operator, operands start, operator start, end) with the
+    # operator as bytes, for every command or only for a frozenset of
+    # operators
+    command_re = PDFContentStreamScanner.get_command_re(operators)
+    operator_group = command_re.groups
+    operands_group = operator_group - 2
+    end = len(data)
+    operands_start = None
+    while pos < end:
+      restart = False
+      for m in command_re.finditer(data, pos):
+        if m.start() != pos:
+          break
+        operator_start, pos = m.span(operator_group)
+        # bytes even for a memoryview of writable data, so it hashes
+        operator = bytes(data[operator_start:pos])
+        # without operands the group is empty and starts at the operator
+        start = m.start(operands_group)
+        if operands_start is not None:
+          # operands skipped one by one belong to this command unless the
+          # match went on to skip whole commands
+          if PDFContentStreamScanner.WHITESPACE_RE.match(data, m.start()).end() == start:
+            start = operands_start
+          operands_start = None
+        if operators is None or operator in operators:
+          yield (operator, start, operator_start, pos)
+        if operator == b'ID':
+          # inline image data is binary, the command runs up to EI
+          image_start = pos + 1
+          m = PDFContentStreamScanner.INLINE_IMAGE_END_RE.search(data, image_start)
+          if m is not None:
+            pos = m.end()
+            if operators is None or b'EI' in operators:
+              yield (b'EI', image_start, m.start(), pos)
+          restart = True
+          break
+      if restart:
+        continue
+
+      # something the command pattern can not take in one go, such as a
+      # deeply nested string, a stray delimiter or operands at the very end
+      pos = PDFContentStreamScanner.WHITESPACE_RE.match(data, pos).end()
+      if pos >= end:
+        break
+      if operands_start is None:
+        operands_start = pos
+      if data[pos] == 0x28:
+        pos = PDFContentStreamScanner.skip_string(data, pos)
+        continue
+      m = PDFContentStreamScanner.OPERAND_RE.match(data, pos)
+      if m is not None and m.end() > pos:
+        pos = m.end()
+        continue
+      # a command left out of the selection takes its operands with it,
+      # stray delimiters are dropped along with anything in front of them
+      operands_start = None
+      m = PDFContentStreamScanner.OPERATOR_RE.match(data, pos)
+      pos = m.end() if m is not None else pos + 1
+
+  def find(data, operators=None):
+    if operators is not None:
+      operators = frozenset(op.encode() for op in operators)
+    for operator, start, operator_start, end in PDFContentStreamScanner.scan(data, 0, operators):
+      yield PDFContentStreamMatch(operator.decode('latin-1'), start, operator_start, end)
+
+#######################
+# PDFContentStreamQuery
+#######################
+# Selects operators that appear inside a scope, for example 're' after a
+# '1 0 1 rg' fill colour up to the next 'Q'. The scope opens on a scope
+# operator whose operands pass scope_test and closes on any other scope
+# operator or on one of the until operators. The scope carries over from one
+# find to the next, so the content streams of a page can be searched in turn
+# as the one stream they make up.
+class PDFContentStreamQuery:
+  def __init__(self, operators, scope=None, scope_test=None, until=()):
+    self.operators = frozenset(op.encode() for op in operators)
+    self.scope = scope.encode() if scope is not None else None
+    self.scope_test = scope_test
+    self.until = frozenset(op.encode() for op in until)
+    self.selected = self.operators | self.until | (frozenset([self.scope]) if self.scope is not None else frozenset())
+    # scope operators tend to repeat the same operands, test each spelling once
+    self.tested = {}
+    self.active = self.scope is None
+
+  def find(self, data):
+    matches = []
+    names = {}
+    tested = self.tested
+    active = self.active
+    for operator, start, operator_start, end in PDFContentStreamScanner.scan(data, 0, self.selected):
+      if operator == self.scope:
+        if self.scope_test is None:
+          active = True
+        else:
+          operands = bytes(data[start:operator_start])
+          active = tested.get(operands)
+          if active is None:
+            command = PDFContentStreamMatch(self.scope.decode('latin-1'), start, operator_start, end)
+            active = tested[operands] = bool(self.scope_test(command.get_operands(data)))
+      elif active and operator in self.operators:
+        name = names.get(operator)
+        if name is None:
+          name = names[operator] = operator.decode('latin-1')
+        matches.append(PDFContentStreamMatch(name, start, operator_start, end))
+      if operator in self.until and self.scope is not None:
+        active = False
+    self.active = active
+    return matches
+
+########################
+# PDFContentStreamEditor
+########################
+# Deletes or replaces byte ranges of a decoded content stream, usually the
+# ranges of PDFContentStreamMatch objects. Everything between the edits is
+# passed on as memoryview slices of the original data, so the output keeps
+# the source bytes and the cost follows the number of edits.
+class PDFContentStreamEditor:
+  def __init__(self, data):
+    self.data = memoryview(data)
+    self.edits = []
+
+  def replace(self, start, end, data):
+    if start < 0 or end < start or end > len(self.data):
+      raise ValueError("Invalid content stream range [{0}:{1}]".format(start, end))
+    self.edits.append((start, end, data))
+
+  def delete(self, start, end):
+    self.replace(start, end, b'')
+
+  def replace_match(self, match, data):
+    # operands and operator go, the separators around the command stay
+    self.replace(match.start, match.end, data)
+
+  def delete_match(self, match):
+    self.replace(match.start, match.end, b'')
+
+  def get_segments(self):
+    segments = []
+    pos = 0
+    for start, end, data in sorted(self.edits, key=lambda edit: (edit[0], edit[1])):
+      if start < pos:
+        raise ValueError("Overlapping content stream edits at offset {0}".format(start))
+      if start > pos:
+        segments.append(self.data[pos:start])
+      if len(data) > 0:
+        segments.append(data)
+      pos = end
+    if pos < len(self.data):
+      segments.append(self.data[pos:])
+    return segments
+
+  def getvalue(self):
+    if len(self.edits) == 0:
+      return self.data.tobytes()
+    return b''.join(self.get_segments())
+
+###################
+# ParserReaderState
+###################
+class ParserReaderState:
+  # where a ParserReader stopped at the end of a block
+  def __init__(self, parser, offset=0):
+    self.next_parser = parser
+    self.stack = []
+    self.resume = []
+    # offset of the first byte of the next block
+    self.offset = offset
+    # (rule, parser) when the generator core takes this parse, see PDFGrammar
+    self.rule = PDFGrammar.get_rule(parser) if ParserReader.core == 'generator' else None
+    self.lexer = None
+    self.generator = None
+
+################
+# PDFChunkReader
+################
+class PDFChunkReader:
+  # file-like wrapper so ParserReader can consume an iterable of byte chunks
+  def __init__(self, chunks):
+    self.chunks = iter(chunks)
+
+  def read(self, size=-1):
+    for chunk in self.chunks:
+      if len(chunk) > 0:
+        return chunk
+    return b''
+
 ##############
 # ParserReader
 ##############
 class ParserReader:
-  def __init__(self):
-    pass
+  DEFAULT_BLOCK_SIZE = 1 << 20
+  # 'state' runs the byte-at-a-time parse functions, 'generator' the grammar
+  # rules of PDFGrammar wherever one covers the parser
+  core = os.environ.get('PDF_PARSER_CORE', 'state')
+
+  def __init__(self, block_size=DEFAULT_BLOCK_SIZE, profile=None, quiet=False):
+    self.block_size = block_size
+    # an optional ParserProfile, filled in by run_block when it is set
+    self.profile = profile
+    # parse errors are only returned, not printed, for probes that expect
+    # to fail on some input
+    self.quiet = quiet
 
   def set_pdf(self, pdf):
     self.pdf = pdf
@@ -883,86 +2918,788 @@ class ParserReader:
 
   def read_string(self, parser, input_string):
     result = False
-    with io.BytesIO(bytearray(input_string.encode())) as reader:
+    with io.BytesIO(input_string.encode()) as reader:
       result = self.parse(parser, reader)
     return result
 
 
-  def read_file(self, parser, filename):
-    result = False
-    with open(filename, 'rb') as f:
-      result = self.parse(parser, f)
-    return result
+  def read_bytes(self, parser, data):
+    # bytes, bytearray or memoryview, parsed in place as a single block;
+    # streams in it come back as views of data
+    view = memoryview(data)
+    if view.format != 'B' or view.ndim != 1:
+      view = view.cast('B')
+    return self.parse_buffer(parser, view)
 
-  def parse(self, parser, reader):
-    stack = []
-    stack.append(parser)
-    brk = False
 
-    next_byte_index = 0
-    bytes = []
-    bytes_read = 0
-    next_parser = stack.pop()
+  def read_chunks(self, parser, chunks):
+    return self.parse(parser, PDFChunkReader(chunks))
 
-    b = reader.read(1)
 
-    if b != b"":
-      bytes.append(b[0])
+  def read_file(self, parser, filename, use_mmap=False):
+    result = False
+    with open(filename, 'rb') as f:
+      if use_mmap and os.fstat(f.fileno()).st_size > 0:
+        # ACCESS_COPY: stream slices handed out stay writable and pages are
+        # only copied when a caller actually mutates them
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        result = self.parse_buffer(parser, data)
+      else:
+        result = self.parse(parser, f)
+    return result
 
-    while bytes_read < len(bytes):
-      if next_parser is None:
+  def parse_buffer(self, parser, data, offset=0):
+    return self.run(parser, data, None, offset)
+
+  def parse(self, parser, reader, offset=0):
+    return self.run(parser, reader.read(self.block_size), reader, offset)
+
+  def run(self, parser, data, reader, offset):
+    state = ParserReaderState(parser, offset)
+    while True:
+      if not self.run_block(state, data):
+        return False
+      if state.next_parser is None or reader is None:
+        return True
+      data = reader.read(self.block_size)
+      if len(data) == 0:
+        return True
+
+  def run_block(self, state, data):
+    # runs the parsers in state over data and saves where they stopped, so
+    # the next block, read or pushed, continues the same parse
+    profile = self.profile
+    if profile is not None:
+      started = time.perf_counter()
+      profile.bytes += len(data)
+      profile.add_core('generator' if state.rule is not None else 'state')
+    if state.rule is not None:
+      result = self.run_grammar(state, data)
+      if profile is not None:
+        profile.add_state(state.rule[0], time.perf_counter() - started)
+        profile.seconds += time.perf_counter() - started
+      return result
+    timer = time.perf_counter
+    stack = state.stack
+    stack_append = stack.append
+    stack_pop = stack.pop
+    # (data, pos, base) of the block to resume once pushed back bytes that
+    # could not be rewound in place have been replayed
+    resume = state.resume
+
+    end = len(data)
+    pos = 0
+    base = state.offset
+    next_parser = state.next_parser
+    state.offset += end
+
+    while next_parser is not None:
+      if pos >= end:
+        if len(resume) > 0:
+          data, pos, base = resume.pop()
+          end = len(data)
+          continue
         break
- 
-      next_byte = bytes[bytes_read]
-      
-      if brk is True:
-        print("brk: {0} {1} {2}".format(bytes_read, chr(next_byte), bytes))
 
-      bytes_read += 1
+      next_byte = data[pos]
+      next_byte_index = base + pos
+      pos += 1
 
       peer_parser = next_parser
-     
+
       while peer_parser is not None:
         #print("byte: {0} byte_index: {1} f: {2}".format(chr(next_byte), next_byte_index, peer_parser.__qualname__))
-        result = peer_parser(next_byte, next_byte_index)
+        if profile is not None:
+          call_started = timer()
+        if type(peer_parser) is PDFBlockParseFunc:
+          result = peer_parser(next_byte, next_byte_index, data, pos)
+          pos += result.skip_bytes
+        else:
+          result = peer_parser(next_byte, next_byte_index)
+        if profile is not None:
+          profile.add_state(peer_parser, timer() - call_started)
 
         if result.error_msg is not None:
-          print("{0}: byte: {1} byte_index: {2} message: {3}".format(peer_parser.__qualname__, next_byte, next_byte_index, result.error_msg))
+          if not self.quiet:
+            print("{0}: byte: {1} byte_index: {2} message: {3}".format(peer_parser.__qualname__, next_byte, next_byte_index, result.error_msg))
+          state.next_parser = None
+          if profile is not None:
+            profile.seconds += timer() - started
           return False
 
         if result.next_parse_func is not None:
-          stack.append(result.next_parse_func)
-        
+          stack_append(result.next_parse_func)
+          if profile is not None:
+            profile.set_stack_depth(len(stack))
+
         peer_parser = result.peer_parse_func
-    
-      if result.stream_bytes is not None:
-        stream = []
-        stream.extend(result.stream_bytes)
-        stream.extend(bytes[bytes_read:])
-        bytes = stream
-        bytes_read = 0
-      elif bytes_read == len(bytes):
-        bytes = []
-        bytes_read = 0
-        b = reader.read(1)
-        if b != b"":
-          bytes.append(b[0])
-          next_byte_index += 1
-  
-      next_parser = None
 
-      if len(stack) > 0:
-        next_parser = stack.pop()
+      if result.stream_bytes is not None:
+        stream_bytes = result.stream_bytes
+        count = len(stream_bytes)
+        if count == 1 and pos > 0 and data[pos - 1] == stream_bytes[0]:
+          pos -= 1
+          replayed = False
+        elif count <= pos and data[pos - count:pos] == bytes(stream_bytes):
+          pos -= count
+          replayed = False
+        else:
+          resume.append((data, pos, base))
+          base = base + pos - count
+          data = bytes(stream_bytes)
+          end = count
+          pos = 0
+          replayed = True
+        if profile is not None:
+          profile.add_pushback(count, replayed)
+
+      next_parser = stack_pop() if stack else None
+
+    state.next_parser = next_parser
+    if profile is not None:
+      profile.seconds += timer() - started
+    return True
 
+  def run_grammar(self, state, data):
+    if state.next_parser is None:
+      return True
+    rule, parser = state.rule
+    if state.generator is None:
+      state.lexer = PDFGrammarLexer(data, state.offset)
+      state.generator = rule(state.lexer, parser)
+    else:
+      state.lexer.feed(data)
+    state.offset += len(data)
+    try:
+      state.generator.send(None)
+    except StopIteration:
+      state.next_parser = None
+    except PDFGrammarError as e:
+      if not self.quiet:
+        print("{0}: byte_index: {1} message: {2}".format(rule.__qualname__, state.lexer.tell(), e))
+      state.next_parser = None
+      return False
     return True
 
 
+######################
+# IncrementalPDFParser
+######################
+# Push counterpart of ParserReader.read_file for a PDF that is still being
+# written, e.g. by a renderer on the other end of a pipe. Chunks are parsed
+# as they are fed and objects handed to set_object as they complete.
+class IncrementalPDFParser:
+  def __init__(self, set_value, set_object=None, profile=None):
+    self.parser = PDFParser(set_value, set_object)
+    self.reader = ParserReader(profile=profile)
+    self.state = ParserReaderState(self.parser.begin)
+    self.failed = False
+    self.closed = False
+
+  def feed(self, chunk):
+    if self.closed:
+      raise ValueError("Cannot feed a closed parser")
+    if self.failed or len(chunk) == 0:
+      return not self.failed
+    if type(chunk) is not bytes:
+      # stream payloads would otherwise keep views of a buffer the caller
+      # is free to reuse
+      chunk = bytes(chunk)
+    if not self.reader.run_block(self.state, chunk):
+      self.failed = True
+    return not self.failed
+
+  def feed_file(self, f, block_size=ParserReader.DEFAULT_BLOCK_SIZE):
+    # whatever f has to give until EOF, read1 returns what a pipe holds
+    # instead of waiting for a full block
+    read = getattr(f, 'read1', f.read)
+    while not self.failed:
+      chunk = read(block_size)
+      if len(chunk) == 0:
+        break
+      self.feed(chunk)
+    return not self.failed
+
+  def close(self):
+    # True once the document was parsed up to its startxref
+    self.closed = True
+    return not self.failed and self.parser.completed
+
+#################
+# PDFGrammarError
+#################
+class PDFGrammarError(Exception):
+  pass
+
+#################
+# PDFGrammarLexer
+#################
+# Input of the generator core: the unconsumed rest of the current block, read
+# a whole token at a time. Reads return None while a token may still go on in
+# the next block; the rule yields and retries once that block was fed.
+class PDFGrammarLexer:
+  WHITESPACE_RE = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]*')
+  HEX_PREFIX_RE = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]*[^\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0()<>\[\]{}/%#]*')
+  COMMENT_RE = re.compile(rb'[ \t]*%([^\n]*)\n')
+  COMMENT_START_RE = re.compile(rb'[ \t]*')
+  XREF_ENTRY_RE = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]*(\d+)[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]+(\d+)[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]+([fn])(?=[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0])')
+
+  def __init__(self, data, offset=0):
+    self.data = data
+    self.pos = 0
+    # input offset of data[0]
+    self.base = offset
+
+  def feed(self, data):
+    if self.pos >= len(self.data):
+      self.base += len(self.data)
+      self.data = data
+    else:
+      self.base += self.pos
+      self.data = bytes(self.data[self.pos:]) + bytes(data)
+    self.pos = 0
+
+  def unread(self, data):
+    count = len(data)
+    if count <= self.pos and self.data[self.pos - count:self.pos] == bytes(data):
+      self.pos -= count
+    else:
+      self.base += self.pos - count
+      self.data = bytes(data) + bytes(self.data[self.pos:])
+      self.pos = 0
+
+  def tell(self):
+    return self.base + self.pos
+
+  def wait(self, read):
+    # yields until read returns a value once a new block came in
+    while True:
+      yield
+      value = read()
+      if value is not None:
+        return value
+
+  def peek(self):
+    if self.pos >= len(self.data):
+      return None
+    return self.data[self.pos]
+
+  def skip_whitespace(self):
+    # the byte after the whitespace, if the block holds one
+    self.pos = PDFGrammarLexer.WHITESPACE_RE.match(self.data, self.pos).end()
+    return self.peek()
+
+  def read_raw(self):
+    # the text of a token as PDFTokenParser reads it
+    m = PDFLexer.TOKEN_RE.match(self.data, self.pos)
+    if m is None or (m.end() >= len(self.data) and not PDFGrammarLexer.is_closed(m)):
+      return None
+    self.pos = m.end()
+    return str(m.group(m.lastindex), 'latin-1')
+
+  def is_closed(m):
+    # a delimiter other than '<' and '>' ends where it matched
+    delimiter = m.group(2)
+    return delimiter is not None and delimiter != b'<' and delimiter != b'>'
+
+  def read_comment(self):
+    # the bytes between '%' and the end of line
+    data = self.data
+    m = PDFGrammarLexer.COMMENT_RE.match(data, self.pos)
+    if m is None:
+      end = PDFGrammarLexer.COMMENT_START_RE.match(data, self.pos).end()
+      if end < len(data) and data[end] != ord('%'):
+        raise PDFGrammarError("Expected char code {0}, received char code {1}".format(ord('%'), data[end]))
+      return None
+    self.pos = m.end()
+    return list(m.group(1))
+
+  def read_xref_entry(self):
+    m = PDFGrammarLexer.XREF_ENTRY_RE.match(self.data, self.pos)
+    if m is None:
+      return None
+    self.pos = m.end()
+    return PDFXrefEntry(int(m.group(1)), int(m.group(2)), m.group(3).decode())
+
+  def read_value(self):
+    # a scalar value or the opening token of an array or dictionary
+    data = self.data
+    m = PDFLexer.TOKEN_RE.match(data, self.pos)
+    if m is None:
+      return None
+    end = m.end()
+    if end >= len(data) and not PDFGrammarLexer.is_closed(m):
+      return None
+    regular = m.group(1)
+    if regular is not None:
+      value = PDFLexer.create_value(str(regular, 'latin-1'))
+      if value.type == PDFValue.INT and data[end] in PDFLexer.WHITESPACE:
+        item = PDFLexer.read_reference(data, value, end)
+        if item is None:
+          return None
+        value, end = item
+      self.pos = end
+      return value
+
+    delimiter = m.group(2)
+    if delimiter == b'(':
+      item = PDFLexer.read_string(data, end)
+      if item is None:
+        return None
+      self.pos = item[1]
+      return item[0]
+    if delimiter == b'/':
+      m = PDFLexer.TOKEN_RE.match(data, end)
+      if m is None or m.end() >= len(data):
+        return None
+      self.pos = m.end()
+      return PDFValueCache.get_name(str(m.group(m.lastindex), 'latin-1'))
+    if delimiter == b'<':
+      m = PDFLexer.HEX_STRING_RE.match(data, end)
+      if m is None:
+        if PDFGrammarLexer.HEX_PREFIX_RE.match(data, end).end() >= len(data):
+          return None
+        raise PDFGrammarError("Expected '>' to close hex string")
+      hex_string = m.group(1)
+      if m.end() >= len(data):
+        if len(hex_string) == 0:
+          return None
+      elif len(hex_string) == 0 and data[m.end()] == ord('>'):
+        raise PDFGrammarError("Expected '>' to close hex string, received '>>'")
+      self.pos = m.end()
+      return PDFValue(PDFValue.HEXSTRING, str(hex_string, 'latin-1'))
+    self.pos = end
+    return PDFValue(PDFValue.TOKEN, str(delimiter, 'latin-1'))
+
+############
+# PDFGrammar
+############
+# The generator core. Every rule is a generator over a shared PDFGrammarLexer
+# that yields whenever it needs the next block and returns what it parsed;
+# nested values are parsed with yield from. The rules fill in the same parser
+# instances the state machine uses, so both cores build identical objects.
+# Stream payloads go through the block functions of PDFStreamParser, which
+# already work a block at a time.
+class PDFGrammar:
+  def value(lex):
+    value = lex.read_value()
+    if value is None:
+      value = yield from lex.wait(lex.read_value)
+    if value.type == PDFValue.TOKEN:
+      if value.value == '[':
+        return (yield from PDFGrammar.array(lex))
+      if value.value == '<<':
+        return (yield from PDFGrammar.dictionary(lex))
+    return value
+
+  def array(lex):
+    array = []
+    read_value = lex.read_value
+    while True:
+      value = read_value()
+      if value is None:
+        value = yield from lex.wait(read_value)
+      if value.type == PDFValue.TOKEN:
+        if value.value == ']':
+          return PDFValue(PDFValue.ARRAY, PDFValueList(array))
+        if value.value == '[':
+          value = yield from PDFGrammar.array(lex)
+        elif value.value == '<<':
+          value = yield from PDFGrammar.dictionary(lex)
+      array.append(value)
+
+  def dictionary(lex):
+    dictionary = {}
+    read_value = lex.read_value
+    while True:
+      name = read_value()
+      if name is None:
+        name = yield from lex.wait(read_value)
+      if name.type != PDFValue.NAME:
+        if name.type == PDFValue.TOKEN and name.value == '>>':
+          return PDFValue(PDFValue.DICTIONARY, PDFNamedValues(dictionary))
+        raise PDFGrammarError("Dictionary missing name entry (expected name, found '{0}' instead).".format(name))
+      value = read_value()
+      if value is None:
+        value = yield from lex.wait(read_value)
+      if value.type == PDFValue.TOKEN:
+        if value.value == '[':
+          value = yield from PDFGrammar.array(lex)
+        elif value.value == '<<':
+          value = yield from PDFGrammar.dictionary(lex)
+      dictionary[name.value] = value
+
+  def token(lex):
+    token = lex.read_raw()
+    if token is None:
+      token = yield from lex.wait(lex.read_raw)
+    return token
+
+  def keyword(lex, expected):
+    token = yield from PDFGrammar.token(lex)
+    if token.lower() != expected:
+      raise PDFGrammarError("Expected token '{0}' but received '{1}'".format(expected, token))
+
+  def comment(lex):
+    line = lex.read_comment()
+    if line is None:
+      line = yield from lex.wait(lex.read_comment)
+    return line
+
+  def next_byte(lex, skip_whitespace=False):
+    read = lex.skip_whitespace if skip_whitespace else lex.peek
+    b = read()
+    if b is None:
+      b = yield from lex.wait(read)
+    return b
+
+  def stream(lex, parser):
+    # feeds PDFStreamParser one block at a time, from the byte after the
+    # stream keyword up to and including endstream
+    values = []
+    parser.set_value = values.append
+    func = parser.begin
+    while True:
+      if lex.pos >= len(lex.data):
+        yield
+        continue
+      data = lex.data
+      b = data[lex.pos]
+      lex.pos += 1
+      result = func(b, lex.base + lex.pos - 1, data, lex.pos)
+      lex.pos += result.skip_bytes
+      if result.stream_bytes is not None:
+        lex.unread(result.stream_bytes)
+      if result.next_parse_func is None:
+        return values[0]
+      func = result.next_parse_func
+
+  def object(lex, parser):
+    while True:
+      b = yield from PDFGrammar.next_byte(lex, True)
+      if b != ord('%'):
+        break
+      line = yield from PDFGrammar.comment(lex)
+      parser.obj.add_comment(str(bytes(line), 'latin-1'))
+    start = lex.tell()
+    name = yield from PDFGrammar.value(lex)
+    if name.type != PDFValue.INT:
+      raise PDFGrammarError("Expected int name, but received '{0}'".format(name.value))
+    version = yield from PDFGrammar.value(lex)
+    if version.type != PDFValue.INT:
+      raise PDFGrammarError("Expected int version, but received '{0}'".format(version))
+    obj_tag = yield from PDFGrammar.value(lex)
+    if obj_tag.type != PDFValue.TOKEN:
+      raise PDFGrammarError("Expected 'obj' tag, but received '{0}'".format(obj_tag))
+    parser.obj.name = name.value
+    parser.obj.version = version.value
+    # like PDFObjectParser, the keywords are only looked for from the
+    # second value on
+    parser.append_value((yield from PDFGrammar.value(lex)))
+    while True:
+      parser.append_value((yield from PDFGrammar.value(lex)))
+      last_token = parser.last_token.lower()
+      if last_token == 'stream':
+        stream_parser = PDFStreamParser(None, parser.get_stream_length())
+        parser.set_stream_data((yield from PDFGrammar.stream(lex, stream_parser)))
+      elif last_token == 'endobj':
+        yield from PDFGrammar.next_byte(lex)
+        parser.obj.source_span = (start, lex.tell())
+        parser.obj.set_dirty(False)
+        return parser.obj
+
+  def xref(lex, parser):
+    # the keyword is not checked, as in PDFXrefParser
+    yield from PDFGrammar.token(lex)
+    while True:
+      section = parser.section
+      section.initial_object_id = (yield from PDFGrammar.value(lex)).value
+      section.object_count = (yield from PDFGrammar.value(lex)).value
+      while len(section.entries) != section.object_count:
+        entry = lex.read_xref_entry()
+        if entry is None:
+          entry = yield from PDFGrammar.xref_entry(lex)
+        section.entries.append(entry)
+      if section is parser.xref:
+        parser.set_value(parser.xref)
+      b = yield from PDFGrammar.next_byte(lex, True)
+      if not chr(b).isdigit():
+        return parser.xref
+      parser.section = PDFXref()
+      parser.xref.subsections.append(parser.section)
+
+  def xref_entry(lex):
+    offset = yield from PDFGrammar.value(lex)
+    generation = yield from PDFGrammar.value(lex)
+    flag = yield from PDFGrammar.value(lex)
+    return PDFXrefEntry(offset.value, generation.value, flag.value)
+
+  def trailer(lex):
+    yield from PDFGrammar.keyword(lex, 'trailer')
+    return (yield from PDFGrammar.value(lex)).value
+
+  def start_xref(lex):
+    yield from PDFGrammar.keyword(lex, 'startxref')
+    index = yield from PDFGrammar.value(lex)
+    if index.type != PDFValue.INT:
+      raise PDFGrammarError("Expected integer index, received token of type '{0}'".format(index.type))
+    yield from PDFGrammar.next_byte(lex)
+    return index.value
+
+  def header(lex):
+    line_1 = yield from PDFGrammar.comment(lex)
+    line_2 = []
+    if (yield from PDFGrammar.next_byte(lex)) == ord('%'):
+      line_2 = yield from PDFGrammar.comment(lex)
+    return (line_1, line_2)
+
+  def document(lex, parser):
+    line_1, line_2 = yield from PDFGrammar.header(lex)
+    parser.set_header_line_1(line_1)
+    if len(line_2) > 0:
+      parser.set_header_line_2(line_2)
+    while True:
+      b = yield from PDFGrammar.next_byte(lex, True)
+      if b == ord('x'):
+        xref_parser = PDFXrefParser(parser.set_xref)
+        yield from PDFGrammar.xref(lex, xref_parser)
+      elif b == ord('s'):
+        parser.set_start_xref((yield from PDFGrammar.start_xref(lex)))
+        if not parser.completed:
+          parser.completed = True
+          parser.set_value(parser.pdf)
+        # incremental updates append objects, an xref and a trailer
+        while True:
+          b = yield from PDFGrammar.next_byte(lex, True)
+          if b != ord('%'):
+            break
+          yield from PDFGrammar.comment(lex)
+        if not chr(b).isdigit() and chr(b) not in 'xst':
+          return parser.pdf
+      elif b == ord('t'):
+        parser.set_trailer((yield from PDFGrammar.trailer(lex)))
+      else:
+        object_parser = PDFObjectParser(None)
+        parser.append_object((yield from PDFGrammar.object(lex, object_parser)))
+
+  # rules standing in for the begin function of each parser, as
+  # rule(lexer, parser) setting the parser's value
+
+  def parse_comment(lex, parser):
+    parser.set_value((yield from PDFGrammar.comment(lex)))
+
+  def parse_token(lex, parser):
+    parser.set_value((yield from PDFGrammar.token(lex)))
+
+  def parse_array(lex, parser):
+    if (yield from PDFGrammar.next_byte(lex, True)) != ord('['):
+      raise PDFGrammarError("Array parsing expected '[' as first char but received '{0}'.".format(chr(lex.peek())))
+    lex.pos += 1
+    parser.set_value((yield from PDFGrammar.array(lex)))
+
+  def parse_string(lex, parser):
+    if (yield from PDFGrammar.next_byte(lex, True)) != ord('('):
+      raise PDFGrammarError("Expected '(', received '{0}'".format(chr(lex.peek())))
+    value = yield from PDFGrammar.value(lex)
+    parser.set_value(value)
+
+  def parse_value(lex, parser):
+    parser.set_value((yield from PDFGrammar.value(lex)))
+
+  def parse_dictionary(lex, parser):
+    yield from PDFGrammar.keyword(lex, '<<')
+    parser.set_value((yield from PDFGrammar.dictionary(lex)))
+
+  def parse_stream(lex, parser):
+    set_value = parser.set_value
+    set_value((yield from PDFGrammar.stream(lex, parser)))
+
+  def parse_object(lex, parser):
+    parser.set_value((yield from PDFGrammar.object(lex, parser)))
+
+  def parse_trailer(lex, parser):
+    parser.set_value((yield from PDFGrammar.trailer(lex)))
+
+  def parse_xref_entry(lex, parser):
+    entry = lex.read_xref_entry()
+    if entry is None:
+      entry = yield from PDFGrammar.xref_entry(lex)
+    parser.set_value(entry)
+
+  def parse_xref(lex, parser):
+    yield from PDFGrammar.xref(lex, parser)
+
+  def parse_start_xref(lex, parser):
+    parser.set_value((yield from PDFGrammar.start_xref(lex)))
+
+  def parse_header(lex, parser):
+    parser.set_value((yield from PDFGrammar.header(lex)))
+
+  def parse_xref_section(lex, parser):
+    yield from PDFGrammar.next_byte(lex, True)
+    xref = yield from PDFGrammar.xref(lex, PDFXrefParser(PDFUtils.noop))
+    trailer = yield from PDFGrammar.trailer(lex)
+    yield from PDFGrammar.next_byte(lex)
+    parser.set_value((xref, trailer))
+
+  def parse_document(lex, parser):
+    yield from PDFGrammar.document(lex, parser)
+
+  def parse_content_stream(lex, parser):
+    while True:
+      parser.append_value((yield from PDFGrammar.value(lex)))
+
+  RULES = {
+    PDFCommentParser: parse_comment,
+    PDFTokenParser: parse_token,
+    PDFArrayParser: parse_array,
+    PDFStringParser: parse_string,
+    PDFValueParser: parse_value,
+    PDFDictionaryParser: parse_dictionary,
+    PDFStreamParser: parse_stream,
+    PDFObjectParser: parse_object,
+    PDFTrailerParser: parse_trailer,
+    PDFXrefEntryParser: parse_xref_entry,
+    PDFXrefParser: parse_xref,
+    PDFStartXrefParser: parse_start_xref,
+    PDFHeaderParser: parse_header,
+    PDFXrefSectionParser: parse_xref_section,
+    PDFParser: parse_document,
+    PDFContentStreamParser: parse_content_stream,
+  }
+
+  def get_rule(parser):
+    # (rule, parser instance) for the begin function of a parser the
+    # grammar covers, None for any other parse function
+    if type(parser) is PDFBlockParseFunc:
+      owner, name = parser.obj, parser.func.__name__
+    else:
+      owner, name = getattr(parser, '__self__', None), getattr(parser, '__name__', None)
+    if name != 'begin' or type(owner) not in PDFGrammar.RULES:
+      return None
+    return (PDFGrammar.RULES[type(owner)], owner)
+
+###############
+# PDFSerializer
+###############
+class PDFSerializer:
+  # payloads at least this large are kept as their own chunk instead of
+  # being copied into the buffer
+  CHUNK_THRESHOLD = 1 << 12
+
+  def __init__(self, position=0):
+    self.chunks = []
+    self.buffer = bytearray()
+    # output position of the first byte in buffer
+    self.base = position
+
+  def tell(self):
+    return self.base + len(self.buffer)
+
+  def append_chunk(self, chunk, size):
+    if len(self.buffer) > 0:
+      self.chunks.append(self.buffer)
+      self.base += len(self.buffer)
+      self.buffer = bytearray()
+    self.chunks.append(chunk)
+    self.base += size
+
+  def write(self, data):
+    if len(data) >= PDFSerializer.CHUNK_THRESHOLD:
+      self.append_chunk(data, len(data))
+    else:
+      self.buffer += data
+
+  def write_value(self, v):
+    buffer = self.buffer
+    t = v.type
+    if t == PDFValue.DICTIONARY:
+      buffer += b'<<'
+      first = True
+      for k, item in v.value.items():
+        if first:
+          first = False
+        else:
+          buffer += b' '
+        buffer += b'/'
+        buffer += k.encode()
+        buffer += b' '
+        self.write_value(item)
+      buffer += b'>>'
+    elif t == PDFValue.ARRAY:
+      buffer += b'['
+      first = True
+      for item in v.value:
+        if first:
+          first = False
+        else:
+          buffer += b' '
+        self.write_value(item)
+      buffer += b']'
+    elif t == PDFValue.INT:
+      buffer += str(v.value).encode()
+    elif t == PDFValue.NAME:
+      buffer += b'/'
+      buffer += v.value.encode()
+    elif t == PDFValue.REFERENCE:
+      buffer += b'%d %d R' % (v.value.name, v.value.version)
+    else:
+      buffer += v.default_value_str().encode()
+
+  def write_object(self, obj):
+    self.buffer += b'%d %d obj\n' % (obj.name, obj.version)
+    if len(obj.named_values) > 0:
+      self.write_value(PDFValue(PDFValue.DICTIONARY, obj.named_values))
+      self.buffer += b'\n'
+    if len(obj.values) > 0:
+      first = True
+      for value in obj.values:
+        if first:
+          first = False
+        else:
+          self.buffer += b' '
+        self.write_value(value)
+      self.buffer += b'\n'
+
+    stream_data = obj.stream_data
+    if len(stream_data) > 0:
+      self.buffer += b'stream\n'
+      if isinstance(stream_data, PDFStreamSpool):
+        # spooled payloads are only read back when the output is written
+        self.append_chunk(stream_data, len(stream_data))
+      elif isinstance(stream_data, (bytes, bytearray, memoryview)):
+        self.write(stream_data)
+      else:
+        self.write(bytes(stream_data))
+      self.buffer += b'\nendstream\n'
+    self.buffer += b'endobj\n'
+
+  def get_chunks(self):
+    for chunk in self.chunks:
+      if isinstance(chunk, PDFStreamSpool):
+        yield from chunk.read_chunks(PDFStreamPipeline.CHUNK_SIZE)
+      else:
+        yield chunk
+    yield self.buffer
+
+  def getvalue(self):
+    return b''.join(self.get_chunks())
+
+  def write_to(self, output_file):
+    output_file.writelines(self.get_chunks())
+
 ################
 # PDFWriterUtils
 ################
 class PDFWriterUtils:
-  def write_header(pdf, output_file):
+  OBJECT_BODY_RE = re.compile(rb'\s*\d+\s+\d+\s+obj\s*(.*?)\s*endobj\s*', re.DOTALL)
+  HEADER_VERSION_RE = re.compile(r'PDF-(\d+)\.(\d+)')
+
+  def write_header(pdf, output_file, min_version=None):
     line_1 = ''.join([chr(b) for b in pdf.header_line_1])
+    m = PDFWriterUtils.HEADER_VERSION_RE.match(line_1)
+    if min_version is not None and m is not None and (int(m.group(1)), int(m.group(2))) < min_version:
+      line_1 = "PDF-{0}.{1}{2}".format(min_version[0], min_version[1], line_1[m.end():])
     line_1 = "%{0}\n".format(line_1)
     output_file.write(line_1.encode())
     if len(pdf.header_line_2) > 0:
@@ -971,13 +3708,42 @@ class PDFWriterUtils:
       output_file.write("\n".encode())
 
   def write_value(v, f):  
+    if type(f) is PDFSerializer:
+      f.write_value(v)
+      return
     s = v.default_value_str()    
     f.write(s.encode())
 
-  def write_object(obj, output_file):
-    begin_obj = "{0} {1} obj\n".format(obj.name, obj.version).encode()
-    output_file.write(begin_obj)
+  def read_source(pdf):
+    if pdf.source is not None:
+      return pdf.source
+    if pdf.source_path is None or not os.path.exists(pdf.source_path):
+      return None
+    with open(pdf.source_path, 'rb') as f:
+      if os.fstat(f.fileno()).st_size == 0:
+        return None
+      return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def is_source(pdf, filename):
+    if pdf.source_path is None or not os.path.exists(pdf.source_path) or not os.path.exists(filename):
+      return False
+    return os.path.samefile(pdf.source_path, filename)
+
+  def get_raw_object(obj, source):
+    if source is None or obj.source_span is None or obj.is_dirty():
+      return None
+    start, end = obj.source_span
+    return source[start:end]
+
+  def write_raw_object(obj, source, output_file):
+    raw = PDFWriterUtils.get_raw_object(obj, source)
+    if raw is None:
+      return False
+    output_file.write(raw)
+    output_file.write("\n".encode())
+    return True
 
+  def write_object_values(obj, output_file):
     if len(obj.named_values) > 0:
       named_values = PDFValue(PDFValue.DICTIONARY, obj.named_values)
       PDFWriterUtils.write_value(named_values, output_file)
@@ -993,42 +3759,260 @@ class PDFWriterUtils:
         PDFWriterUtils.write_value(value, output_file)
       output_file.write("\n".encode())  
 
+  def write_object(obj, output_file):
+    if type(output_file) is PDFSerializer:
+      output_file.write_object(obj)
+      return
+    begin_obj = "{0} {1} obj\n".format(obj.name, obj.version).encode()
+    output_file.write(begin_obj)
+    PDFWriterUtils.write_object_values(obj, output_file)
+
     if len(obj.stream_data) > 0:
       output_file.write("stream\n".encode())
-      output_file.write(bytes(obj.stream_data))
+      if isinstance(obj.stream_data, (bytes, bytearray, memoryview)):
+        output_file.write(obj.stream_data)
+      elif isinstance(obj.stream_data, PDFStreamSpool):
+        for chunk in obj.stream_data.read_chunks(PDFStreamPipeline.CHUNK_SIZE):
+          output_file.write(chunk)
+      else:
+        output_file.write(bytes(obj.stream_data))
       output_file.write("\nendstream\n".encode())
     output_file.write("endobj\n".encode())
 
-  def write_xref(pdf, xref_indexes, output_file):
+  def get_object_body(obj, source):
+    raw = PDFWriterUtils.get_raw_object(obj, source)
+    if raw is not None:
+      m = PDFWriterUtils.OBJECT_BODY_RE.fullmatch(raw)
+      if m is not None:
+        return m.group(1)
+    body = PDFSerializer()
+    PDFWriterUtils.write_object_values(obj, body)
+    return body.getvalue().strip()
+
+  def get_current_objects(objects):
+    # only the newest generation of an object number can be referenced
+    current = {}
+    for obj in objects:
+      if obj.name not in current or current[obj.name].version < obj.version:
+        current[obj.name] = obj
+    return current
+
+  def get_trailer(pdf, size):
+    trailer = dict(pdf.trailer)
+    trailer.pop('Prev', None)
+    trailer.pop('XRefStm', None)
+    trailer['Size'] = PDFValue(PDFValue.INT, size)
+    return trailer
+
+  def write_xref_entry(offset, generation, flag, output_file):
+    # entries are exactly 20 bytes, including the two byte end of line
+    output_file.write("{0:0>10d} {1:0>5d} {2} \n".format(offset, generation, flag).encode())
+
+  def get_subsections(entries):
+    subsections = []
+    i = 0
+    while i < len(entries):
+      j = i + 1
+      while j < len(entries) and entries[j][0] == entries[j - 1][0] + 1:
+        j += 1
+      subsections.append(entries[i:j])
+      i = j
+    return subsections
+
+  def write_xref_sections(entries, output_file):
     output_file.write("xref\n".encode())
-    output_file.write("{0} {1}\n".format(0, pdf.get_obj_count()+1).encode())
-    output_file.write("0000000000 65535 f\n".encode())
+    for subsection in PDFWriterUtils.get_subsections(entries):
+      output_file.write("{0} {1}\n".format(subsection[0][0], len(subsection)).encode())
+      for obj_id, offset, generation, flag in subsection:
+        PDFWriterUtils.write_xref_entry(offset, generation, flag, output_file)
 
-    keys = [k for k in xref_indexes.keys()]
-    keys.sort()
+  def write_trailer(trailer, start_xref, output_file):
+    output_file.write("trailer\n".encode())
+    PDFWriterUtils.write_value(PDFValue(PDFValue.DICTIONARY, trailer), output_file)
+    PDFWriterUtils.write_start_xref(start_xref, output_file)
 
-    for key in keys:
-      output_file.write("{:0>10d} {:0>5d} n\n".format(xref_indexes[key], 0).encode())
+  def write_start_xref(start_xref, output_file):
+    output_file.write("\nstartxref\n".encode())
+    output_file.write("{0}\n".format(start_xref).encode())
+    output_file.write("%%EOF".encode())
 
-  def write_footer(pdf, xref_indexes, output_file):
+  def link_free_entries(entries):
+    # chains the free entries of sorted entries through their offsets,
+    # object 0 heads the list and the last entry points back to it
+    free_ids = [entry[0] for entry in entries if entry[3] == 'f' and entry[0] != 0]
+    if len(free_ids) == 0:
+      return entries
+    next_ids = dict(zip([0] + free_ids, free_ids + [0]))
+    linked = [(obj_id, next_ids[obj_id] if flag == 'f' else offset, generation, flag) for obj_id, offset, generation, flag in entries if obj_id != 0]
+    return [(0, next_ids[0], 65535, 'f')] + linked
+
+  def write_footer(pdf, entries, output_file):
     start_xref = output_file.tell()
-    PDFWriterUtils.write_xref(pdf, xref_indexes, output_file)
-    output_file.write("trailer\n".encode())
-    PDFWriterUtils.write_value(PDFValue(PDFValue.DICTIONARY, pdf.trailer), output_file)
-    output_file.write("\nstartxref\n".encode())
+    size = max([entry[0] for entry in entries] + [0]) + 1
+    PDFWriterUtils.write_xref_sections([(0, 0, 65535, 'f')] + entries, output_file)
+    PDFWriterUtils.write_trailer(PDFWriterUtils.get_trailer(pdf, size), start_xref, output_file)
+
+  def get_int_width(value):
+    return max(1, (value.bit_length() + 7) // 8)
+
+  def write_xref_stream(entries, trailer, obj_id, output_file):
+    # entries are (object number, offset or object stream, generation or
+    # index, flag) like in the classic table
+    start_xref = output_file.tell()
+    entries = sorted(entries + [(obj_id, start_xref, 0, 'n')])
+    widths = [1, PDFWriterUtils.get_int_width(max([e[1] for e in entries])), PDFWriterUtils.get_int_width(max([e[2] for e in entries]))]
+    data = bytearray()
+    for entry in entries:
+      data += PDFXrefStream.FLAGS.index(entry[3]).to_bytes(widths[0], 'big')
+      data += entry[1].to_bytes(widths[1], 'big')
+      data += entry[2].to_bytes(widths[2], 'big')
+    index = []
+    for subsection in PDFWriterUtils.get_subsections(entries):
+      index.extend([subsection[0][0], len(subsection)])
+
+    xref_obj = PDFObject()
+    xref_obj.name = obj_id
+    xref_obj.named_values.update(trailer)
+    xref_obj.named_values['Type'] = PDFValue(PDFValue.NAME, 'XRef')
+    xref_obj.named_values['Size'] = PDFValue(PDFValue.INT, max(obj_id + 1, trailer['Size'].value if 'Size' in trailer else 0))
+    xref_obj.named_values['W'] = PDFValue(PDFValue.ARRAY, [PDFValue(PDFValue.INT, w) for w in widths])
+    xref_obj.named_values['Index'] = PDFValue(PDFValue.ARRAY, [PDFValue(PDFValue.INT, i) for i in index])
+    xref_obj.named_values['Filter'] = PDFValue(PDFValue.NAME, 'FlateDecode')
+    xref_obj.stream_data = zlib.compress(bytes(data))
+    xref_obj.named_values['Length'] = PDFValue(PDFValue.INT, len(xref_obj.stream_data))
+    PDFWriterUtils.write_object(xref_obj, output_file)
+    output_file.write("startxref\n".encode())
     output_file.write("{0}\n".format(start_xref).encode())
     output_file.write("%%EOF".encode())
 
+  def create_object_stream(obj_id, objects, source):
+    header = []
+    bodies = []
+    offset = 0
+    for obj in objects:
+      body = PDFWriterUtils.get_object_body(obj, source)
+      header.append("{0} {1}".format(obj.name, offset))
+      bodies.append(body)
+      offset += len(body) + 1
+    header = (' '.join(header) + "\n").encode()
+    stream_obj = PDFObject()
+    stream_obj.name = obj_id
+    stream_obj.named_values['Type'] = PDFValue(PDFValue.NAME, 'ObjStm')
+    stream_obj.named_values['N'] = PDFValue(PDFValue.INT, len(objects))
+    stream_obj.named_values['First'] = PDFValue(PDFValue.INT, len(header))
+    stream_obj.named_values['Filter'] = PDFValue(PDFValue.NAME, 'FlateDecode')
+    stream_obj.stream_data = zlib.compress(header + "\n".encode().join(bodies) + "\n".encode())
+    stream_obj.named_values['Length'] = PDFValue(PDFValue.INT, len(stream_obj.stream_data))
+    return stream_obj
+
 ###########
 # PDFWriter
 ###########
 class PDFWriter:
-  def write_file(pdf, filename):
+  OBJECT_STREAM_SIZE = 100
+
+  def write_file(pdf, filename, object_streams=False, buffered=True):
+    if PDFWriterUtils.is_source(pdf, filename):
+      # write next to the source and swap it in, the source is still read
+      temp_filename = "{0}.tmp".format(filename)
+      PDFWriter.write_file(pdf, temp_filename, object_streams, buffered)
+      os.replace(temp_filename, filename)
+      if pdf.source is None:
+        # spans no longer match the file on disk
+        pdf.source_path = None
+      return
     with open(filename, "wb") as f:
-      xref_indexes = {}
-      PDFWriterUtils.write_header(pdf, f)
-      for key, obj in pdf.objects.items():
-        sort_key = (obj.name * 100000) + obj.version
-        xref_indexes[sort_key] = f.tell()
+      if not buffered:
+        PDFWriter.write(pdf, f, object_streams)
+        return
+      PDFWriter.serialize(pdf, object_streams).write_to(f)
+
+  def serialize(pdf, object_streams=False):
+    output = PDFSerializer()
+    PDFWriter.write(pdf, output, object_streams)
+    return output
+
+  def write(pdf, f, object_streams=False):
+    if object_streams:
+      PDFWriter.write_object_streams(pdf, f)
+      return
+    source = PDFWriterUtils.read_source(pdf)
+    offsets = {}
+    PDFWriterUtils.write_header(pdf, f)
+    for key, obj in pdf.objects.items():
+      offsets[key] = f.tell()
+      if not PDFWriterUtils.write_raw_object(obj, source, f):
         PDFWriterUtils.write_object(obj, f)
-      PDFWriterUtils.write_footer(pdf, xref_indexes, f)
\ No newline at end of file
+    current = PDFWriterUtils.get_current_objects(pdf.objects.values())
+    entries = [(obj_id, offsets[obj.get_key()], obj.version, 'n') for obj_id, obj in sorted(current.items())]
+    PDFWriterUtils.write_footer(pdf, entries, f)
+
+  def write_object_streams(pdf, f):
+    # objects without a stream and of generation 0 are packed into object
+    # streams, everything else stays a plain object
+    source = PDFWriterUtils.read_source(pdf)
+    current = PDFWriterUtils.get_current_objects(pdf.objects.values())
+    next_id = max(list(current.keys()) + [0]) + 1
+    entries = []
+    packed = []
+    PDFWriterUtils.write_header(pdf, f, (1, 5))
+    for obj_id, obj in sorted(current.items()):
+      if obj.version == 0 and len(obj.stream_data) == 0:
+        packed.append(obj)
+        continue
+      entries.append((obj_id, f.tell(), obj.version, 'n'))
+      if not PDFWriterUtils.write_raw_object(obj, source, f):
+        PDFWriterUtils.write_object(obj, f)
+
+    for i in range(0, len(packed), PDFWriter.OBJECT_STREAM_SIZE):
+      objects = packed[i:i + PDFWriter.OBJECT_STREAM_SIZE]
+      stream_obj = PDFWriterUtils.create_object_stream(next_id, objects, source)
+      entries.append((next_id, f.tell(), 0, 'n'))
+      PDFWriterUtils.write_object(stream_obj, f)
+      entries.extend([(obj.name, next_id, index, 'c') for index, obj in enumerate(objects)])
+      next_id += 1
+
+    entries.append((0, 0, 65535, 'f'))
+    PDFWriterUtils.write_xref_stream(entries, PDFWriterUtils.get_trailer(pdf, next_id + 1), next_id, f)
+
+  def write_incremental(pdf, original_path, out_path):
+    with open(original_path, 'rb') as original:
+      prev = PDFLazyLoader.find_start_xref(original)
+      if prev is None:
+        raise ValueError("No startxref found in '{0}'".format(original_path))
+      original.seek(-1, io.SEEK_END)
+      last_byte = original.read(1)
+      if os.path.exists(out_path) and os.path.samefile(original_path, out_path):
+        f = open(out_path, 'ab')
+      else:
+        f = open(out_path, 'wb')
+        original.seek(0)
+        shutil.copyfileobj(original, f)
+
+    with f:
+      objects = PDFWriterUtils.get_current_objects(pdf.get_modified_objects())
+      if len(objects) == 0 and len(pdf.deleted_ids) == 0:
+        return
+      output = PDFSerializer(f.tell())
+      if last_byte not in (b'\n', b'\r'):
+        output.write("\n".encode())
+      entries = []
+      for obj_id in sorted(objects.keys()):
+        entries.append((obj_id, output.tell(), objects[obj_id].version, 'n'))
+        PDFWriterUtils.write_object(objects[obj_id], output)
+      # deleted ids that were not handed out again
+      entries = sorted(entries + [(obj_id, 0, generation, 'f') for obj_id, generation in pdf.deleted_ids.items()])
+      entries = PDFWriterUtils.link_free_entries(entries)
+
+      size = max([obj_id + 1 for obj_id in objects.keys()] + [pdf.get_size()])
+      trailer = PDFWriterUtils.get_trailer(pdf, size)
+      trailer['Prev'] = PDFValue(PDFValue.INT, prev)
+      if pdf.xref_stream:
+        # a file indexed by xref streams is updated with one as well
+        trailer['Size'] = PDFValue(PDFValue.INT, size + 1)
+        PDFWriterUtils.write_xref_stream(entries, trailer, size, output)
+      else:
+        start_xref = output.tell()
+        PDFWriterUtils.write_xref_sections(entries, output)
+        PDFWriterUtils.write_trailer(trailer, start_xref, output)
+      output.write_to(f)
@@ -0,0 +1,126 @@
+import re
+import math
+
+##########
+# SVGSpace
+##########
+# Maps SVG user units of a page onto the PDF user space of its MediaBox. SVG y
+# grows down from the top of the page, PDF y grows up from the bottom.
+class SVGSpace:
+  # user units (px) per unit
+  UNITS = {'': 1.0, 'px': 1.0, 'pt': 96 / 72, 'pc': 16.0, 'mm': 96 / 25.4, 'cm': 96 / 2.54, 'in': 96.0}
+  LENGTH_RE = re.compile(r'\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*([a-z]*)\s*')
+
+  def __init__(self, media_box, size=None, origin=(0.0, 0.0)):
+    self.media_box = media_box
+    # user units at the top left corner of the page
+    self.origin = origin
+    self.scale_x = 1.0
+    self.scale_y = 1.0
+    if size is not None and size[0] > 0 and size[1] > 0:
+      self.scale_x = (media_box[2] - media_box[0]) / size[0]
+      self.scale_y = (media_box[3] - media_box[1]) / size[1]
+
+  def parse_length(value):
+    m = SVGSpace.LENGTH_RE.fullmatch(value)
+    if m is None or m.group(2) not in SVGSpace.UNITS:
+      return None
+    return float(m.group(1)) * SVGSpace.UNITS[m.group(2)]
+
+  def get_view_box(attrs):
+    # (min-x, min-y, width, height) of the viewBox, None without one
+    if 'viewBox' in attrs:
+      view_box = attrs['viewBox'].replace(',', ' ').split()
+      if len(view_box) == 4:
+        return tuple(float(v) for v in view_box)
+    return None
+
+  def get_size(attrs):
+    # page size in user units from the attributes of the outermost <svg>,
+    # None when it can not be told
+    view_box = SVGSpace.get_view_box(attrs)
+    if view_box is not None:
+      return view_box[2:]
+    if 'width' in attrs and 'height' in attrs:
+      width = SVGSpace.parse_length(attrs['width'])
+      height = SVGSpace.parse_length(attrs['height'])
+      if width is not None and height is not None:
+        return (width, height)
+    return None
+
+  def get_origin(attrs):
+    view_box = SVGSpace.get_view_box(attrs)
+    if view_box is not None:
+      return view_box[:2]
+    return (0.0, 0.0)
+
+  def get_box(self, x, y, width, height):
+    left = self.media_box[0] + (x - self.origin[0]) * self.scale_x
+    top = self.media_box[3] - (y - self.origin[1]) * self.scale_y
+    return RectMatcher.get_box(left, top, width * self.scale_x, -height * self.scale_y)
+
+##########
+# RectGrid
+##########
+# Buckets boxes by their lower left corner into square cells, every box with
+# a corner within cell_size of a point is in the 3x3 cells around it.
+class RectGrid:
+  def __init__(self, cell_size):
+    self.cell_size = cell_size
+    self.cells = {}
+
+  def get_cell(self, x, y):
+    return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+  def add(self, index, box):
+    self.cells.setdefault(self.get_cell(box[0], box[1]), []).append((index, box))
+
+  def find(self, box):
+    col, row = self.get_cell(box[0], box[1])
+    for c in range(col - 1, col + 2):
+      for r in range(row - 1, row + 2):
+        yield from self.cells.get((c, r), ())
+
+#############
+# RectMatcher
+#############
+class RectMatcher:
+  # PDF points every edge of a matched pair may be apart
+  DEFAULT_TOLERANCE = 1.0
+
+  def get_box(x, y, width, height):
+    # (left, bottom, right, top) of a rect with a corner at x, y, as
+    # operands of a PDF 're' for example, sizes may be negative
+    return (min(x, x + width), min(y, y + height), max(x, x + width), max(y, y + height))
+
+  def get_distance(a, b):
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]), abs(a[2] - b[2]), abs(a[3] - b[3]))
+
+  def match(boxes, targets, tolerance=DEFAULT_TOLERANCE):
+    # pairs every box with the nearest target within tolerance, the closest
+    # pairs first so each target is taken once. Returns the (box index,
+    # target index) pairs, then the indices of the boxes and the targets
+    # that were left over.
+    grid = RectGrid(max(tolerance, 1e-6))
+    for j, target in enumerate(targets):
+      grid.add(j, target)
+    candidates = []
+    for i, box in enumerate(boxes):
+      for j, target in grid.find(box):
+        distance = RectMatcher.get_distance(box, target)
+        if distance <= tolerance:
+          candidates.append((distance, i, j))
+    candidates.sort()
+
+    box_matched = [False] * len(boxes)
+    target_matched = [False] * len(targets)
+    pairs = []
+    for distance, i, j in candidates:
+      if box_matched[i] or target_matched[j]:
+        continue
+      box_matched[i] = target_matched[j] = True
+      pairs.append((i, j))
+    pairs.sort()
+    unmatched_boxes = [i for i, matched in enumerate(box_matched) if not matched]
+    unmatched_targets = [j for j, matched in enumerate(target_matched) if not matched]
+    return (pairs, unmatched_boxes, unmatched_targets)
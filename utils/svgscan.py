@@ -0,0 +1,260 @@
+import re
+import html
+
+############
+# SVGElement
+############
+class SVGElement:
+  def __init__(self, name, start):
+    self.name = name
+    self.attributes = {}
+    # name -> (start, end) of the raw attribute value in the input, also for
+    # values too long to be kept in attributes
+    self.spans = {}
+    # input offsets of '<', of the end of the start tag and of the end of the
+    # element, which is the end of the start tag unless a rect has children
+    self.start = start
+    self.tag_end = start
+    self.end = start
+    self.self_closing = False
+
+  def get_attr(self, name, default_value=None):
+    return self.attributes.get(name, default_value)
+
+  def read_attr(self, reader, name, default_value=None):
+    # like get_attr, values that were too long to be kept are read again from
+    # the seekable input the element was scanned from
+    if name in self.attributes or name not in self.spans:
+      return self.get_attr(name, default_value)
+    start, end = self.spans[name]
+    reader.seek(start)
+    return html.unescape(reader.read(end - start).decode('utf-8', 'replace'))
+
+  def __str__(self):
+    return 'SVGElement({0}, {1}, [{2}:{3}])'.format(self.name, self.attributes, self.start, self.end)
+
+  def __repr__(self):
+    return self.__str__()
+
+############
+# SVGScanner
+############
+# Reads an SVG a chunk at a time and yields its <svg> elements and the <rect>
+# elements with one of the requested ids, everything else is skipped. Text,
+# comments and the attributes of other elements (inline base64 images for
+# example) are stepped over without being kept, and attribute values longer
+# than MAX_VALUE are left out, so memory stays bounded by the chunk size. Only
+# the spans of those values are kept, see SVGElement.read_attr.
+class SVGScanner:
+  CHUNK_SIZE = 1 << 16
+  MAX_VALUE = 1 << 12
+  # bytes a failed match is retried with before it counts as failed
+  WINDOW = 1 << 8
+  ELEMENTS = (b'svg', b'rect')
+
+  NAME_RE = re.compile(rb'[^\s/>]+')
+  ATTR_NAME_RE = re.compile(rb'\s*([^\s=/>]+)')
+  EQUALS_RE = re.compile(rb'\s*=\s*')
+  TAG_END_RE = re.compile(rb'\s*(/?>)')
+  UNQUOTED_END_RE = re.compile(rb'[\s>]')
+  TAG_START_RE = re.compile(rb'<')
+  RECT_END_RE = re.compile(rb'</\s*[rR][eE][cC][tT]\s*>')
+  # markup that is skipped as a whole, by its opening and its closing text
+  SKIPPED = ((b'<!--', b'-->'), (b'<![CDATA[', b']]>'), (b'<?', b'?>'), (b'<!', b'>'), (b'</', b'>'))
+
+  def __init__(self, ids=None, chunk_size=CHUNK_SIZE):
+    self.ids = ids
+    self.chunk_size = chunk_size
+    self.reader = None
+    self.data = b''
+    self.pos = 0
+    # input offset of data[0]
+    self.base = 0
+    self.eof = False
+
+  def fill(self):
+    chunk = self.reader.read(self.chunk_size)
+    if len(chunk) == 0:
+      self.eof = True
+      return False
+    self.base += self.pos
+    self.data = self.data[self.pos:] + chunk
+    self.pos = 0
+    return True
+
+  def tell(self):
+    return self.base + self.pos
+
+  def ensure(self, count):
+    # True once count bytes from pos are in data
+    while len(self.data) - self.pos < count:
+      if not self.fill():
+        return False
+    return True
+
+  def match(self, regex):
+    while True:
+      m = regex.match(self.data, self.pos)
+      touches_end = m is None or m.end() >= len(self.data)
+      # a match may go on, or only start to match, in the next chunk
+      if touches_end and not self.eof and (m is not None or len(self.data) - self.pos < SVGScanner.WINDOW):
+        self.fill()
+        continue
+      if m is not None:
+        self.pos = m.end()
+      return m
+
+  def read_until(self, stop, limit=0, consume=True):
+    # reads up to the first match of the regex stop, (found, value) with
+    # the bytes in between as value, or None when there were more than
+    # limit of them
+    parts = []
+    size = 0
+    while True:
+      m = stop.search(self.data, self.pos)
+      end = m.start() if m is not None else max(self.pos, len(self.data) - SVGScanner.WINDOW)
+      size += end - self.pos
+      if size <= limit:
+        parts.append(self.data[self.pos:end])
+      value = b''.join(parts) if size <= limit else None
+      if m is not None:
+        self.pos = m.end() if consume else m.start()
+        return (True, value)
+      # the last bytes stay, the stop text may straddle the next chunk
+      self.pos = end
+      if not self.fill():
+        self.pos = len(self.data)
+        return (False, value)
+
+  def skip_markup(self):
+    # skips a comment, CDATA section, declaration or end tag starting at pos,
+    # False if the start tag of an element starts there instead
+    for opening, closing in SVGScanner.SKIPPED:
+      self.ensure(len(opening))
+      if self.data.startswith(opening, self.pos):
+        self.pos += len(opening)
+        self.read_until(re.compile(re.escape(closing)))
+        return True
+    return False
+
+  def read_value(self, limit):
+    # (value, start, end) of the value after '=', value is None when it is
+    # longer than limit
+    if not self.ensure(1):
+      return (None, self.tell(), self.tell())
+    quote = self.data[self.pos]
+    if quote == ord('"') or quote == ord("'"):
+      self.pos += 1
+      start = self.tell()
+      found, value = self.read_until(re.compile(re.escape(bytes([quote]))), limit)
+      return (value, start, self.tell() - 1)
+    start = self.tell()
+    found, value = self.read_until(SVGScanner.UNQUOTED_END_RE, limit, False)
+    return (value, start, self.tell())
+
+  def read_start_tag(self, start):
+    # reads the start tag after '<' and returns the SVGElement when it is
+    # one of ELEMENTS, None otherwise
+    m = self.match(SVGScanner.NAME_RE)
+    if m is None:
+      return None
+    name = m.group().lower()
+    element = SVGElement(name.decode('latin-1'), start) if name in SVGScanner.ELEMENTS else None
+    limit = SVGScanner.MAX_VALUE if element is not None else 0
+    while True:
+      m = self.match(SVGScanner.TAG_END_RE)
+      if m is not None:
+        if element is not None:
+          element.self_closing = m.group(1) == b'/>'
+          element.tag_end = element.end = self.tell()
+        return element
+      m = self.match(SVGScanner.ATTR_NAME_RE)
+      if m is None:
+        # stray bytes, the tag ends at the next '>'
+        self.read_until(re.compile(rb'>'))
+        return None
+      attr_name = m.group(1).decode('utf-8', 'replace')
+      if self.match(SVGScanner.EQUALS_RE) is None:
+        if element is not None:
+          element.attributes[attr_name] = attr_name
+        continue
+      value, value_start, value_end = self.read_value(limit)
+      if element is not None:
+        element.spans[attr_name] = (value_start, value_end)
+        if value is not None:
+          element.attributes[attr_name] = html.unescape(value.decode('utf-8', 'replace'))
+
+  def is_requested(self, element):
+    if element.name != 'rect':
+      return True
+    return self.ids is None or element.get_attr('id') in self.ids
+
+  def scan(self, reader):
+    # yields each SVGElement in document order, rects once their end tag,
+    # if any, was read
+    self.reader = reader
+    self.data = b''
+    self.pos = 0
+    self.base = 0
+    self.eof = False
+    while True:
+      found, value = self.read_until(SVGScanner.TAG_START_RE)
+      if not found:
+        return
+      start = self.tell() - 1
+      self.pos -= 1
+      if self.skip_markup():
+        continue
+      self.pos += 1
+      element = self.read_start_tag(start)
+      if element is None or not self.is_requested(element):
+        continue
+      if element.name == 'rect' and not element.self_closing:
+        # rects have no children worth reading, only their end matters
+        self.read_until(SVGScanner.RECT_END_RE)
+        element.end = self.tell()
+      yield element
+
+  def scan_file(self, filename):
+    with open(filename, 'rb') as f:
+      yield from self.scan(f)
+
+#################
+# SVGStreamEditor
+#################
+# Copies an input to an output a chunk at a time, replacing byte ranges on
+# the way, so large files are edited without being loaded.
+class SVGStreamEditor:
+  def __init__(self):
+    self.edits = []
+
+  def replace(self, start, end, data):
+    if start < 0 or end < start:
+      raise ValueError("Invalid range [{0}:{1}]".format(start, end))
+    self.edits.append((start, end, data))
+
+  def insert(self, pos, data):
+    self.replace(pos, pos, data)
+
+  def write(self, reader, writer, chunk_size=SVGScanner.CHUNK_SIZE):
+    pos = 0
+    for start, end, data in sorted(self.edits, key=lambda edit: (edit[0], edit[1])):
+      if start < pos:
+        raise ValueError("Overlapping edits at offset {0}".format(start))
+      SVGStreamEditor.copy(reader, writer, start - pos, chunk_size)
+      writer.write(data)
+      SVGStreamEditor.copy(reader, None, end - start, chunk_size)
+      pos = end
+    SVGStreamEditor.copy(reader, writer, None, chunk_size)
+
+  def copy(reader, writer, count, chunk_size):
+    # copies count bytes, or everything that is left for None, and drops
+    # them without a writer
+    while count is None or count > 0:
+      chunk = reader.read(chunk_size if count is None else min(chunk_size, count))
+      if len(chunk) == 0:
+        return
+      if writer is not None:
+        writer.write(chunk)
+      if count is not None:
+        count -= len(chunk)